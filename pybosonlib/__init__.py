@@ -21,4 +21,19 @@
 #    USA
 
 """PyBoson3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
-from .boson import BosonControl
\ No newline at end of file
+from .boson import BosonControl
+from .aioboson import AsyncBosonControl
+from .fleet import BosonFleet
+from .shadow import ShadowCache
+from .profiles import CameraProfile
+from .stats import Instrumentation
+from .telemetry import TelemetrySampler
+from .scheduler import CommandScheduler
+from .palette import Colorizer, Agc
+from .reply import Reply, BosonError, CommandFailed, CommandTimeout, PortError
+from .retry import RetryPolicy
+from .daemon import BosonDaemon, BosonClient
+from .bulk import BulkTransfer, BulkError
+from .recorder import WireRecorder, WireLog
+from .coalesce import Coalescer
+from .transport import SerialTransport, FdTransport, TcpTransport, LoopbackTransport
\ No newline at end of file
@@ -0,0 +1,273 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyBoson3 asyncio client for the Boson commands
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyBoson-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+import asyncio, os, termios, tty, logging
+from itertools import count
+from .flirprotocols import FrameDecoder, frameSequence
+from .boson import BosonControl, ToByteArray, _getKeyFromValue
+from .schema import AsyncBosonCommands
+from .reply import CommandTimeout, PortError
+from .retry import RetryPolicy
+from .fpa import decodeFpaTable, fpaTableStats
+
+log = logging.getLogger('pybosonlib.aioboson')
+
+class AsyncBosonControl(AsyncBosonCommands):
+    # Same command tables and reply decoding as the blocking controller
+    SCHEMA = BosonControl.SCHEMA
+    COMMANDS = BosonControl.COMMANDS
+    ENCODERS = BosonControl.ENCODERS
+    LUT = BosonControl.LUT
+    GAINMODE = BosonControl.GAINMODE
+    FLR_ENABLE_E = BosonControl.FLR_ENABLE_E
+    SCALER_ZOOM_PARAMS = BosonControl.SCALER_ZOOM_PARAMS
+    getDataFromReply = BosonControl.getDataFromReply
+    getReplyData = BosonControl.getReplyData
+    decodeData = BosonControl.decodeData
+    _construct_cmd = BosonControl._construct_cmd
+    policyFor = BosonControl.policyFor
+
+    _lutstring = ''
+
+    #---------- Methods related to serial port handling ---------------
+    def __init__(self, portname="/dev/ttyACM0", timeout=1, pipelinedepth=4, policy=None, policies=None):
+        self.portname = portname
+        self.timeout = timeout
+        self.policy = policy if policy is not None else RetryPolicy()
+        self.policies = dict(policies or {})
+        self.fd = None
+        self.decoder = FrameDecoder()
+        self._loop = None
+        self._sequence = count(1)
+        self._pending = {}
+        self._pipelinedepth = pipelinedepth
+        self._window = None
+        self._txbuf = bytearray()
+
+    async def open(self):
+        if self.fd is not None:
+            return self
+        self._loop = asyncio.get_running_loop()
+        if self._window is None:
+            self._window = asyncio.Semaphore(self._pipelinedepth)
+        try:
+            fd = os.open(self.portname, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        except OSError as e:
+            raise PortError("Cannot open serial port '%s': %s" % (self.portname, e)) from e
+        try:
+            # 921600 8N1, raw, no flow control
+            tty.setraw(fd)
+            attrs = termios.tcgetattr(fd)
+            attrs[2] = (attrs[2] | termios.CLOCAL | termios.CREAD) & ~(termios.CSTOPB | termios.CRTSCTS)
+            attrs[4] = attrs[5] = termios.B921600
+            termios.tcsetattr(fd, termios.TCSANOW, attrs)
+            termios.tcflush(fd, termios.TCIOFLUSH)
+        except termios.error:
+            # not a real tty (e.g. a pseudo terminal without speed settings)
+            pass
+        self.fd = fd
+        self._loop.add_reader(fd, self._on_readable)
+        return self
+
+    def close(self, reason='closed'):
+        if self.fd is None:
+            return
+        self._loop.remove_reader(self.fd)
+        if self._txbuf:
+            self._loop.remove_writer(self.fd)
+            self._txbuf.clear()
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+        self.fd = None
+        self.decoder.reset()
+        for sequence in list(self._pending):
+            future, _ = self._pending.pop(sequence)
+            if not future.done():
+                future.set_exception(PortError("Port %s %s" % (self.portname, reason)))
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def _on_readable(self):
+        try:
+            s = os.read(self.fd, 4096)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            # unplugged: the next command reopens the port
+            self.close('lost: %s' % e)
+            return
+        if not s:
+            return
+        self.decoder.feed(s)
+        while self.decoder.frames:
+            frame = self.decoder.frames.popleft()
+            entry = self._pending.pop(frameSequence(frame), None)
+            if entry is None:
+                continue
+            future, commandname = entry
+            if future.done():
+                continue
+            try:
+                future.set_result(self.getDataFromReply(frame, commandname))
+            except Exception as e:
+                future.set_exception(e)
+
+    def _write(self, packet):
+        if not self._txbuf:
+            try:
+                written = os.write(self.fd, packet)
+            except BlockingIOError:
+                written = 0
+            except OSError as e:
+                self.close('lost: %s' % e)
+                raise PortError('Lost serial port %s: %s' % (self.portname, e)) from e
+            if written == len(packet):
+                return
+            packet = packet[written:]
+            self._loop.add_writer(self.fd, self._on_writable)
+        self._txbuf += packet
+
+    def _on_writable(self):
+        try:
+            written = os.write(self.fd, self._txbuf)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self.close('lost: %s' % e)
+            return
+        del self._txbuf[:written]
+        if not self._txbuf:
+            self._loop.remove_writer(self.fd)
+
+    # Retries on timeouts and port errors as the command's RetryPolicy says
+    async def sendCmdAndGetReply(self, commandname, data = bytearray(), timeout=None):
+        policy = self.policyFor(commandname)
+        if timeout is None:
+            timeout = policy.timeout or self.timeout
+        pauses = policy.pauses()
+        while True:
+            try:
+                return await self._send(commandname, data, timeout)
+            except policy.retryon:
+                pause = next(pauses, None)
+                if pause is None:
+                    raise
+                await asyncio.sleep(pause)
+
+    async def _send(self, commandname, data, timeout):
+        if self.fd is None:
+            await self.open()
+        async with self._window:
+            sequence = next(self._sequence) & 0xFFFFFFFF
+            future = self._loop.create_future()
+            self._pending[sequence] = (future, commandname)
+            try:
+                self._write(self._construct_cmd(commandname, data, sequence))
+                return await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                raise CommandTimeout(commandname, timeout) from None
+            finally:
+                # on timeout or cancellation a late reply is simply ignored
+                self._pending.pop(sequence, None)
+
+    async def sendCmdsAndGetReplies(self, commands, timeout=None):
+        # commands is a list of names or (name, data) tuples
+        coros = []
+        for command in commands:
+            if isinstance(command, str):
+                coros.append(self.sendCmdAndGetReply(command, timeout=timeout))
+            else:
+                coros.append(self.sendCmdAndGetReply(*command, timeout=timeout))
+        return await asyncio.gather(*coros)
+
+    #---------- Methods supposed to be invoked from users --------------
+    # Plain getters and setters are generated from schema.METHODS
+    async def getColorLut(self):
+        color_enabled = await self.sendCmdAndGetReply('COLORLUTGETCONTROL')
+        if not color_enabled:
+            return 'GREYSCALE'
+        else:
+            return self.LUT[await self.sendCmdAndGetReply('GETCOLORLUT')]
+
+    async def setColorLut(self, lutstring):
+        if lutstring == 'GREYSCALE':
+            self._lutstring = 'GREYSCALE'
+            return await self.sendCmdAndGetReply('COLORLUTSETCONTROL', ToByteArray(_getKeyFromValue(self.FLR_ENABLE_E,'FALSE')))
+        else:
+            self._lutstring = lutstring
+            await self.sendCmdAndGetReply('COLORLUTSETCONTROL', ToByteArray(_getKeyFromValue(self.FLR_ENABLE_E,'TRUE')))
+            return await self.sendCmdAndGetReply('SETCOLORLUT', ToByteArray(_getKeyFromValue(self.LUT, lutstring)))
+
+    async def getGainState(self):
+        return self.GAINMODE[await self.sendCmdAndGetReply('GETGAINMODE')]
+
+    async def setGainState(self, gainstring):
+        return await self.sendCmdAndGetReply('SETGAINMODE', ToByteArray(_getKeyFromValue(self.GAINMODE, gainstring)))
+
+    async def getSwVersion(self):
+        sv = await self.sendCmdAndGetReply('GETSWVERSION')
+        log.debug('SW version is %d.%d.%d', sv.major, sv.minor, sv.patch)
+        return sv
+
+    async def getFpaTempTable(self):
+        temparray = decodeFpaTable(await self.sendCmdAndGetReply('FPAGETTEMPTABLE'))
+        return min(temparray), max(temparray)
+
+    async def getFpaTempStats(self, out=None):
+        return fpaTableStats(await self.sendCmdAndGetReply('FPAGETTEMPTABLE'), out)
+
+    async def setEntropy(self, value):
+        if value:
+            await self.sendCmdAndGetReply('ACGSETENTROPY', ToByteArray(_getKeyFromValue(self.FLR_ENABLE_E,'TRUE')))
+        else:
+            await self.sendCmdAndGetReply('ACGSETENTROPY', ToByteArray(_getKeyFromValue(self.FLR_ENABLE_E,'FALSE')))
+
+    async def getEntropy(self):
+        retval = await self.sendCmdAndGetReply('ACGGETENTROPY')
+        if retval == 1:
+            return True
+        elif retval == 0:
+            return False
+        else:
+            raise ValueError('Unexpected entropy state %r' % retval)
+
+    async def getScalerZoom(self):
+        return (await self.sendCmdAndGetReply('SCALERGETZOOM')).zoom
+
+    async def setScalerZoom(self, value):
+        #Know what is the max you can set and exit if necessary
+        max_zoom = await self.sendCmdAndGetReply('SCALERGETMAXZOOM')
+        if (value > max_zoom):
+            return
+
+        #Get Current Zoom parameters and alter Zoom level only
+        zoom_params = await self.sendCmdAndGetReply('SCALERGETZOOM')
+        zoom_params.zoom = value
+
+        return await self.sendCmdAndGetReply('SCALERSETZOOM', zoom_params.pack())
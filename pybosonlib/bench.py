@@ -0,0 +1,235 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyBoson3 micro benchmarks of the protocol and decode hot paths
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyBoson-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+import os, sys, json, struct, argparse, logging, tracemalloc
+from time import perf_counter
+from collections import OrderedDict
+from . import flirprotocols
+from .flirprotocols import Frame, Fbp, FrameDecoder, encodeFrame, fastByteStuff
+from .boson import BosonControl, FpaTableToIntArray
+from .fpa import decodeFpaTable
+
+log = logging.getLogger('pybosonlib.bench')
+
+# Committed next to this module, so the gate works from any directory
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench-baseline.json')
+
+#---------- Inputs ---------------
+# A GETSERIAL style command body: channel, FBP header, no data
+REALISTIC = bytes([0x00, 0x00, 0x00, 0x00, 0x07, 0x00, 0x05, 0x00, 0x02, 0xFF, 0xFF, 0xFF, 0xFF])
+# Every byte needs an escape
+WORSTCASE = bytes([0x8E, 0x9E, 0xAE]) * 86
+# FPAGETTEMPTABLE data: 32 big endian shorts around 31.5 C
+FPA_TABLE = struct.pack('>32h', *[315 + i // 4 for i in range(32)])
+# The same table made of flag bytes, stuffed to twice its size on the wire
+FPA_TABLE_WORST = bytes([0x8E, 0xAE]) * 32
+
+def _reply(commandname, data, sequence=7):
+    commandid = BosonControl.SCHEMA[commandname].commandid
+    return flirprotocols.fastByteUnstuff(encodeFrame(struct.pack('>I', sequence) + commandid + bytes(4) + data))
+
+def _control():
+    # the class attributes are all _construct_cmd and the decoders need; no port
+    return object.__new__(BosonControl)
+
+#---------- Benchmarks ---------------
+# Format: name, function of no arguments returning the callable to time
+def _benchmarks():
+    control = _control()
+    stuffedreal = bytes(flirprotocols.byteStuff(REALISTIC))
+    stuffedworst = bytes(flirprotocols.byteStuff(WORSTCASE))
+    serialreply = _reply('GETSERIAL', struct.pack('>i', 123456))
+    fpareply = _reply('FPAGETTEMPTABLE', FPA_TABLE)
+    fpaworstreply = _reply('FPAGETTEMPTABLE', FPA_TABLE_WORST)
+    stream = b''.join(encodeFrame(struct.pack('>I', i) + bytes(8) + FPA_TABLE) for i in range(16))
+    decoder = FrameDecoder()
+
+    def feed():
+        decoder.feed(stream)
+        decoder.frames.clear()
+
+    return (
+        ('byteStuff/realistic'           , lambda: flirprotocols.byteStuff(REALISTIC)),
+        ('byteStuff/worstcase'           , lambda: flirprotocols.byteStuff(WORSTCASE)),
+        ('byteUnstuff/realistic'         , lambda: flirprotocols.byteUnstuff(stuffedreal)),
+        ('byteUnstuff/worstcase'         , lambda: flirprotocols.byteUnstuff(stuffedworst)),
+        ('fastByteStuff/worstcase'       , lambda: fastByteStuff(WORSTCASE)),
+        ('fastByteUnstuff/worstcase'     , lambda: flirprotocols.fastByteUnstuff(stuffedworst)),
+        ('crc16xmodem/fpatable'          , lambda: flirprotocols.crc16xmodem(FPA_TABLE)),
+        ('crc_to_hex'                    , lambda: flirprotocols.crc_to_hex(0x1d0f)),
+        ('Fbp.raw/realistic'             , lambda: Fbp(bytearray(b'\x00\x05\x00\x02')).raw()),
+        ('Frame.raw/realistic'           , lambda: Frame(bytearray(REALISTIC[1:])).raw()),
+        ('Frame.raw/worstcase'           , lambda: Frame(bytearray(WORSTCASE)).raw()),
+        ('_construct_cmd/get'            , lambda: control._construct_cmd('GETSERIAL', b'', 7)),
+        ('_construct_cmd/set'            , lambda: control._construct_cmd('ACGSETGAMMA', b'\x3f\x00\x00\x00', 7)),
+        ('_construct_cmd/worstcase'      , lambda: control._construct_cmd('SCALERSETZOOM', WORSTCASE[:12], 0x8E9EAE8E)),
+        ('getDataFromReply/int'          , lambda: control.getDataFromReply(serialreply, 'GETSERIAL')),
+        ('getDataFromReply/fpatable'     , lambda: control.getDataFromReply(fpareply, 'FPAGETTEMPTABLE')),
+        ('getDataFromReply/worstcase'    , lambda: control.getDataFromReply(fpaworstreply, 'FPAGETTEMPTABLE')),
+        ('FpaTableToIntArray'            , lambda: FpaTableToIntArray(FPA_TABLE)),
+        ('decodeFpaTable'                , lambda: decodeFpaTable(FPA_TABLE)),
+        ('FrameDecoder.feed/16 replies'  , feed),
+    )
+
+# Pure Python reference loop. Scores are ops/sec divided by its ops/sec, so
+# baselines carry over between machines of different speed.
+def _reference():
+    total = 0
+    for i in range(100):
+        total += i & 0x0F
+    return total
+
+#---------- Measuring ---------------
+# Best of repeat runs of enough calls to last mintime seconds, in calls per
+# second
+def opsPerSecond(function, mintime=0.05, repeat=5):
+    number = 1
+    while True:
+        start = perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = perf_counter() - start
+        if elapsed >= mintime:
+            break
+        number *= 2 if elapsed <= 0 else max(2, min(10, int(mintime / elapsed) + 1))
+    best = elapsed
+    for _ in range(repeat - 1):
+        start = perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, perf_counter() - start)
+    return number / best
+
+# Memory one call allocates, from tracemalloc: peak bytes above the starting
+# point and blocks still held afterwards, averaged over calls
+def allocations(function, calls=200):
+    function()
+    tracemalloc.start()
+    try:
+        peak = 0
+        for _ in range(calls):
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            function()
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+        before = tracemalloc.take_snapshot()
+        for _ in range(calls):
+            function()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    retained = sum(stat.count_diff for stat in after.compare_to(before, 'lineno') if stat.count_diff > 0)
+    return peak, retained / float(calls)
+
+# Benchmarks that cannot run here, e.g. because an optional module is
+# missing, are skipped and left out of the results
+def run(names=None, mintime=0.05, repeat=5):
+    results = OrderedDict()
+    for name, function in _benchmarks():
+        if names and not any(part in name for part in names):
+            continue
+        try:
+            function()
+        except Exception as e:
+            log.warning('Skipping %s: %s: %s', name, type(e).__name__, e)
+            continue
+        # the reference is timed next to each benchmark so both see the
+        # same machine load
+        reference = opsPerSecond(_reference, mintime, repeat)
+        ops = opsPerSecond(function, mintime, repeat)
+        reference = max(reference, opsPerSecond(_reference, mintime, repeat))
+        peak, retained = allocations(function)
+        results[name] = OrderedDict([
+            ('ops', ops),
+            ('score', ops / reference),
+            ('allocbytes', peak),
+            ('retained', retained),
+        ])
+    return results
+
+# Benchmarks slower (by score) or allocating more than threshold times the
+# baseline, as (name, what, baseline, now)
+def regressions(results, baseline, threshold=0.2):
+    found = []
+    for name, now in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if now['score'] < base['score'] * (1.0 - threshold):
+            found.append((name, 'score', base['score'], now['score']))
+        # a few bytes of slack for small allocations
+        if now['allocbytes'] > base['allocbytes'] * (1.0 + threshold) + 64:
+            found.append((name, 'allocbytes', base['allocbytes'], now['allocbytes']))
+    return found
+
+def formatResults(results, baseline=None):
+    lines = ['%-30s %12s %9s %10s %8s %9s' % ('benchmark', 'ops/sec', 'score', 'allocbytes', 'retained', 'vs base')]
+    for name, result in results.items():
+        base = (baseline or {}).get(name)
+        change = '%+8.1f%%' % (100.0 * (result['score'] / base['score'] - 1.0)) if base else '%9s' % '-'
+        lines.append('%-30s %12.0f %9.4f %10d %8.2f %s' % (name, result['ops'], result['score'],
+                                                           result['allocbytes'], result['retained'], change))
+    return '\n'.join(lines)
+
+def loadBaseline(path):
+    try:
+        with open(path) as f:
+            return json.load(f)['benchmarks']
+    except FileNotFoundError:
+        return None
+
+def saveBaseline(path, results):
+    with open(path, 'w') as f:
+        json.dump(OrderedDict([('python', sys.version.split()[0]), ('benchmarks', results)]), f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Boson protocol hot paths, no camera needed')
+    parser.add_argument('names', nargs='*', help='only benchmarks whose name contains one of these')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline file (default %(default)s)')
+    parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed regression, 0.2 is 20%%')
+    parser.add_argument('--mintime', type=float, default=0.05, help='seconds per timing run')
+    parser.add_argument('--repeat', type=int, default=5, help='timing runs, the best one counts')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(message)s')
+    results = run(args.names, args.mintime, args.repeat)
+    baseline = loadBaseline(args.baseline)
+    print (formatResults(results, baseline))
+    if args.save:
+        # a partial run only replaces its own entries
+        merged = OrderedDict(baseline or {}) if args.names else OrderedDict()
+        merged.update(results)
+        saveBaseline(args.baseline, merged)
+        print ('Saved baseline to %s' % args.baseline)
+        return 0
+    if baseline is None:
+        print ('No baseline in %s, run with --save to store one' % args.baseline)
+        return 0
+    found = regressions(results, baseline, args.threshold)
+    for name, what, base, now in found:
+        print ('REGRESSION %s: %s %.4f -> %.4f' % (name, what, base, now))
+    return 1 if found else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -21,55 +21,66 @@
 
 """PyBoson-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
 
-import serial,sys
+import logging
 from _thread import allocate_lock
-from .flirprotocols import Frame, Fbp, byteUnstuff, renderToByteArray
-from time import sleep
+from . import schema
+from .profiles import CameraProfile
+from .fpa import decodeFpaTable, fpaTableStats
+from .reply import Reply, CommandTimeout, PortError
+from .retry import RetryPolicy, POLL_INTERVAL
+from .transport import makeTransport
+from .flirprotocols import Frame, Fbp, CommandEncoder, FrameDecoder, frameSequence, byteUnstuff, renderToByteArray
+from time import sleep, monotonic
+from concurrent.futures import Future, wait
+from itertools import count
+from threading import BoundedSemaphore
 import struct
 from collections import OrderedDict
 
-class BosonControl():
+log = logging.getLogger('pybosonlib')
+
+# Future for a pipelined command. Waiting on it reads the port from the
+# calling thread whenever no other thread is already doing so.
+class BosonFuture(Future):
+
+    def __init__(self, control, commandname, sequence, data=b''):
+        Future.__init__(self)
+        self.control = control
+        self.commandname = commandname
+        self.sequence = sequence
+        self.data = data
+        # undecoded reply data bytes once done
+        self.replydata = None
+        # wire packet, monotonic times of submission, encoding and the end of
+        # the write
+        self.packet = None
+        self.submitted = None
+        self.encoded = None
+        self.written = None
+        # reply deadline, set once the command is written
+        self.timeout = None
+        self.deadline = None
+
+    def result(self, timeout=None):
+        self.control._pump(self, timeout)
+        return Future.result(self, 0)
+
+    def exception(self, timeout=None):
+        self.control._pump(self, timeout)
+        return Future.exception(self, 0)
+
+class BosonControl(schema.BosonCommands):
     
-#const colormap_t colormap_rainbow = { {1, 3, 74, 0, 3, 74, 0, 3, 75, 0, 3, 75, 0, 3, 76, 0, 3, 76, 0, 3, 77, 0, 3, 79, 0, 3, 82, 0, 5, 85, 0, 7, 88, 0, 10, 91, 0, 14, 94, 0, 19, 98, 0, 22, 100, 0, 25, 103, 0, 28, 106, 0, 32, 109, 0, 35, 112, 0, 38, 116, 0, 40, 119, 0, 42, 123, 0, 45, 128, 0, 49, 133, 0, 50, 134, 0, 51, 136, 0, 52, 137, 0, 53, 139, 0, 54, 142, 0, 55, 144, 0, 56, 145, 0, 58, 149, 0, 61, 154, 0, 63, 156, 0, 65, 159, 0, 66, 161, 0, 68, 164, 0, 69, 167, 0, 71, 170, 0, 73, 174, 0, 75, 179, 0, 76, 181, 0, 78, 184, 0, 79, 187, 0, 80, 188, 0, 81, 190, 0, 84, 194, 0, 87, 198, 0, 88, 200, 0, 90, 203, 0, 92, 205, 0, 94, 207, 0, 94, 208, 0, 95, 209, 0, 96, 210, 0, 97, 211, 0, 99, 214, 0, 102, 217, 0, 103, 218, 0, 104, 219, 0, 105, 220, 0, 107, 221, 0, 109, 223, 0, 111, 223, 0, 113, 223, 0, 115, 222, 0, 117, 221, 0, 118, 220, 1, 120, 219, 1, 122, 217, 2, 124, 216, 2, 126, 214, 3, 129, 212, 3, 131, 207, 4, 132, 205, 4, 133, 202, 4, 134, 197, 5, 136, 192, 6, 138, 185, 7, 141, 178, 8, 142, 172, 10, 144, 166, 10, 144, 162, 11, 145, 158, 12, 146, 153, 13, 147, 149, 15, 149, 140, 17, 151, 132, 22, 153, 120, 25, 154, 115, 28, 156, 109, 34, 158, 101, 40, 160, 94, 45, 162, 86, 51, 164, 79, 59, 167, 69, 67, 171, 60, 72, 173, 54, 78, 175, 48, 83, 177, 43, 89, 179, 39, 93, 181, 35, 98, 183, 31, 105, 185, 26, 109, 187, 23, 113, 188, 21, 118, 189, 19, 123, 191, 17, 128, 193, 14, 134, 195, 12, 138, 196, 10, 142, 197, 8, 146, 198, 6, 151, 200, 5, 155, 201, 4, 160, 203, 3, 164, 204, 2, 169, 205, 2, 173, 206, 1, 175, 207, 1, 178, 207, 1, 184, 208, 0, 190, 210, 0, 193, 211, 0, 196, 212, 0, 199, 212, 0, 202, 213, 1, 207, 214, 2, 212, 215, 3, 215, 214, 3, 218, 214, 3, 220, 213, 3, 222, 213, 4, 224, 212, 4, 225, 212, 5, 226, 212, 5, 229, 211, 5, 232, 211, 6, 232, 211, 6, 233, 211, 6, 234, 210, 6, 235, 210, 7, 236, 209, 7, 237, 208, 8, 239, 206, 8, 241, 204, 9, 242, 203, 9, 244, 202, 10, 244, 201, 10, 245, 200, 10, 245, 199, 11, 246, 198, 11, 247, 197, 12, 248, 194, 13, 249, 191, 14, 250, 189, 14, 251, 187, 15, 251, 185, 16, 252, 183, 17, 252, 178, 18, 253, 174, 19, 253, 171, 19, 254, 168, 20, 254, 165, 21, 254, 164, 21, 255, 163, 22, 255, 161, 22, 255, 159, 23, 255, 157, 23, 255, 155, 24, 255, 149, 25, 255, 143, 27, 255, 139, 28, 255, 135, 30, 255, 131, 31, 255, 127, 32, 255, 118, 34, 255, 110, 36, 255, 104, 37, 255, 101, 38, 255, 99, 39, 255, 93, 40, 255, 88, 42, 254, 82, 43, 254, 77, 45, 254, 69, 47, 254, 62, 49, 253, 57, 50, 253, 53, 52, 252, 49, 53, 252, 45, 55, 251, 39, 57, 251, 33, 59, 251, 32, 60, 251, 31, 60, 251, 30, 61, 251, 29, 61, 251, 28, 62, 250, 27, 63, 250, 27, 65, 249, 26, 66, 249, 26, 68, 248, 25, 70, 248, 24, 73, 247, 24, 75, 247, 25, 77, 247, 25, 79, 247, 26, 81, 247, 32, 83, 247, 35, 85, 247, 38, 86, 247, 42, 88, 247, 46, 90, 247, 50, 92, 248, 55, 94, 248, 59, 96, 248, 64, 98, 248, 72, 101, 249, 81, 104, 249, 87, 106, 250, 93, 108, 250, 95, 109, 250, 98, 110, 250, 100, 111, 251, 101, 112, 251, 102, 113, 251, 109, 117, 252, 116, 121, 252, 121, 123, 253, 126, 126, 253, 130, 128, 254, 135, 131, 254, 139, 133, 254, 144, 136, 254, 151, 140, 255, 158, 144, 255, 163, 146, 255, 168, 149, 255, 173, 152, 255, 176, 153, 255, 178, 155, 255, 184, 160, 255, 191, 165, 255, 195, 168, 255, 199, 172, 255, 203, 175, 255, 207, 179, 255, 211, 182, 255, 216, 185, 255, 218, 190, 255, 220, 196, 255, 222, 200, 255, 225, 202, 255, 227, 204, 255, 230, 206, 255, 233, 208} };
+    # The SDK colormaps (rainbow, grayscale, ironblack) live in palette.py
 
-#const colormap_t colormap_grayscale = { {0, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 4, 4, 4, 5, 5, 5, 6, 6, 6, 7, 7, 7, 8, 8, 8, 9, 9, 9, 10, 10, 10, 11, 11, 11, 12, 12, 12, 13, 13, 13, 14, 14, 14, 15, 15, 15, 16, 16, 16, 17, 17, 17, 18, 18, 18, 19, 19, 19, 20, 20, 20, 21, 21, 21, 22, 22, 22, 23, 23, 23, 24, 24, 24, 25, 25, 25, 26, 26, 26, 27, 27, 27, 28, 28, 28, 29, 29, 29, 30, 30, 30, 31, 31, 31, 32, 32, 32, 33, 33, 33, 34, 34, 34, 35, 35, 35, 36, 36, 36, 37, 37, 37, 38, 38, 38, 39, 39, 39, 40, 40, 40, 41, 41, 41, 42, 42, 42, 43, 43, 43, 44, 44, 44, 45, 45, 45, 46, 46, 46, 47, 47, 47, 48, 48, 48, 49, 49, 49, 50, 50, 50, 51, 51, 51, 52, 52, 52, 53, 53, 53, 54, 54, 54, 55, 55, 55, 56, 56, 56, 57, 57, 57, 58, 58, 58, 59, 59, 59, 60, 60, 60, 61, 61, 61, 62, 62, 62, 63, 63, 63, 64, 64, 64, 65, 65, 65, 66, 66, 66, 67, 67, 67, 68, 68, 68, 69, 69, 69, 70, 70, 70, 71, 71, 71, 72, 72, 72, 73, 73, 73, 74, 74, 74, 75, 75, 75, 76, 76, 76, 77, 77, 77, 78, 78, 78, 79, 79, 79, 80, 80, 80, 81, 81, 81, 82, 82, 82, 83, 83, 83, 84, 84, 84, 85, 85, 85, 86, 86, 86, 87, 87, 87, 88, 88, 88, 89, 89, 89, 90, 90, 90, 91, 91, 91, 92, 92, 92, 93, 93, 93, 94, 94, 94, 95, 95, 95, 96, 96, 96, 97, 97, 97, 98, 98, 98, 99, 99, 99, 100, 100, 100, 101, 101, 101, 102, 102, 102, 103, 103, 103, 104, 104, 104, 105, 105, 105, 106, 106, 106, 107, 107, 107, 108, 108, 108, 109, 109, 109, 110, 110, 110, 111, 111, 111, 112, 112, 112, 113, 113, 113, 114, 114, 114, 115, 115, 115, 116, 116, 116, 117, 117, 117, 118, 118, 118, 119, 119, 119, 120, 120, 120, 121, 121, 121, 122, 122, 122, 123, 123, 123, 124, 124, 124, 125, 125, 125, 126, 126, 126, 127, 127, 127, 128, 128, 128, 129, 129, 129, 130, 130, 130, 131, 131, 131, 132, 132, 132, 133, 133, 133, 134, 134, 134, 135, 135, 135, 136, 136, 136, 137, 137, 137, 138, 138, 138, 139, 139, 139, 140, 140, 140, 141, 141, 141, 142, 142, 142, 143, 143, 143, 144, 144, 144, 145, 145, 145, 146, 146, 146, 147, 147, 147, 148, 148, 148, 149, 149, 149, 150, 150, 150, 151, 151, 151, 152, 152, 152, 153, 153, 153, 154, 154, 154, 155, 155, 155, 156, 156, 156, 157, 157, 157, 158, 158, 158, 159, 159, 159, 160, 160, 160, 161, 161, 161, 162, 162, 162, 163, 163, 163, 164, 164, 164, 165, 165, 165, 166, 166, 166, 167, 167, 167, 168, 168, 168, 169, 169, 169, 170, 170, 170, 171, 171, 171, 172, 172, 172, 173, 173, 173, 174, 174, 174, 175, 175, 175, 176, 176, 176, 177, 177, 177, 178, 178, 178, 179, 179, 179, 180, 180, 180, 181, 181, 181, 182, 182, 182, 183, 183, 183, 184, 184, 184, 185, 185, 185, 186, 186, 186, 187, 187, 187, 188, 188, 188, 189, 189, 189, 190, 190, 190, 191, 191, 191, 192, 192, 192, 193, 193, 193, 194, 194, 194, 195, 195, 195, 196, 196, 196, 197, 197, 197, 198, 198, 198, 199, 199, 199, 200, 200, 200, 201, 201, 201, 202, 202, 202, 203, 203, 203, 204, 204, 204, 205, 205, 205, 206, 206, 206, 207, 207, 207, 208, 208, 208, 209, 209, 209, 210, 210, 210, 211, 211, 211, 212, 212, 212, 213, 213, 213, 214, 214, 214, 215, 215, 215, 216, 216, 216, 217, 217, 217, 218, 218, 218, 219, 219, 219, 220, 220, 220, 221, 221, 221, 222, 222, 222, 223, 223, 223, 224, 224, 224, 225, 225, 225, 226, 226, 226, 227, 227, 227, 228, 228, 228, 229, 229, 229, 230, 230, 230, 231, 231, 231, 232, 232, 232, 233, 233, 233, 234, 234, 234, 235, 235, 235, 236, 236, 236, 237, 237, 237, 238, 238, 238, 239, 239, 239, 240, 240, 240, 241, 241, 241, 242, 242, 242, 243, 243, 243, 244, 244, 244, 245, 245, 245, 246, 246, 246, 247, 247, 247, 248, 248, 248, 249, 249, 249, 250, 250, 250, 251, 251, 251, 252, 252, 252, 253, 253, 253, 254, 254, 254, 255, 255, 255} };
+    # Compiled command schema, see schema.SCHEMA
+    SCHEMA = schema.COMMANDS
 
-#const colormap_t colormap_ironblack = { {255, 255, 255, 253, 253, 253, 251, 251, 251, 249, 249, 249, 247, 247, 247, 245, 245, 245, 243, 243, 243, 241, 241, 241, 239, 239, 239, 237, 237, 237, 235, 235, 235, 233, 233, 233, 231, 231, 231, 229, 229, 229, 227, 227, 227, 225, 225, 225, 223, 223, 223, 221, 221, 221, 219, 219, 219, 217, 217, 217, 215, 215, 215, 213, 213, 213, 211, 211, 211, 209, 209, 209, 207, 207, 207, 205, 205, 205, 203, 203, 203, 201, 201, 201, 199, 199, 199, 197, 197, 197, 195, 195, 195, 193, 193, 193, 191, 191, 191, 189, 189, 189, 187, 187, 187, 185, 185, 185, 183, 183, 183, 181, 181, 181, 179, 179, 179, 177, 177, 177, 175, 175, 175, 173, 173, 173, 171, 171, 171, 169, 169, 169, 167, 167, 167, 165, 165, 165, 163, 163, 163, 161, 161, 161, 159, 159, 159, 157, 157, 157, 155, 155, 155, 153, 153, 153, 151, 151, 151, 149, 149, 149, 147, 147, 147, 145, 145, 145, 143, 143, 143, 141, 141, 141, 139, 139, 139, 137, 137, 137, 135, 135, 135, 133, 133, 133, 131, 131, 131, 129, 129, 129, 126, 126, 126, 124, 124, 124, 122, 122, 122, 120, 120, 120, 118, 118, 118, 116, 116, 116, 114, 114, 114, 112, 112, 112, 110, 110, 110, 108, 108, 108, 106, 106, 106, 104, 104, 104, 102, 102, 102, 100, 100, 100, 98, 98, 98, 96, 96, 96, 94, 94, 94, 92, 92, 92, 90, 90, 90, 88, 88, 88, 86, 86, 86, 84, 84, 84, 82, 82, 82, 80, 80, 80, 78, 78, 78, 76, 76, 76, 74, 74, 74, 72, 72, 72, 70, 70, 70, 68, 68, 68, 66, 66, 66, 64, 64, 64, 62, 62, 62, 60, 60, 60, 58, 58, 58, 56, 56, 56, 54, 54, 54, 52, 52, 52, 50, 50, 50, 48, 48, 48, 46, 46, 46, 44, 44, 44, 42, 42, 42, 40, 40, 40, 38, 38, 38, 36, 36, 36, 34, 34, 34, 32, 32, 32, 30, 30, 30, 28, 28, 28, 26, 26, 26, 24, 24, 24, 22, 22, 22, 20, 20, 20, 18, 18, 18, 16, 16, 16, 14, 14, 14, 12, 12, 12, 10, 10, 10, 8, 8, 8, 6, 6, 6, 4, 4, 4, 2, 2, 2, 0, 0, 0, 0, 0, 9, 2, 0, 16, 4, 0, 24, 6, 0, 31, 8, 0, 38, 10, 0, 45, 12, 0, 53, 14, 0, 60, 17, 0, 67, 19, 0, 74, 21, 0, 82, 23, 0, 89, 25, 0, 96, 27, 0, 103, 29, 0, 111, 31, 0, 118, 36, 0, 120, 41, 0, 121, 46, 0, 122, 51, 0, 123, 56, 0, 124, 61, 0, 125, 66, 0, 126, 71, 0, 127, 76, 1, 128, 81, 1, 129, 86, 1, 130, 91, 1, 131, 96, 1, 132, 101, 1, 133, 106, 1, 134, 111, 1, 135, 116, 1, 136, 121, 1, 136, 125, 2, 137, 130, 2, 137, 135, 3, 137, 139, 3, 138, 144, 3, 138, 149, 4, 138, 153, 4, 139, 158, 5, 139, 163, 5, 139, 167, 5, 140, 172, 6, 140, 177, 6, 140, 181, 7, 141, 186, 7, 141, 189, 10, 137, 191, 13, 132, 194, 16, 127, 196, 19, 121, 198, 22, 116, 200, 25, 111, 203, 28, 106, 205, 31, 101, 207, 34, 95, 209, 37, 90, 212, 40, 85, 214, 43, 80, 216, 46, 75, 218, 49, 69, 221, 52, 64, 223, 55, 59, 224, 57, 49, 225, 60, 47, 226, 64, 44, 227, 67, 42, 228, 71, 39, 229, 74, 37, 230, 78, 34, 231, 81, 32, 231, 85, 29, 232, 88, 27, 233, 92, 24, 234, 95, 22, 235, 99, 19, 236, 102, 17, 237, 106, 14, 238, 109, 12, 239, 112, 12, 240, 116, 12, 240, 119, 12, 241, 123, 12, 241, 127, 12, 242, 130, 12, 242, 134, 12, 243, 138, 12, 243, 141, 13, 244, 145, 13, 244, 149, 13, 245, 152, 13, 245, 156, 13, 246, 160, 13, 246, 163, 13, 247, 167, 13, 247, 171, 13, 248, 175, 14, 248, 178, 15, 249, 182, 16, 249, 185, 18, 250, 189, 19, 250, 192, 20, 251, 196, 21, 251, 199, 22, 252, 203, 23, 252, 206, 24, 253, 210, 25, 253, 213, 27, 254, 217, 28, 254, 220, 29, 255, 224, 30, 255, 227, 39, 255, 229, 53, 255, 231, 67, 255, 233, 81, 255, 234, 95, 255, 236, 109, 255, 238, 123, 255, 240, 137, 255, 242, 151, 255, 244, 165, 255, 246, 179, 255, 248, 193, 255, 249, 207, 255, 251, 221, 255, 253, 235, 255, 255, 24} };
-        
     # Format: Command Hex Code, Byte Size (command, response, get, set)
-    COMMANDS = {
-        'GETSERIAL'           :    { 'id': bytearray([0x00, 0x05, 0x00, 0x02]), 'retbytes': 4},
-        'GETCOLORLUT'         :    { 'id': bytearray([0x00, 0x0B, 0x00, 0x04]), 'retbytes': 4, 'type': 'int'},
-        'SETCOLORLUT'         :    { 'id': bytearray([0x00, 0x0B, 0x00, 0x03]), 'retbytes': 0},
-        'COLORLUTSETCONTROL'  :    { 'id': bytearray([0x00, 0x0B, 0x00, 0x01]), 'retbytes': 0},
-        'COLORLUTGETCONTROL'  :    { 'id': bytearray([0x00, 0x0B, 0x00, 0x02]), 'retbytes': 4, 'type': 'int'},
-        'GETPARTNUMBER'       :    { 'id': bytearray([0x00, 0x05, 0x00, 0x04]), 'retbytes': 20},
-        'GETGAINMODE'         :    { 'id': bytearray([0x00, 0x05, 0x00, 0x15]), 'retbytes': 4, 'type': 'int'},
-        'SETGAINMODE'         :    { 'id': bytearray([0x00, 0x05, 0x00, 0x14]), 'retbytes': 0},
-        'ACGSETLINEARPERCENT' :    { 'id': bytearray([0x00, 0x09, 0x00, 0x03]), 'retbytes': 0},
-        'ACGGETLINEARPERCENT' :    { 'id': bytearray([0x00, 0x09, 0x00, 0x04]), 'retbytes': 4, 'type': 'float'},
-        'ACGGETOUTLIERCUT'    :    { 'id': bytearray([0x00, 0x09, 0x00, 0x06]), 'retbytes': 4, 'type': 'float'},
-        'ACGSETOUTLIERCUT'    :    { 'id': bytearray([0x00, 0x09, 0x00, 0x05]), 'retbytes': 0},
-        'ACGGETMAXGAIN'       :    { 'id': bytearray([0x00, 0x09, 0x00, 0x0A]), 'retbytes': 4, 'type': 'float'},
-        'ACGSETMAXGAIN'       :    { 'id': bytearray([0x00, 0x09, 0x00, 0x09]), 'retbytes': 0},
-        'ACGGETDUMPINGFACTOR' :    { 'id': bytearray([0x00, 0x09, 0x00, 0x0C]), 'retbytes': 4, 'type': 'float'},
-        'ACGSETDUMPINGFACTOR' :    { 'id': bytearray([0x00, 0x09, 0x00, 0x0B]), 'retbytes': 0},
-        'ACGGETGAMMA'         :    { 'id': bytearray([0x00, 0x09, 0x00, 0x0E]), 'retbytes': 4, 'type': 'float'},
-        'ACGSETGAMMA'         :    { 'id': bytearray([0x00, 0x09, 0x00, 0x0D]), 'retbytes': 0},
-        'ACGGETDTBR'          :    { 'id': bytearray([0x00, 0x09, 0x00, 0x16]), 'retbytes': 4, 'type': 'float'},
-        'ACGSETDTBR'          :    { 'id': bytearray([0x00, 0x09, 0x00, 0x15]), 'retbytes': 0},
-        'ACGGETSIGMAR'        :    { 'id': bytearray([0x00, 0x09, 0x00, 0x18]), 'retbytes': 4, 'type': 'float'},
-        'ACGSETSIGMAR'        :    { 'id': bytearray([0x00, 0x09, 0x00, 0x17]), 'retbytes': 0},
-        'ACGGETENTROPY'       :    { 'id': bytearray([0x00, 0x09, 0x00, 0x1F]), 'retbytes': 4, 'type': 'int'},
-        'ACGSETENTROPY'       :    { 'id': bytearray([0x00, 0x09, 0x00, 0x1E]), 'retbytes': 0},
-        'ACGRESTOREDEFAULT'   :    { 'id': bytearray([0x00, 0x05, 0x00, 0x1B]), 'retbytes': 0},
-        'FPATEMPDEDCx10'      :    { 'id': bytearray([0x00, 0x05, 0x00, 0x30]), 'retbytes': 2, 'type': 'short'},
-        'FPAGETTEMPTABLE'     :    { 'id': bytearray([0x00, 0x02, 0x00, 0x20]), 'retbytes': 64},
-        'SCALERGETZOOM'       :    { 'id': bytearray([0x00, 0x0D, 0x00, 0x03]), 'retbytes': 12},
-        'SCALERGETMAXZOOM'    :    { 'id': bytearray([0x00, 0x0D, 0x00, 0x03]), 'retbytes': 4, 'type': 'int' },
-        'GETSWVERSION'        :    { 'id': bytearray([0x00, 0x05, 0x00, 0x56]), 'retbytes': 12},
-        'SCALERSETZOOM'       :    { 'id': bytearray([0x00, 0x0D, 0x00, 0x02]), 'retbytes': 0},
-    }
+    COMMANDS = schema.legacyCommands()
+    
+    # Precompiled wire encoders, one per entry in COMMANDS
+    ENCODERS = dict((name, command.encoder) for name, command in SCHEMA.items())
     
     LUT = OrderedDict([
         (0x00000000   , 'WHITEHOT'),
@@ -99,39 +110,61 @@ class BosonControl():
     
     _lutstring = ''
     
-    class SCALER_ZOOM_PARAMS ():
-        
-        fields = OrderedDict([
-            ('zoom'      , 0x00000000),
-            ('xCenter'   , 0x00000000),
-            ('yCenter'   , 0x00000000),
-        ])
-        def toByteArray(self):
-            return bytearray(struct.pack('>i',self.fields['zoom']))+ \
-            bytearray(struct.pack('>i',self.fields['xCenter']))+ \
-            bytearray(struct.pack('>i',self.fields['yCenter']))
-        
-        #This needs to work on UNSTUFFED byte array
-        def fromByteArray(self, ba):
-            assert (len(ba)==12)
-            self.fields['zoom'] = struct.unpack('>i',ba[0:4])[0]
-            self.fields['xCenter'] = struct.unpack('>i',ba[4:8])[0]
-            self.fields['yCenter'] = struct.unpack('>i',ba[8:12])[0]
+    SCALER_ZOOM_PARAMS = schema.ScalerZoomParams
             
-    __instance = None
+    # One instance per serial port: BosonControl(port) twice returns the same
+    # controller, different ports get independent controllers
+    __instances = {}
+    __instanceslock = allocate_lock()
     started = False
-    def __new__(cls, *args, **kwargs):
-        if BosonControl.__instance is None:
-            BosonControl.__instance = object.__new__(cls)
-        return BosonControl.__instance
+    def __new__(cls, portname="/dev/ttyACM0", *args, **kwargs):
+        with BosonControl.__instanceslock:
+            if portname not in BosonControl.__instances:
+                BosonControl.__instances[portname] = object.__new__(cls)
+            return BosonControl.__instances[portname]
 
     #---------- Methods related to serial port handling ---------------
-    def __init__(self,portname="/dev/ttyACM0", timeout=1):
+    # timeout is the default reply deadline in seconds. policy is the default
+    # RetryPolicy of sendCmdAndGetReply, policies per command name overrides.
+    # transport is a transport.Transport or one of transport.TRANSPORTS by
+    # name; by default tcp:// and loop:// ports get theirs, the rest pyserial.
+    def __init__(self,portname="/dev/ttyACM0", timeout=1, pipelinedepth=4, cache=None, stats=None,
+                 policy=None, policies=None, recorder=None, transport=None):
         #This may give concurrency problems
         if self.started: return
 
+        self.timeout = timeout
+        self.policy = policy if policy is not None else RetryPolicy()
+        self.policies = dict(policies or {})
+        # times the link was flushed after lost replies and the port reopened
+        self.resyncs = 0
+        self.reopens = 0
+        self.closed = False
+
+        # optional ShadowCache answering gets and skipping redundant sets
+        self.cache = cache
+        # optional stats.Instrumentation, nothing is timed while it is None
+        self.stats = stats
+        # this port's session in the optional recorder.WireRecorder, getting
+        # every byte written and read
+        self.recorder = recorder.attach(portname) if recorder is not None else None
+        self._rxstart = None
+        # the transport while it is open, None once lost
         self.serialport=None
+        self.transport = makeTransport(portname, transport, min(timeout, POLL_INTERVAL))
+        # reused by every read, the decoder copies out what it keeps
+        self._rxbuf = bytearray(4096)
+        self.decoder = FrameDecoder()
         self.mutex = allocate_lock()
+        # replies are matched to requests by FBP sequence number
+        self._rxlock = allocate_lock()
+        self._sequence = count(1)
+        self._pending = {}
+        self.pipelinedepth = pipelinedepth
+        # set by CommandScheduler.start
+        self.scheduler = None
+        self._maxzoom = None
+        self._window = BoundedSemaphore(pipelinedepth)
         self.portname=portname
         self.open_port(timeout)
         self.started= True
@@ -139,43 +172,98 @@ class BosonControl():
     def open_port(self, timeout):
 
         self.mutex.acquire()
+        try:
+            if (self.serialport == None):
+                transport = self.transport
+                try:
+                    if not transport.isOpen():
+                        transport.open()
+                    transport.flushInput()
+                except Exception as e:
+                    raise PortError("Cannot open serial port '%s': %s" % (self.portname, e)) from e
+                self.serialport = transport
+                log.info('Opened %s with the %s transport', self.portname, transport.name)
+
+            self.serialport.flushInput()
+            self.serialport.flushOutput()
+            self.decoder.reset()
+        finally:
+            self.mutex.release()
 
-        if (self.serialport == None):
+    # Close the port, fail whatever is in flight and drop this controller
+    # from the per port instances, so BosonControl(portname) opens it anew
+    def close(self):
+        with BosonControl.__instanceslock:
+            if BosonControl.__instances.get(self.portname) is self:
+                del BosonControl.__instances[self.portname]
+        self.closed = True
+        self.mutex.acquire()
+        try:
+            self.serialport = None
             try:
-                self.serialport = serial.Serial(self.portname,921600,timeout=timeout,stopbits=1,bytesize=8,rtscts=False, dsrdtr=False)
-                self.serialport.flushInput()
-            except Exception as e:
-                print ("Exception opening serial port '%s' for display: %s\n" % (self.portname,e))
-                raise e
-                self.serialport = None
-        
-        self.serialport.reset_input_buffer()
-        self.serialport.reset_output_buffer()
+                self.transport.close()
+            except OSError as e:
+                log.warning('Closing %s: %s', self.portname, e)
+            self.decoder.reset()
+        finally:
+            self.mutex.release()
+        for sequence in list(self._pending):
+            self._complete(sequence, exception=PortError('Serial port %s closed' % self.portname))
+        log.info('Closed %s', self.portname)
 
-        self.mutex.release()
+    # Reopen after _lost, e.g. once a USB camera is plugged back in
+    def _reopen(self):
+        if self.closed:
+            raise PortError('Serial port %s is closed' % self.portname)
+        self.open_port(self.timeout)
+        self.reopens += 1
+        log.info('Reopened %s', self.portname)
+        if self.recorder is not None:
+            self.recorder.event('reopen')
+
+    # The port failed under us: drop it and fail everything in flight, the
+    # next command reopens it
+    def _lost(self, exception):
+        port, self.serialport = self.serialport, None
+        if port is None:
+            return
+        log.warning('Lost serial port %s: %s', self.portname, exception)
+        if self.recorder is not None:
+            self.recorder.event('lost: %s' % exception)
+        try:
+            port.close()
+        except Exception:
+            pass
+        self.decoder.reset()
+        for sequence in list(self._pending):
+            self._complete(sequence, exception=PortError('Lost serial port %s: %s' % (self.portname, exception)))
 
     def dump(self,packet,title=None):
         if not packet or len(packet)==0:
             return
 
-        #print ('%s: %s' % (title,packet))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('%s: %s', title, bytes(packet).hex())
 
 
     def recv_packet(self,extra_title=None):
-        # read up to 32 bytes until 0xff
-        packet=b''
-        count=0
-        while count<128:
-            s=self.serialport.read(1)
-            if s:
-                count+=1
-                packet=packet+bytes(s)
-            else:
-                import pdb;pdb.set_trace()
-                print ("ERROR: Timeout waiting for reply")
-                break
-            if s==b'\xae':
-                break
+        # feed whatever the port has into the decoder until a frame completes
+        decoder = self.decoder
+        buf = self._rxbuf
+        deadline = monotonic() + self.timeout
+        while not decoder.frames:
+            try:
+                n = self.serialport.readinto(buf)
+            except OSError as e:
+                self._lost(e)
+                raise PortError('Lost serial port %s: %s' % (self.portname, e)) from e
+            if n:
+                if self.recorder is not None:
+                    self.recorder.rx(memoryview(buf)[:n])
+                decoder.feed(buf, n)
+            elif monotonic() > deadline:
+                raise CommandTimeout('reply', self.timeout)
+        packet = decoder.frames.popleft()
 
         if extra_title:
             self.dump(packet,"recv: %s" % extra_title)
@@ -184,17 +272,38 @@ class BosonControl():
         return packet
 
     def _write_packet(self,packet):
+        self._write_packets((packet,))
+
+    # One transport write for all the packets
+    def _write_packets(self, packets):
 
-        if not self.serialport.isOpen():
-            sys.exit(1)
+        port = self.serialport
+        if port is None or not port.isOpen():
+            raise PortError('Serial port %s is not open' % self.portname)
 
-        # lets see if a completion message or someting
-        # else waits in the buffer. If yes dump it.
-        if self.serialport.inWaiting():
-            self.recv_packet("ignored")
+        try:
+            # lets see if a completion message or someting
+            # else waits in the buffer. If yes dump it.
+            if port.inWaiting() and self._rxlock.acquire(False):
+                try:
+                    buf = self._rxbuf
+                    n = port.readinto(buf)
+                    if self.recorder is not None:
+                        self.recorder.rx(memoryview(buf)[:n])
+                    self.decoder.feed(buf, n)
+                    while self.decoder.frames:
+                        self._dispatch(self.decoder.frames.popleft())
+                finally:
+                    self._rxlock.release()
 
-        #self.dump (packet, 'Sending packet')
-        self.serialport.write(packet)
+            #self.dump (packet, 'Sending packet')
+            port.writelines(packets)
+            if self.recorder is not None:
+                for packet in packets:
+                    self.recorder.tx(packet)
+        except OSError as e:
+            self._lost(e)
+            raise PortError('Lost serial port %s: %s' % (self.portname, e)) from e
         
     def send_packet(self, packet):
 
@@ -202,68 +311,309 @@ class BosonControl():
 
         self._write_packet(packet)
 
+        self._rxlock.acquire()
         reply = self.recv_packet()
+        self._rxlock.release()
 
         self.mutex.release()
 
         return reply
+
+    #---------- Pipelined commands matched by sequence number ---------------
+    def submit(self, commandname, data = bytearray()):
+        return self.submitMany(((commandname, data),))[0]
+
+    # Submits (name, data) commands, writing as many as the pipeline window
+    # takes in one transport write
+    def submitMany(self, commands):
+        if self.serialport is None:
+            self._reopen()
+        futures = []
+        batch = []
+        try:
+            for commandname, data in commands:
+                future = self._cached(commandname, data)
+                if future is None:
+                    if not self._window.acquire(False):
+                        # send what we have so its replies can free slots
+                        self._writeBatch(batch)
+                        batch = []
+                        self._acquireSlot()
+                    future = self._prepare(commandname, data)
+                    batch.append(future)
+                futures.append(future)
+        finally:
+            self._writeBatch(batch)
+        return futures
+
+    def _cached(self, commandname, data):
+        cache = self.cache
+        if cache is None:
+            return None
+        cached = cache.lookup(commandname)
+        if cached is not None:
+            future = BosonFuture(self, commandname, None, data)
+            future.replydata = cached
+            future.set_result(self.decodeData(cached, commandname))
+            return future
+        if cache.isRedundant(commandname, data):
+            future = BosonFuture(self, commandname, None, data)
+            future.replydata = b''
+            future.set_result(b'')
+            return future
+        return None
+
+    # wait for a free slot, reading replies ourselves if nobody else does
+    def _acquireSlot(self):
+        while not self._window.acquire(False):
+            pending = list(self._pending.values())
+            if pending:
+                self._pump(pending[0], 0.002)
+            elif self._window.acquire(True, 0.002):
+                break
+
+    def _prepare(self, commandname, data):
+        stats = self.stats
+        if stats is not None:
+            submitted = monotonic()
+        sequence = next(self._sequence) & 0xFFFFFFFF
+        try:
+            packet = self._construct_cmd(commandname, data, sequence)
+        except Exception:
+            self._window.release()
+            raise
+        future = BosonFuture(self, commandname, sequence, data)
+        future.packet = packet
+        self._pending[sequence] = future
+        if stats is not None:
+            future.submitted = submitted
+            future.encoded = monotonic()
+        return future
+
+    def _writeBatch(self, batch):
+        if not batch:
+            return
+        self.mutex.acquire()
+        locked = monotonic()
+        try:
+            self._write_packets([future.packet for future in batch])
+            written = monotonic()
+            for future in batch:
+                future.written = written
+                future.timeout = self.policyFor(future.commandname).timeout or self.timeout
+                future.deadline = written + future.timeout
+        except Exception as e:
+            for future in batch:
+                self._complete(future.sequence, exception=e)
+            raise
+        finally:
+            self.mutex.release()
+
+        stats = self.stats
+        if stats is not None:
+            for future in batch:
+                packet = future.packet
+                stats.record(future.commandname, 'encode', future.encoded - future.submitted)
+                stats.record(future.commandname, 'mutexwait', locked - future.encoded)
+                stats.record(future.commandname, 'write', written - locked)
+                stats.count('commands')
+                stats.count('bytessent', len(packet))
+                # flags, channel, FBP header and CRC take 17 bytes unstuffed
+                stats.count('stuffingoverhead', len(packet) - len(future.data) - 17)
+
+    def _pump(self, future, timeout=None):
+        deadline = None if timeout is None else monotonic() + timeout
+        while not future.done():
+            if deadline is not None and monotonic() >= deadline:
+                return
+            if self._rxlock.acquire(False):
+                try:
+                    if not future.done():
+                        self._read_replies()
+                finally:
+                    self._rxlock.release()
+            else:
+                wait((future,), 0.002)
+
+    def policyFor(self, commandname):
+        return self.policies.get(commandname, self.policy)
+
+    def _read_replies(self):
+        port = self.serialport
+        if port is None:
+            self._lost(PortError('closed'))
+            return
+        buf = self._rxbuf
+        try:
+            n = port.readinto(buf)
+        except OSError as e:
+            self._lost(e)
+            return
+        stats = self.stats
+        if not n:
+            self._expire()
+            return
+        if self.recorder is not None:
+            self.recorder.rx(memoryview(buf)[:n])
+        decoder = self.decoder
+        if stats is None:
+            decoder.feed(buf, n)
+            while decoder.frames:
+                self._dispatch(decoder.frames.popleft())
+            self._expire()
+            return
+
+        # a frame's first byte arrived with the chunk in which it started
+        now = monotonic()
+        inframe = decoder.inframe
+        started = self._rxstart if inframe else now
+        crcerrors = decoder.crcerrors
+        stats.count('bytesreceived', n)
+        decoder.feed(buf, n)
+        stats.count('crcerrors', decoder.crcerrors - crcerrors)
+        completed = bool(decoder.frames)
+        while decoder.frames:
+            self._dispatch(decoder.frames.popleft(), started)
+            started = now
+        if decoder.inframe:
+            self._rxstart = self._rxstart if inframe and not completed else now
+        self._expire()
+
+    # Fail the commands past their deadline. Once nothing is left in flight
+    # the link is resynchronized: stale bytes and any partial frame are
+    # flushed so the next reply is hunted from its start flag.
+    def _expire(self):
+        if not self._pending:
+            return
+        now = monotonic()
+        expired = [future for future in self._pending.values()
+                   if future.deadline is not None and now > future.deadline]
+        if not expired:
+            return
+        if self.stats is not None:
+            self.stats.count('timeouts', len(expired))
+        for future in expired:
+            self._complete(future.sequence, exception=CommandTimeout(future.commandname, future.timeout))
+        if not self._pending and self.serialport is not None:
+            try:
+                self.serialport.flushInput()
+            except OSError as e:
+                self._lost(e)
+                return
+            self.decoder.reset()
+            self.resyncs += 1
+            if self.recorder is not None:
+                self.recorder.event('resync')
+
+    def _dispatch(self, frame, started=None):
+        sequence = frameSequence(frame)
+        future = self._pending.get(sequence)
+        if future is None:
+            self.dump(frame, "recv: ignored")
+            if self.stats is not None:
+                self.stats.count('ignored')
+            return
+        self.dump(frame, "recv")
+        if self.stats is not None and future.submitted is not None:
+            if started is not None:
+                self.stats.record(future.commandname, 'firstbyte', started - future.written)
+            self.stats.record(future.commandname, 'roundtrip', monotonic() - future.submitted)
+        self._complete(sequence, frame)
+
+    def _complete(self, sequence, frame=None, exception=None):
+        future = self._pending.pop(sequence, None)
+        if future is None:
+            return
+        self._window.release()
+        cache = self.cache
+        if exception is None:
+            try:
+                data = Reply(frame).check(future.commandname).data
+                if cache is not None:
+                    cache.update(future.commandname, bytes(data) if data else future.data)
+                future.replydata = data
+                future.set_result(self.decodeData(data, future.commandname))
+            except Exception as e:
+                if cache is not None:
+                    cache.invalidate(future.commandname)
+                future.set_exception(e)
+        else:
+            if cache is not None:
+                cache.invalidate(future.commandname)
+            future.set_exception(exception)
+
+    # User commands as a batch of futures for getReply: through the scheduler
+    # in the interactive class when one owns the port, else pipelined with
+    # as few writes as the window allows. commands are (name, data) tuples.
+    def sendCmds(self, commands):
+        scheduler = self.scheduler
+        if scheduler is not None:
+            return [scheduler.submit(commandname, data, 'interactive') for commandname, data in commands]
+        return self.submitMany(commands)
+
+    # Result of a future from sendCmds, resending the command as its
+    # RetryPolicy says like sendCmdAndGetReply does
+    def getReply(self, future):
+        return self._settled(future.commandname, future.data, future).result()
+
+    def sendCmdsAndGetReplies(self, commands):
+        # commands is a list of names or (name, data) tuples
+        futures = self.sendCmds([(command, b'') if isinstance(command, str) else command
+                                 for command in commands])
+        return [self.getReply(future) for future in futures]
     
     #---------- Using Frame and Fbp to assemble packet ---------------
-    def _construct_cmd(self, _command_name, _data = bytearray()):
-        payload = Fbp(self.COMMANDS[_command_name]['id'], _data)
-        
-        frame = Frame(payload.raw())
-        
-        serial_cmd = frame.raw()
-        return serial_cmd
+    def _construct_cmd(self, _command_name, _data = bytearray(), _sequence = None):
+        return self.ENCODERS[_command_name].encode(_data, _sequence)
         
     ####### Poor man's data extractor. reply must be unstuffed please##
+    # Raises CommandFailed when the camera reports a non zero status
     def getDataFromReply(self, reply, commandname):
-        _type = None
-        length = self.COMMANDS[commandname]['retbytes']
-        if 'type' in self.COMMANDS[commandname]:
-            _type = self.COMMANDS[commandname]['type']
-        
-        end = -3
-        start = end-length
-        status = start - 4
-        #print ('Command status is %s' % reply[status:start])
-        if _type == 'int':
-            return struct.unpack('>i',reply[start:end])[0]
-        elif _type == 'float':
-            return struct.unpack('>f',reply[start:end])[0]
-        elif _type == 'short':
-            return struct.unpack('>h',reply[start:end])[0]
-        else:
-            return reply[start:end]
+        return self.decodeData(Reply(reply).check(commandname).data, commandname)
+
+    # data bytes of an unstuffed reply frame, as a memoryview: after flag,
+    # channel and FBP header, before CRC and end flag
+    def getReplyData(self, reply, commandname):
+        return memoryview(reply)[14:-3]
+
+    def decodeData(self, data, commandname):
+        return self.SCHEMA[commandname].decode(data)
     
+    # Retries on timeouts and port errors as the command's RetryPolicy says,
+    # so a call takes at most policy.bound(self.timeout) seconds
     def sendCmdAndGetReply(self, commandname, data = bytearray()):
-        retdata = b''
-        reply = byteUnstuff(self.send_packet(self._construct_cmd(commandname, data)))
-        if self.COMMANDS[commandname]['retbytes']==4:
-             retdata = self.getDataFromReply(reply, commandname)
-        #elif self.COMMANDS[commandname]['retbytes']!=0:
-        else:
-             retdata = self.getDataFromReply(reply, commandname)
+        return self._settled(commandname, data).result()
 
-        #import pdb;pdb.set_trace()
-        return retdata
+    # The successful future of a command, sent (again) until its RetryPolicy
+    # gives up; its replydata holds the undecoded reply
+    def _settled(self, commandname, data, future=None):
+        policy = self.policyFor(commandname)
+        pauses = policy.pauses()
+        while True:
+            try:
+                # user commands jump the queue when a CommandScheduler owns the port
+                if future is None:
+                    future = self.sendCmds(((commandname, data),))[0]
+                future.result()
+                return future
+            except policy.retryon as e:
+                pause = next(pauses, None)
+                if pause is None:
+                    raise
+                log.info('Retrying %s in %.3fs: %s', commandname, pause, e)
+                sleep(pause)
+                future = None
 
     #---------- Methods supposed to be invoked from users --------------
-    def getSerial(self):
-        return self.sendCmdAndGetReply('GETSERIAL')
-    
+    # Plain getters and setters are generated from schema.METHODS
     def getColorLut(self):
         color_enabled = self.sendCmdAndGetReply('COLORLUTGETCONTROL')
         if not color_enabled:
-            self._lutstring == 'GREYSCALE'
+            self._lutstring = 'GREYSCALE'
             return 'GREYSCALE'
         else:
             return self.LUT[self.sendCmdAndGetReply('GETCOLORLUT')]
         
-    def getPartNumber(self):
-        return self.sendCmdAndGetReply('GETPARTNUMBER')
-        
     def setColorLut(self, lutstring):
         if lutstring == 'GREYSCALE':
             self._lutstring = 'GREYSCALE'
@@ -279,68 +629,19 @@ class BosonControl():
     def setGainState(self, gainstring):
         return self.sendCmdAndGetReply('SETGAINMODE', ToByteArray(_getKeyFromValue(self.GAINMODE, gainstring)))
         
-    def getAgcLinearPercent(self):
-        return self.sendCmdAndGetReply('ACGGETLINEARPERCENT')
-    
-    def getAgcOutlierCut(self):
-        return self.sendCmdAndGetReply('ACGGETOUTLIERCUT')    
-
-    def getAgcMaxGain(self):
-        return self.sendCmdAndGetReply('ACGGETMAXGAIN')        
-        
-    def setAgcMaxGain(self, value):
-        return self.sendCmdAndGetReply('ACGSETMAXGAIN', ToByteArray(value))
-        
-    def setLinearPercent(self, value):
-        return self.sendCmdAndGetReply('ACGSETLINEARPERCENT', ToByteArray(value))
-        
-    def setOutlierCut(self, value):
-        return self.sendCmdAndGetReply('ACGSETOUTLIERCUT', ToByteArray(value))
-        
-    def restoreDefaults(self):
-        return self.sendCmdAndGetReply('ACGRESTOREDEFAULT')
-        
-    def setAgcDumpingFactor(self, value):
-        return self.sendCmdAndGetReply('ACGSETDUMPINGFACTOR', ToByteArray(value))
-        
-    def getAgcDumpingFactor(self):
-        return self.sendCmdAndGetReply('ACGGETDUMPINGFACTOR')
-        
-    def setAgcGamma(self,value):
-        return self.sendCmdAndGetReply('ACGSETGAMMA', ToByteArray(value))
-        
-    def getAgcGamma(self):
-        return self.sendCmdAndGetReply('ACGGETGAMMA')
-        
-    def setAgcDtbr(self,value):
-        return self.sendCmdAndGetReply('ACGSETDTBR', ToByteArray(value))
-        
-    def getAgcDtbr(self):
-        return self.sendCmdAndGetReply('ACGGETDTBR')
-        
-    def setAgcSigmar(self,value):
-        return self.sendCmdAndGetReply('ACGSETSIGMAR', ToByteArray(value))
-        
-    def getAgcSigmar(self):
-        return self.sendCmdAndGetReply('ACGGETSIGMAR')
-        
     def getSwVersion(self):
-        #This is cheating. It's Michele's fault :)
-        sv = self.SCALER_ZOOM_PARAMS()
-        sv.fromByteArray(self.sendCmdAndGetReply('GETSWVERSION'))
-        major = sv.fields['zoom']
-        minor = sv.fields['xCenter']
-        patch = sv.fields['yCenter']
-        print ('SW version is %d.%d.%d' %(major, minor, patch))
-        
+        sv = self.sendCmdAndGetReply('GETSWVERSION')
+        log.debug('SW version is %d.%d.%d', sv.major, sv.minor, sv.patch)
+        return sv
                 
     def getFpaTempTable(self):
-        fpa_temp_table = self.sendCmdAndGetReply('FPAGETTEMPTABLE')
-        #print('stuffed packet is %s' % fpa_temp_table)
-        #print('unstuffed packet is %s' % byteUnstuff(fpa_temp_table))
-        #print('table array is %s' % )
-        temparray = FpaTableToIntArray(byteUnstuff(fpa_temp_table))
+        temparray = decodeFpaTable(self.sendCmdAndGetReply('FPAGETTEMPTABLE'))
         return min(temparray), max(temparray)
+
+    # Full table plus min, max, mean and gradient. out is an optional
+    # preallocated array('h') or NumPy array of 32 entries to decode into
+    def getFpaTempStats(self, out=None):
+        return fpaTableStats(self.sendCmdAndGetReply('FPAGETTEMPTABLE'), out)
         
     def setEntropy(self,value):
         if value:
@@ -355,29 +656,32 @@ class BosonControl():
         elif retval == 0:
             return False
         else:
-            assert(True)
+            raise ValueError('Unexpected entropy state %r' % retval)
             
     def getScalerZoom(self):
-        zoom_params = self.SCALER_ZOOM_PARAMS()
-        zoom_params.fromByteArray(self.sendCmdAndGetReply('SCALERGETZOOM'))
-        return zoom_params.fields['zoom']
+        return self.sendCmdAndGetReply('SCALERGETZOOM').zoom
         
     def setScalerZoom(self,value):
-        #Know what is the max you can set and exit if necessary
-        max_zoom = self.sendCmdAndGetReply('SCALERGETMAXZOOM')
-        print ('Max Zoom is %s' % max_zoom)
-        if (value > max_zoom):
+        #Know what is the max you can set and exit if necessary. It is fixed
+        #per camera, so it is asked only once
+        if self._maxzoom is None:
+            self._maxzoom = self.sendCmdAndGetReply('SCALERGETMAXZOOM')
+            log.debug('Max Zoom is %s', self._maxzoom)
+        if (value > self._maxzoom):
             return
         
-        #Get Current Zoom parameters    
-        zoom_params = self.SCALER_ZOOM_PARAMS()
-        zoom_params.fromByteArray(self.sendCmdAndGetReply('SCALERGETZOOM'))
-        
-        #Alter Zoom level only
-        zoom_params.fields['zoom'] = value
+        #Get Current Zoom parameters and alter Zoom level only
+        zoom_params = self.sendCmdAndGetReply('SCALERGETZOOM')
+        zoom_params.zoom = value
         
-        return self.sendCmdAndGetReply('SCALERSETZOOM', zoom_params.toByteArray())
+        return self.sendCmdAndGetReply('SCALERSETZOOM', zoom_params.pack())
         
+    def getProfile(self, name=''):
+        return CameraProfile.snapshot(self, name=name)
+
+    def setProfile(self, profile):
+        return profile.apply(self)
+
     def test_LUT(self):
         print ('Part number is %s' % self.getPartNumber())
         sleep(1)
@@ -403,19 +707,11 @@ def ToByteArray(_i):
     elif isinstance(_i, float):
         frmt = '>f'
     else:
-        assert(True)
+        raise TypeError('Cannot encode %r' % (_i,))
     
     return struct.pack(frmt,_i)
     
 def FpaTableToIntArray(table):
-    skipme=False
-    arr=[]
-    for pos in range(0, len(table)-1):
-        if not skipme:
-            twobytes = table[pos: pos+2]
-            arr.append(struct.unpack('>h',twobytes)[0])
-            skipme=True
-        else:
-            skipme=False
-    return arr
+    pairs = len(table) // 2
+    return list(struct.unpack('>%dh' % pairs, bytes(table[:pairs*2])))
     
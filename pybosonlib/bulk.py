@@ -0,0 +1,293 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyBoson3 chunked bulk transfers over the MEM and FILEOPS commands
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyBoson-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+import struct, logging
+from time import sleep
+from collections import OrderedDict, deque
+from .schema import CaptureRange, GainRange, FlashRange, FlashErase
+from .reply import BosonError, CommandFailed, CommandTimeout, CrcError
+
+log = logging.getLogger('pybosonlib.bulk')
+
+# FLR_MEM_LOCATION_E
+MEM_LOCATION = OrderedDict([
+    (0x00000000   , 'INVALID'),
+    (0x00000001   , 'BOOTLOADER'),
+    (0x00000002   , 'UPGRADE_APP'),
+    (0x00000003   , 'LENS_NVFFC'),
+    (0x00000004   , 'LENS_SFFC'),
+    (0x00000005   , 'LENS_GAIN'),
+    (0x00000006   , 'LENS_DISTORTION'),
+    (0x00000007   , 'USER_SPACE'),
+    (0x00000008   , 'RUN_CMDS'),
+    (0x00000009   , 'JFFS2'),
+])
+
+# Largest data of one command, from the IDD
+MEM_READ_CHUNK = 512
+MEM_WRITE_CHUNK = 256
+FILE_CHUNK = 128
+
+# fileOpsFseek origins
+SEEK_SET = 0
+
+_FLASH_WRITE = struct.Struct('>iBIH')
+
+# Errors worth sending a chunk again for. Anything else, such as a camera
+# status like R_CAM_API_INVALID_INPUT, fails the same way every time.
+RETRYABLE = (CommandTimeout, CrcError)
+
+# A transfer gave up. done is the number of bytes transferred in order, so
+# the same call with offset + done resumes it.
+class BulkError(BosonError):
+
+    def __init__(self, message, done, cause=None):
+        BosonError.__init__(self, '%s after %d bytes: %s' % (message, done, cause))
+        self.done = done
+        self.cause = cause
+
+def _location(location):
+    if isinstance(location, str):
+        for value, name in MEM_LOCATION.items():
+            if name == location:
+                return value
+        raise KeyError('Unknown flash location %s' % location)
+    return location
+
+# Where chunks go: a file-like object with write(), a writable buffer
+# (bytearray, array, NumPy array, mmap) or None for a new bytearray
+class _Sink():
+
+    def __init__(self, out, size):
+        if out is None:
+            out = bytearray(size)
+        self.out = out
+        self.write = getattr(out, 'write', None)
+        if self.write is None:
+            self.view = memoryview(out).cast('B')
+            if len(self.view) < size:
+                raise ValueError('Output buffer holds %d bytes, %d needed' % (len(self.view), size))
+
+    def put(self, position, data):
+        if self.write is not None:
+            self.write(data)
+        else:
+            self.view[position:position + len(data)] = data
+
+    def result(self):
+        return self.out
+
+# Splits reads and writes of large camera objects into the largest chunks a
+# command carries and keeps window chunk commands in flight through
+# BosonControl.submit, or in the bulk class of the control's CommandScheduler
+# when one is attached so interactive commands keep their reserve. Every
+# chunk is checked (status, CRC, length); timeouts and CRC errors send it
+# again up to retries times, other errors end the transfer at once. Results
+# are written in order as they arrive.
+class BulkTransfer():
+
+    def __init__(self, control, window=None, retries=3, backoff=0.01):
+        self.control = control
+        self.window = window or control.pipelinedepth
+        self.retries = retries
+        self.backoff = backoff
+        self.chunks = 0
+        self.resent = 0
+
+    # chunks is a list of (position, length, commandname, data); returns the
+    # bytes done after every reply went to put(position, data) in order
+    def _run(self, chunks, put, what, check=None, retries=None):
+        if retries is None:
+            retries = self.retries
+        queue = deque(chunks)
+        inflight = deque()
+        done = 0
+        attempts = {}
+        while queue or inflight:
+            while queue and len(inflight) < self.window:
+                chunk = queue.popleft()
+                try:
+                    inflight.append((chunk, self._submit(chunk[2], chunk[3]), None))
+                except Exception as e:
+                    inflight.append((chunk, None, e))
+                    break
+            chunk, future, error = inflight.popleft()
+            try:
+                if error is not None:
+                    raise error
+                data = future.result()
+                if check is not None:
+                    data = check(chunk, data)
+            except RETRYABLE as e:
+                attempt = attempts.get(chunk[0], 0) + 1
+                attempts[chunk[0]] = attempt
+                if attempt > retries:
+                    self._drain(inflight)
+                    raise BulkError('%s failed' % what, done, e) from e
+                log.info('%s: resending chunk at %d: %s', what, chunk[0], e)
+                self.resent += 1
+                # everything after it is sent again too, so the order holds
+                queue.extendleft(reversed([chunk] + [c for c, _, _ in inflight]))
+                self._drain(inflight)
+                self._pause(attempt)
+                continue
+            except BosonError as e:
+                self._drain(inflight)
+                raise BulkError('%s failed' % what, done, e) from e
+            put(chunk[0], data)
+            done += chunk[1]
+            self.chunks += 1
+        return done
+
+    def _submit(self, commandname, data):
+        scheduler = self.control.scheduler
+        if scheduler is not None:
+            return scheduler.submit(commandname, data, 'bulk')
+        return self.control.submit(commandname, data)
+
+    def _drain(self, inflight):
+        while inflight:
+            _, future, _ = inflight.popleft()
+            if future is not None:
+                future.exception()
+
+    def _pause(self, attempt):
+        sleep(self.backoff * 2 ** (attempt - 1))
+
+    def _read(self, commandname, request, size, chunksize, out, what):
+        sink = _Sink(out, size)
+        chunks = []
+        for position in range(0, size, chunksize):
+            length = min(chunksize, size - position)
+            chunks.append((position, length, commandname, request(position, length).pack()))
+
+        def check(chunk, data):
+            if len(data) != chunk[1]:
+                raise CommandFailed(commandname, 0xFFFFFFFF)
+            return data
+        self._run(chunks, sink.put, what, check)
+        return sink.result()
+
+    #---------- MEM ---------------
+    # Read size bytes (default all) of a flash location from offset
+    def readFlash(self, location, index=0, offset=0, size=None, out=None):
+        location = _location(location)
+        if size is None:
+            size = self.control.sendCmdAndGetReply('MEMGETFLASHSIZE', struct.pack('>i', location)) - offset
+        return self._read('MEMREADFLASH', lambda position, length: FlashRange(location, index, offset + position, length),
+                          size, MEM_READ_CHUNK, out, 'readFlash')
+
+    # Write data (bytes-like or file-like with read()) to a flash location,
+    # optionally erasing the whole location first
+    def writeFlash(self, location, data, index=0, offset=0, erase=False):
+        location = _location(location)
+        if hasattr(data, 'read'):
+            data = data.read()
+        data = memoryview(data).cast('B')
+        if erase:
+            self.control.sendCmdAndGetReply('MEMERASEFLASH', struct.pack('>iB', location, index))
+        chunks = []
+        for position in range(0, len(data), MEM_WRITE_CHUNK):
+            piece = data[position:position + MEM_WRITE_CHUNK]
+            chunks.append((position, len(piece), 'MEMWRITEFLASH',
+                           _FLASH_WRITE.pack(location, index, offset + position, len(piece)) + piece))
+        return self._run(chunks, lambda position, reply: None, 'writeFlash')
+
+    def eraseFlash(self, location, index=0, offset=None, length=None):
+        location = _location(location)
+        if offset is None:
+            return self.control.sendCmdAndGetReply('MEMERASEFLASH', struct.pack('>iB', location, index))
+        return self.control.sendCmdAndGetReply('MEMERASEFLASHPARTIAL', FlashErase(location, index, offset, length).pack())
+
+    # Read capture buffer bufferNum, size bytes (default all) from offset
+    def readCapture(self, bufferNum=0, offset=0, size=None, out=None):
+        if size is None:
+            size = self.control.sendCmdAndGetReply('MEMGETCAPTURESIZE').bytes - offset
+        return self._read('MEMREADCAPTURE', lambda position, length: CaptureRange(bufferNum, offset + position, length),
+                          size, MEM_READ_CHUNK, out, 'readCapture')
+
+    # Read the currently applied gain table
+    def readGain(self, offset=0, size=None, out=None):
+        if size is None:
+            size = self.control.sendCmdAndGetReply('MEMGETGAINSIZE').bytes - offset
+        return self._read('MEMREADCURRENTGAIN', lambda position, length: GainRange(offset + position, length),
+                          size, MEM_READ_CHUNK, out, 'readGain')
+
+    #---------- FILEOPS ---------------
+    # Read a camera file. fread moves the file pointer, so after an error the
+    # file is seeked back to the first missing byte and the rest resent.
+    def readFile(self, path, out=None, offset=0):
+        size = self.control.sendCmdAndGetReply('FILEOPSGETFILESIZE', struct.pack('>128s', path.encode())) - offset
+        sink = _Sink(out, size)
+
+        def chunks(fileid, position):
+            return [(p, min(FILE_CHUNK, size - p), 'FILEOPSFREAD', struct.pack('>II', fileid, min(FILE_CHUNK, size - p)))
+                    for p in range(position, size, FILE_CHUNK)]
+
+        def check(chunk, data):
+            if data.ret != chunk[1]:
+                raise CommandFailed('FILEOPSFREAD', 0xFFFFFFFF)
+            return memoryview(data.buf)[:data.ret]
+        self._file(path, 'r', offset, size, chunks, sink.put, check, 'readFile')
+        return sink.result()
+
+    # Write data (bytes-like or file-like with read()) to a camera file
+    def writeFile(self, path, data):
+        if hasattr(data, 'read'):
+            data = data.read()
+        data = bytes(data)
+
+        def chunks(fileid, position):
+            return [(p, len(data[p:p + FILE_CHUNK]), 'FILEOPSFWRITE',
+                     struct.pack('>II128s', fileid, len(data[p:p + FILE_CHUNK]), data[p:p + FILE_CHUNK]))
+                    for p in range(position, len(data), FILE_CHUNK)]
+
+        def check(chunk, written):
+            if written != chunk[1]:
+                raise CommandFailed('FILEOPSFWRITE', 0xFFFFFFFF)
+            return written
+        self._file(path, 'w', 0, len(data), chunks, lambda p, written: None, check, 'writeFile')
+        return len(data)
+
+    def _file(self, path, mode, offset, size, chunks, put, check, what):
+        fileid = self.control.sendCmdAndGetReply('FILEOPSFOPEN', struct.pack('>128s128s', path.encode(), mode.encode()))
+        try:
+            position = 0
+            attempt = 0
+            while position < size or attempt == 0:
+                attempt += 1
+                try:
+                    self.control.sendCmdAndGetReply('FILEOPSFSEEK', struct.pack('>III', fileid, offset + position, SEEK_SET))
+                    position += self._run(chunks(fileid, position), put, what, check, retries=0)
+                    break
+                except (BulkError,) + RETRYABLE as e:
+                    cause = e
+                    if isinstance(e, BulkError):
+                        position += e.done
+                        cause = e.cause
+                    if attempt > self.retries or not isinstance(cause, RETRYABLE):
+                        raise BulkError('%s failed' % what, position, cause) from e
+                    self.resent += 1
+                    self._pause(attempt)
+        finally:
+            self.control.sendCmdAndGetReply('FILEOPSFCLOSE', struct.pack('>I', fileid))
@@ -0,0 +1,275 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyBoson3 latest-wins channels for continuously updated settings
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyBoson-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+import threading, logging
+from time import monotonic
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeout
+from .schema import COMMANDS
+from .reply import BosonError
+
+log = logging.getLogger('pybosonlib.coalesce')
+
+# A value was set on a Coalescer that is not running
+class CoalescerStopped(BosonError):
+    pass
+
+# One setting written by a Coalescer. set() only stores the value: while a
+# write is in flight newer values replace each other and the last one is
+# sent when the write completes. limit, if given, turns a value into the one
+# the camera accepts before it is encoded. applied is the last value the
+# camera acknowledged, as sent, error the exception of the last failed write.
+class Channel():
+
+    def __init__(self, coalescer, commandname, encode, limit=None):
+        self.coalescer = coalescer
+        self.commandname = commandname
+        self.encode = encode
+        self.limit = limit
+        self.value = None
+        self.applied = None
+        self.appliedat = None
+        self.error = None
+        self.writes = 0
+        self.superseded = 0
+        self.failures = 0
+        self._dirty = False
+        self._inflight = False
+        # RetryPolicy.pauses() of the current value once a write failed, and
+        # the monotonic time its resend is due
+        self._pauses = None
+        self._retryat = 0.0
+        self._future = None
+        self._sending = None
+
+    def set(self, value):
+        self.coalescer._set(self, value)
+
+    @property
+    def busy(self):
+        return self._dirty or self._inflight
+
+    # Block until the latest value is applied or failed; returns applied
+    def wait(self, timeout=None):
+        with self.coalescer._condition:
+            if not self.coalescer._condition.wait_for(lambda: not self.busy, timeout):
+                raise TimeoutError('%s still pending' % self.commandname)
+        return self.applied
+
+    def snapshot(self):
+        return OrderedDict([
+            ('value', self.value),
+            ('applied', self.applied),
+            ('writes', self.writes),
+            ('superseded', self.superseded),
+            ('failures', self.failures),
+            ('error', None if self.error is None else str(self.error)),
+        ])
+
+# Latest-wins writes for settings driven by a UI (zoom, AGC sliders). Each
+# channel has at most one write in flight; updates arriving meanwhile are
+# coalesced so only the newest reaches the camera, and nothing queues up
+# behind obsolete values. A thread submits the writes and reads the replies;
+# with a CommandScheduler attached they go in the interactive class.
+#
+# onapplied(channel, value) is called from that thread after every
+# acknowledged write.
+class Coalescer():
+
+    def __init__(self, control, onapplied=None, poll=0.005):
+        self.control = control
+        self.onapplied = onapplied
+        self.poll = poll
+        self.channels = OrderedDict()
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+        self._zoomparams = None
+        self._maxzoom = None
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='boson-coalescer', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._thread.join()
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # Channel writing commandname; encode turns a value into the command data
+    def channel(self, commandname, encode=None, limit=None):
+        with self._condition:
+            channel = self.channels.get(commandname)
+            if channel is None:
+                channel = Channel(self, commandname, encode or COMMANDS[commandname].encode, limit)
+                self.channels[commandname] = channel
+        return channel
+
+    def set(self, commandname, value):
+        channel = self.channel(commandname)
+        channel.set(value)
+        return channel
+
+    #---------- Common settings ---------------
+    def zoom(self, value):
+        channel = self.channel('SCALERSETZOOM', self._encodeZoom, self._limitZoom)
+        channel.set(value)
+        return channel
+
+    def gamma(self, value):
+        return self.set('ACGSETGAMMA', value)
+
+    def linearPercent(self, value):
+        return self.set('ACGSETLINEARPERCENT', value)
+
+    def maxGain(self, value):
+        return self.set('ACGSETMAXGAIN', value)
+
+    # The limit and the zoom centre are read once; later zooms are a single
+    # SCALERSETZOOM clamped to the limit
+    def _limitZoom(self, value):
+        if self._maxzoom is None:
+            self._maxzoom = self.control.sendCmdAndGetReply('SCALERGETMAXZOOM')
+        return max(0, min(int(value), self._maxzoom))
+
+    def _encodeZoom(self, value):
+        if self._zoomparams is None:
+            self._zoomparams = self.control.sendCmdAndGetReply('SCALERGETZOOM')
+        params = self._zoomparams
+        params.zoom = value
+        return params.pack()
+
+    def _set(self, channel, value):
+        with self._condition:
+            if not self._running:
+                raise CoalescerStopped('Coalescer is not running')
+            if channel._dirty:
+                channel.superseded += 1
+            channel.value = value
+            channel._dirty = True
+            channel._pauses = None
+            channel._retryat = 0.0
+            self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if not self._running:
+                        return
+                    now = monotonic()
+                    inflight = [c for c in self.channels.values() if c._inflight]
+                    ready = [c for c in self.channels.values()
+                             if c._dirty and not c._inflight and c._retryat <= now]
+                    if inflight or ready:
+                        break
+                    # only resends waiting out their pause, if anything
+                    due = [c._retryat - now for c in self.channels.values() if c._dirty]
+                    self._condition.wait(min(due) if due else None)
+                for channel in ready:
+                    channel._dirty = False
+                    channel._inflight = True
+                    channel._sending = channel.value
+            for channel in ready:
+                self._send(channel)
+                inflight.append(channel)
+            if inflight:
+                # reads replies for all of them; returns early to send new values
+                try:
+                    inflight[0]._future.exception(self.poll)
+                except FutureTimeout:
+                    pass
+            for channel in inflight:
+                if channel._future.done():
+                    self._finish(channel)
+
+    def _send(self, channel):
+        try:
+            if channel.limit is not None:
+                channel._sending = channel.limit(channel._sending)
+            data = channel.encode(channel._sending)
+            scheduler = self.control.scheduler
+            if scheduler is not None:
+                future = scheduler.submit(channel.commandname, data, 'interactive')
+            else:
+                future = self.control.submit(channel.commandname, data)
+        except Exception as e:
+            future = _Failed(e)
+        channel.writes += 1
+        channel._future = future
+
+    def _finish(self, channel):
+        future = channel._future
+        exception = future.exception(0)
+        callback = None
+        with self._condition:
+            channel._future = None
+            channel._inflight = False
+            if exception is None:
+                channel.applied = channel._sending
+                channel.appliedat = monotonic()
+                channel.error = None
+                callback = self.onapplied
+            else:
+                channel.failures += 1
+                channel.error = exception
+                log.info('%s of %r failed: %s', channel.commandname, channel._sending, exception)
+                # resend after the policy's pause unless a newer value is
+                # already waiting
+                policy = self.control.policyFor(channel.commandname)
+                if not channel._dirty and isinstance(exception, policy.retryon):
+                    if channel._pauses is None:
+                        channel._pauses = policy.pauses()
+                    pause = next(channel._pauses, None)
+                    if pause is not None:
+                        channel._retryat = monotonic() + pause
+                        channel._dirty = True
+            self._condition.notify_all()
+        if callback is not None:
+            callback(channel, channel.applied)
+
+# Future of a write that could not be submitted
+class _Failed():
+
+    def __init__(self, exception):
+        self._exception = exception
+
+    def done(self):
+        return True
+
+    def exception(self, timeout=None):
+        return self._exception
@@ -0,0 +1,469 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyBoson3 daemon sharing one camera between processes
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyBoson-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+import os, socket, struct, tempfile, threading, logging, argparse
+from itertools import count
+from concurrent.futures import Future, ThreadPoolExecutor
+from . import schema
+from .boson import BosonControl
+from .reply import BosonError, CommandFailed, CommandTimeout, PortError
+
+log = logging.getLogger('pybosonlib.daemon')
+
+# The socket lives in the user's private runtime directory, or in the temp
+# directory under a per user name
+def defaultSocket():
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime:
+        return os.path.join(runtime, 'boson.sock')
+    return os.path.join(tempfile.gettempdir(), 'boson-%d.sock' % os.getuid())
+
+DEFAULT_SOCKET = defaultSocket()
+
+#---------- Wire protocol ---------------
+# Every message is a big endian u32 length followed by the body. A body is
+#   u32 request id, u8 op, u32 FBP function id or status, data
+# Requests:  OP_COMMAND (function id, request data), OP_SUBSCRIBE (0, no data)
+# Responses: OP_REPLY   (status, reply data or error text),
+#            OP_NOTIFY  (request id 0, function id, data of a set some client sent)
+OP_COMMAND   = 0x01
+OP_SUBSCRIBE = 0x02
+OP_REPLY     = 0x81
+OP_NOTIFY    = 0x82
+
+# Host side statuses, above any camera FLR_RESULT
+E_TIMEOUT    = 0xFFFF0001
+E_PORT       = 0xFFFF0002
+E_OTHER      = 0xFFFF0003
+
+_LENGTH = struct.Struct('>I')
+_HEADER = struct.Struct('>IBI')
+
+def _pack(requestid, op, value, data=b''):
+    body = _HEADER.pack(requestid, op, value) + data
+    return _LENGTH.pack(len(body)) + body
+
+def _recvexact(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+def _recvmessage(sock):
+    length = _recvexact(sock, 4)
+    if length is None:
+        return None
+    body = _recvexact(sock, _LENGTH.unpack(length)[0])
+    if body is None or len(body) < _HEADER.size:
+        return None
+    requestid, op, value = _HEADER.unpack_from(body)
+    return requestid, op, value, body[_HEADER.size:]
+
+def _errorStatus(exception):
+    if isinstance(exception, CommandFailed):
+        return exception.status, b''
+    if isinstance(exception, CommandTimeout):
+        return E_TIMEOUT, struct.pack('>f', exception.timeout)
+    if isinstance(exception, PortError):
+        return E_PORT, str(exception).encode()
+    return E_OTHER, str(exception).encode()
+
+def _errorFromStatus(commandname, status, data):
+    if status == E_TIMEOUT:
+        return CommandTimeout(commandname, struct.unpack('>f', data)[0])
+    if status == E_PORT:
+        return PortError(data.decode(errors='replace'))
+    if status == E_OTHER:
+        return BosonError(data.decode(errors='replace'))
+    return CommandFailed(commandname, status)
+
+#---------- Server ---------------
+class _Client():
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.sendlock = threading.Lock()
+        self.subscribed = False
+
+    def send(self, message):
+        with self.sendlock:
+            try:
+                self.sock.sendall(message)
+            except OSError:
+                pass
+
+def _alive(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        return False
+    finally:
+        sock.close()
+    return True
+
+# Owns one BosonControl and serves it on a Unix domain socket, readable and
+# writable by its user only. Requests are sent in the order each client makes
+# them and settled on worker threads through sendCmdAndGetReply's path, so
+# they get the control's RetryPolicy and, when one is attached, go through
+# its CommandScheduler. Concurrent identical gets (commands without request
+# data) from any clients share one camera round trip unless another command
+# was sent since; every successful set is pushed to subscribed clients.
+class BosonDaemon():
+
+    def __init__(self, control, path=None, coalesce=True, workers=8):
+        self.control = control
+        self.path = path or DEFAULT_SOCKET
+        self.coalesce = coalesce
+        self.workers = workers
+        self.clients = []
+        self.requests = 0
+        self.coalesced = 0
+        self._inflight = {}
+        self._lock = threading.RLock()
+        self._running = False
+        self._sock = None
+        self._executor = None
+        self._threads = []
+
+    def start(self):
+        if os.path.exists(self.path):
+            if _alive(self.path):
+                raise BosonError('Another daemon is serving %s' % self.path)
+            # left behind by a daemon that died
+            os.unlink(self.path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.path)
+        # nobody can connect before listen()
+        os.chmod(self.path, 0o600)
+        self._sock.listen(16)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='boson-daemon-worker')
+        self._running = True
+        thread = threading.Thread(target=self._accept, name='boson-daemon', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._running = False
+        try:
+            # unblock accept()
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+        with self._lock:
+            clients = list(self.clients)
+        for client in clients:
+            try:
+                client.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def serveForever(self):
+        self.start()
+        try:
+            while self._running:
+                self._threads[0].join(1)
+        finally:
+            self.stop()
+
+    def _accept(self):
+        while self._running:
+            try:
+                sock, _ = self._sock.accept()
+            except OSError:
+                return
+            client = _Client(sock)
+            with self._lock:
+                self.clients.append(client)
+            thread = threading.Thread(target=self._serve, args=(client,), name='boson-daemon-client', daemon=True)
+            thread.start()
+
+    def _serve(self, client):
+        try:
+            while self._running:
+                message = _recvmessage(client.sock)
+                if message is None:
+                    return
+                requestid, op, value, data = message
+                if op == OP_COMMAND:
+                    self._command(client, requestid, value, data)
+                elif op == OP_SUBSCRIBE:
+                    client.subscribed = True
+                    client.send(_pack(requestid, OP_REPLY, 0))
+                else:
+                    client.send(_pack(requestid, OP_REPLY, E_OTHER, b'Unknown op'))
+        except OSError:
+            return
+        finally:
+            with self._lock:
+                self.clients.remove(client)
+            client.sock.close()
+
+    def _command(self, client, requestid, functionid, data):
+        self.requests += 1
+        command = schema.BYID.get(functionid)
+        if command is None:
+            client.send(_pack(requestid, OP_REPLY, E_OTHER, b'Unknown command 0x%08X' % functionid))
+            return
+
+        def respond(future):
+            if future.cancelled():
+                # the daemon is stopping
+                return
+            exception = future.exception()
+            if exception is None:
+                client.send(_pack(requestid, OP_REPLY, 0, future.result()))
+            else:
+                client.send(_pack(requestid, OP_REPLY, *_errorStatus(exception)))
+
+        try:
+            if self.coalesce and command.request is None and command.reply is not None:
+                # registered before sending, so gets arriving meanwhile join it
+                with self._lock:
+                    future = self._inflight.get(command.name)
+                    owner = future is None
+                    if owner:
+                        future = self._inflight[command.name] = Future()
+                if owner:
+                    future.add_done_callback(lambda f, name=command.name: self._forget(name, f))
+                    try:
+                        work = self._executor.submit(self._call, command.name, b'', self._send(command.name, b''))
+                    except Exception as e:
+                        future.set_exception(e)
+                    else:
+                        work.add_done_callback(lambda w: _copy(w, future))
+                else:
+                    self.coalesced += 1
+            else:
+                # gets sent after this command must not share a reply read
+                # before it
+                with self._lock:
+                    self._inflight.clear()
+                future = self._executor.submit(self._call, command.name, data, self._send(command.name, data))
+                if command.reply is None:
+                    future.add_done_callback(lambda f: self._notify(f, command, data))
+        except Exception as e:
+            client.send(_pack(requestid, OP_REPLY, *_errorStatus(e)))
+            return
+        future.add_done_callback(respond)
+
+    def _forget(self, commandname, future):
+        with self._lock:
+            if self._inflight.get(commandname) is future:
+                del self._inflight[commandname]
+
+    # First attempt, sent from the client's thread so the camera sees each
+    # client's requests in the order they were made
+    def _send(self, commandname, data):
+        return self.control.sendCmds([(commandname, data)])[0]
+
+    # Runs on a worker: the undecoded reply data, after any retries
+    def _call(self, commandname, data, future):
+        return bytes(self.control._settled(commandname, data, future).replydata or b'')
+
+    def _notify(self, future, command, data):
+        if future.cancelled() or future.exception() is not None:
+            return
+        message = _pack(0, OP_NOTIFY, command.id, bytes(data))
+        # no lock: this runs in whichever thread read the reply
+        for client in [client for client in list(self.clients) if client.subscribed]:
+            client.send(message)
+
+# Completes shared like work did
+def _copy(work, shared):
+    if work.cancelled():
+        shared.cancel()
+    elif work.exception() is not None:
+        shared.set_exception(work.exception())
+    else:
+        shared.set_result(work.result())
+
+#---------- Client ---------------
+# Talks to a BosonDaemon with the method names of BosonControl. submit()
+# returns a concurrent.futures.Future, so pipelining and profiles work too.
+class BosonClient(schema.BosonCommands):
+    SCHEMA = BosonControl.SCHEMA
+    COMMANDS = BosonControl.COMMANDS
+    LUT = BosonControl.LUT
+    GAINMODE = BosonControl.GAINMODE
+    FLR_ENABLE_E = BosonControl.FLR_ENABLE_E
+    SCALER_ZOOM_PARAMS = BosonControl.SCALER_ZOOM_PARAMS
+
+    # Hand written user methods only use sendCmdAndGetReply and submit
+    getColorLut = BosonControl.getColorLut
+    setColorLut = BosonControl.setColorLut
+    getGainState = BosonControl.getGainState
+    setGainState = BosonControl.setGainState
+    getSwVersion = BosonControl.getSwVersion
+    getFpaTempTable = BosonControl.getFpaTempTable
+    getFpaTempStats = BosonControl.getFpaTempStats
+    setEntropy = BosonControl.setEntropy
+    getEntropy = BosonControl.getEntropy
+    getScalerZoom = BosonControl.getScalerZoom
+    setScalerZoom = BosonControl.setScalerZoom
+    getProfile = BosonControl.getProfile
+    setProfile = BosonControl.setProfile
+    sendCmdsAndGetReplies = BosonControl.sendCmdsAndGetReplies
+
+    _lutstring = ''
+
+    def __init__(self, path=None, timeout=5.0):
+        self.path = path or DEFAULT_SOCKET
+        self.timeout = timeout
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+        self._requestid = count(1)
+        self._pending = {}
+        self._sendlock = threading.Lock()
+        self._callbacks = []
+        # asked once by setScalerZoom, like in BosonControl
+        self._maxzoom = None
+        self._reader = threading.Thread(target=self._read, name='boson-client', daemon=True)
+        self._reader.start()
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self._reader.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _request(self, op, value, data=b'', commandname=None):
+        requestid = next(self._requestid) & 0xFFFFFFFF
+        future = Future()
+        self._pending[requestid] = (future, commandname)
+        try:
+            with self._sendlock:
+                self.sock.sendall(_pack(requestid, op, value, data))
+        except OSError as e:
+            self._pending.pop(requestid, None)
+            raise PortError('Lost daemon at %s: %s' % (self.path, e)) from e
+        return future
+
+    def _read(self):
+        try:
+            while True:
+                message = _recvmessage(self.sock)
+                if message is None:
+                    break
+                requestid, op, value, data = message
+                if op == OP_NOTIFY:
+                    self._notified(value, data)
+                    continue
+                entry = self._pending.pop(requestid, None)
+                if entry is None:
+                    continue
+                future, commandname = entry
+                if value:
+                    future.set_exception(_errorFromStatus(commandname, value, data))
+                elif commandname is None:
+                    future.set_result(None)
+                else:
+                    try:
+                        future.set_result(self.SCHEMA[commandname].decode(data))
+                    except Exception as e:
+                        future.set_exception(e)
+        except OSError:
+            pass
+        for future, _ in list(self._pending.values()):
+            if not future.done():
+                future.set_exception(PortError('Lost daemon at %s' % self.path))
+        self._pending.clear()
+
+    def _notified(self, functionid, data):
+        command = schema.BYID.get(functionid)
+        if command is None:
+            return
+        value = command.decoderequest(data)
+        for callback in list(self._callbacks):
+            try:
+                callback(command.name, value)
+            except Exception:
+                log.exception('Notification callback failed')
+
+    def submit(self, commandname, data = bytearray()):
+        return self._request(OP_COMMAND, self.SCHEMA[commandname].id, bytes(data), commandname)
+
+    def sendCmdAndGetReply(self, commandname, data = bytearray()):
+        return self.submit(commandname, data).result(self.timeout)
+
+    # The daemon pipelines requests from all its clients anyway
+    def submitMany(self, commands):
+        return [self.submit(commandname, data) for commandname, data in commands]
+
+    def sendCmds(self, commands):
+        return self.submitMany(commands)
+
+    # The daemon already resends as the camera's RetryPolicy says
+    def getReply(self, future):
+        return future.result(self.timeout)
+
+    # callback(commandname, value) for every set any client of the daemon
+    # makes, value decoded like the set command's argument
+    def subscribe(self, callback):
+        if not self._callbacks:
+            self._request(OP_SUBSCRIBE, 0).result(self.timeout)
+        self._callbacks.append(callback)
+
+def main():
+    parser = argparse.ArgumentParser(description='Share a Boson camera between processes')
+    parser.add_argument('--port', default='/dev/ttyACM0', help='camera serial port')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help='Unix socket to serve on')
+    parser.add_argument('--timeout', type=float, default=1.0, help='camera reply timeout in seconds')
+    parser.add_argument('--no-coalesce', action='store_true', help='send every get to the camera')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    daemon = BosonDaemon(BosonControl(args.port, timeout=args.timeout), args.socket, not args.no_coalesce)
+    log.info('Serving %s on %s', args.port, args.socket)
+    try:
+        daemon.serveForever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,349 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyBoson3 Boson camera emulator on a pseudo terminal
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyBoson-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+import os, pty, tty, select, struct, random, threading, argparse
+from time import sleep
+from .flirprotocols import FrameDecoder, START_FLAG, END_FLAG, crc16xmodem, fastByteStuff
+from .boson import BosonControl
+from .transport import LoopbackTransport
+from .shadow import FAMILIES
+from .schema import COMMANDS
+from .reply import R_SUCCESS, R_CAM_DSPCH_BAD_CMD_ID, R_CAM_PKG_INSUFFICIENT_BYTES, R_CAM_PKG_EXCESS_BYTES, \
+                   R_CAM_API_INVALID_INPUT
+
+# Power-on state, keyed like the ShadowCache families
+DEFAULTS = {
+    'SERIAL'          :    struct.pack('>i', 123456),
+    'PARTNUMBER'      :    b'20640000A-SPNLX'.ljust(20, b'\x00'),
+    'SWVERSION'       :    struct.pack('>iii', 2, 0, 1),
+    'COLORLUT'        :    struct.pack('>i', 0),
+    'COLORLUTCONTROL' :    struct.pack('>i', 1),
+    'GAINMODE'        :    struct.pack('>i', 0),
+    'LINEARPERCENT'   :    struct.pack('>f', 20.0),
+    'OUTLIERCUT'      :    struct.pack('>f', 0.1),
+    'MAXGAIN'         :    struct.pack('>f', 1.25),
+    'DUMPINGFACTOR'   :    struct.pack('>f', 5.0),
+    'GAMMA'           :    struct.pack('>f', 0.5),
+    'DTBR'            :    struct.pack('>f', 0.0),
+    'SIGMAR'          :    struct.pack('>f', 0.0),
+    'ENTROPY'         :    struct.pack('>i', 0),
+    'ZOOM'            :    struct.pack('>iii', 0, 320, 256),
+    'MAXZOOM'         :    struct.pack('>i', 10),
+}
+
+IDENTITY = ('SERIAL', 'PARTNUMBER', 'SWVERSION')
+
+# Emulated memories: flash location -> bytes, capture buffer and gain table
+# sizes as (rows, columns) of 16 bit pixels
+FLASH_SIZES = {
+    0x00000007    :    0x20000,
+    0x00000009    :    0x40000,
+}
+CAPTURE_SHAPE = (512, 640)
+FILE_MAX = 128
+
+# Emulates a Boson on the slave side of a pseudo terminal. Open
+# BosonControl(emulator.portname) to drive it through the real serial path.
+# Faults: latency and jitter in seconds (per command name overrides in
+# latencies), droprate is the chance of losing one byte of a reply, corruptrate
+# the chance of a bad CRC, noreplyrate the chance of not answering at all.
+class BosonEmulator():
+
+    def __init__(self, latency=0.0, jitter=0.0, latencies=None, droprate=0.0,
+                 corruptrate=0.0, noreplyrate=0.0, fpatemp=315, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.latencies = dict(latencies or {})
+        self.droprate = droprate
+        self.corruptrate = corruptrate
+        self.noreplyrate = noreplyrate
+        self.fpatemp = fpatemp
+        self.random = random.Random(seed)
+        self.state = dict(DEFAULTS)
+        self.flash = dict((location, bytearray(b'\xff' * size)) for location, size in FLASH_SIZES.items())
+        self.capture = bytearray(self.random.randbytes(CAPTURE_SHAPE[0] * CAPTURE_SHAPE[1] * 2))
+        self.gain = bytearray(self.random.randbytes(CAPTURE_SHAPE[0] * CAPTURE_SHAPE[1] * 2))
+        self.files = {}
+        self._open = {}
+        self.commands = {}
+        for name, command in BosonControl.COMMANDS.items():
+            self.commands.setdefault(bytes(command['id']), name)
+        self.received = 0
+        self.replied = 0
+        self.dropped = 0
+        self.corrupted = 0
+        self.unanswered = 0
+        self.portname = None
+        self._master = None
+        self._slave = None
+        self._link = None
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        tty.setraw(self._master)
+        self.portname = os.ttyname(self._slave)
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, name='boson-emulator', daemon=True)
+        self._thread.start()
+        return self
+
+    # Serves an in memory link instead of a pseudo terminal. Returns the end
+    # for BosonControl(portname, transport=...).
+    def loopback(self, portname='loop://emulator'):
+        client, self._link = LoopbackTransport.pair(portname)
+        self._link.open()
+        self.portname = portname
+        self._running = True
+        self._thread = threading.Thread(target=self._serveLink, name='boson-emulator', daemon=True)
+        self._thread.start()
+        return client
+
+    def stop(self):
+        self._running = False
+        if self._link is not None:
+            self._link.close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._link = None
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                os.close(fd)
+        self._master = self._slave = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def restoreDefaults(self):
+        for family, data in DEFAULTS.items():
+            if family not in IDENTITY:
+                self.state[family] = data
+
+    def _serve(self):
+        decoder = FrameDecoder()
+        while self._running:
+            ready, _, _ = select.select([self._master], [], [], 0.05)
+            if not ready:
+                continue
+            try:
+                chunk = os.read(self._master, 4096)
+            except OSError:
+                return
+            decoder.feed(chunk)
+            while decoder.frames:
+                self._answer(decoder.frames.popleft())
+
+    def _serveLink(self):
+        decoder = FrameDecoder()
+        buf = bytearray(4096)
+        while self._running:
+            try:
+                n = self._link.readinto(buf)
+                decoder.feed(buf, n)
+                while decoder.frames:
+                    self._answer(decoder.frames.popleft())
+            except OSError:
+                # the controller closed its end
+                return
+
+    # frame is unstuffed: start flag, channel, sequence, id, status, data, crc, end flag
+    def _answer(self, frame):
+        self.received += 1
+        sequence, commandid, data = frame[2:6], frame[6:10], frame[14:-3]
+        name = self.commands.get(bytes(commandid))
+        status, reply = self.execute(name, data)
+
+        delay = self.latencies.get(name, self.latency)
+        if self.jitter:
+            delay += self.random.uniform(0, self.jitter)
+        if delay > 0:
+            sleep(delay)
+
+        if self.random.random() < self.noreplyrate:
+            self.unanswered += 1
+            return
+        body = b'\x00' + sequence + commandid + struct.pack('>I', status) + reply
+        crc = crc16xmodem(body)
+        if self.random.random() < self.corruptrate:
+            crc ^= 0x0001
+            self.corrupted += 1
+        wire = bytearray([START_FLAG]) + fastByteStuff(body + crc.to_bytes(2, 'big')) + bytearray([END_FLAG])
+        if self.random.random() < self.droprate:
+            del wire[self.random.randrange(len(wire))]
+            self.dropped += 1
+        if self._link is not None:
+            self._link.write(wire)
+        else:
+            os.write(self._master, wire)
+        self.replied += 1
+
+    # Returns (status, reply data) for a command name and its data bytes
+    def execute(self, name, data):
+        if name is None:
+            return R_CAM_DSPCH_BAD_CMD_ID, b''
+        if name == 'ACGRESTOREDEFAULT':
+            self.restoreDefaults()
+            return R_SUCCESS, b''
+        if name == 'FPATEMPDEDCx10':
+            return R_SUCCESS, struct.pack('>h', self.fpatemp + self.random.randint(-2, 2))
+        if name == 'FPAGETTEMPTABLE':
+            table = [self.fpatemp + i // 4 for i in range(32)]
+            return R_SUCCESS, struct.pack('>32h', *table)
+        if name.startswith('MEM') or name.startswith('FILEOPS'):
+            # fixed size requests are checked like the setters below; the
+            # variable ones (MEMWRITEFLASH) fail as short if their header is
+            expected = COMMANDS[name].argbytes
+            if expected and len(data) < expected:
+                return R_CAM_PKG_INSUFFICIENT_BYTES, b''
+            if expected and len(data) > expected:
+                return R_CAM_PKG_EXCESS_BYTES, b''
+            try:
+                if name.startswith('MEM'):
+                    return self._mem(name, data)
+                return self._fileops(name, data)
+            except struct.error:
+                return R_CAM_PKG_INSUFFICIENT_BYTES, b''
+
+        family, kind = FAMILIES[name]
+        if kind == 'get':
+            return R_SUCCESS, self.state[family]
+        expected = len(self.state[family])
+        if len(data) < expected:
+            return R_CAM_PKG_INSUFFICIENT_BYTES, b''
+        if len(data) > expected:
+            return R_CAM_PKG_EXCESS_BYTES, b''
+        self.state[family] = bytes(data)
+        return R_SUCCESS, b''
+
+    def _mem(self, name, data):
+        if name in ('MEMGETCAPTURESIZE', 'MEMGETGAINSIZE'):
+            return R_SUCCESS, struct.pack('>IHH', len(self.capture), CAPTURE_SHAPE[0], CAPTURE_SHAPE[1])
+        if name == 'MEMREADCAPTURE':
+            _, offset, size = struct.unpack('>BIH', data)
+            return self._slice(self.capture, offset, size)
+        if name == 'MEMREADCURRENTGAIN':
+            offset, size = struct.unpack('>IH', data)
+            return self._slice(self.gain, offset, size)
+        location = struct.unpack('>i', data[:4])[0]
+        flash = self.flash.get(location)
+        if flash is None:
+            return R_CAM_API_INVALID_INPUT, b''
+        if name == 'MEMGETFLASHSIZE':
+            return R_SUCCESS, struct.pack('>I', len(flash))
+        if name == 'MEMREADFLASH':
+            _, _, offset, size = struct.unpack('>iBIH', data)
+            return self._slice(flash, offset, size)
+        if name == 'MEMWRITEFLASH':
+            _, _, offset, size = struct.unpack('>iBIH', data[:11])
+            if size > 256 or len(data) != 11 + size or offset + size > len(flash):
+                return R_CAM_API_INVALID_INPUT, b''
+            # like NOR flash, writing only clears bits
+            for i, byte in enumerate(data[11:]):
+                flash[offset + i] &= byte
+            return R_SUCCESS, b''
+        if name == 'MEMERASEFLASH':
+            flash[:] = b'\xff' * len(flash)
+            return R_SUCCESS, b''
+        if name == 'MEMERASEFLASHPARTIAL':
+            _, _, offset, length = struct.unpack('>iBII', data)
+            if offset % 0x1000 or length % 0x1000 or offset + length > len(flash):
+                return R_CAM_API_INVALID_INPUT, b''
+            flash[offset:offset + length] = b'\xff' * length
+            return R_SUCCESS, b''
+        return R_CAM_DSPCH_BAD_CMD_ID, b''
+
+    def _slice(self, memory, offset, size):
+        if size > 512 or offset + size > len(memory):
+            return R_CAM_API_INVALID_INPUT, b''
+        return R_SUCCESS, bytes(memory[offset:offset + size])
+
+    # files maps path -> bytearray, _open maps id -> [path, position]
+    def _fileops(self, name, data):
+        if name == 'FILEOPSGETFILESIZE':
+            path = bytes(data).rstrip(b'\x00')
+            if path not in self.files:
+                return R_CAM_API_INVALID_INPUT, b''
+            return R_SUCCESS, struct.pack('>I', len(self.files[path]))
+        if name == 'FILEOPSFOPEN':
+            path, mode = bytes(data[:128]).rstrip(b'\x00'), bytes(data[128:]).rstrip(b'\x00')
+            if mode.startswith(b'w'):
+                self.files[path] = bytearray()
+            elif path not in self.files:
+                return R_CAM_API_INVALID_INPUT, b''
+            fileid = max(self._open, default=0) + 1
+            self._open[fileid] = [path, 0]
+            return R_SUCCESS, struct.pack('>I', fileid)
+        fileid = struct.unpack('>I', data[:4])[0]
+        handle = self._open.get(fileid)
+        if handle is None:
+            return R_CAM_API_INVALID_INPUT, b''
+        content = self.files[handle[0]]
+        if name == 'FILEOPSFCLOSE':
+            del self._open[fileid]
+            return R_SUCCESS, b''
+        if name == 'FILEOPSFTELL':
+            return R_SUCCESS, struct.pack('>I', handle[1])
+        if name == 'FILEOPSFSEEK':
+            handle[1] = struct.unpack('>II', data[4:12])[0]
+            return R_SUCCESS, b''
+        length = struct.unpack('>I', data[4:8])[0]
+        if length > FILE_MAX:
+            return R_CAM_API_INVALID_INPUT, b''
+        if name == 'FILEOPSFREAD':
+            chunk = bytes(content[handle[1]:handle[1] + length])
+            handle[1] += len(chunk)
+            return R_SUCCESS, struct.pack('>128sI', chunk, len(chunk))
+        if name == 'FILEOPSFWRITE':
+            content[handle[1]:handle[1] + length] = data[8:8 + length]
+            handle[1] += length
+            return R_SUCCESS, struct.pack('>I', length)
+        return R_CAM_DSPCH_BAD_CMD_ID, b''
+
+def main():
+    parser = argparse.ArgumentParser(description='Emulate a Boson camera on a pseudo terminal')
+    parser.add_argument('--latency', type=float, default=0.0, help='reply latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random latency in seconds')
+    parser.add_argument('--droprate', type=float, default=0.0, help='chance of dropping a reply byte')
+    parser.add_argument('--corruptrate', type=float, default=0.0, help='chance of a bad reply CRC')
+    parser.add_argument('--noreplyrate', type=float, default=0.0, help='chance of not replying')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    emulator = BosonEmulator(latency=args.latency, jitter=args.jitter, droprate=args.droprate,
+                             corruptrate=args.corruptrate, noreplyrate=args.noreplyrate, seed=args.seed)
+    with emulator:
+        print ('Emulated Boson on %s' % emulator.portname, flush=True)
+        try:
+            while True:
+                sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyBoson3 control of several Boson cameras at once
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyBoson-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+from concurrent.futures import ThreadPoolExecutor, wait
+from collections import OrderedDict
+from .boson import BosonControl
+
+# Per-camera outcome of a fleet call
+class FleetResult():
+
+    def __init__(self):
+        self.results = OrderedDict()
+        self.errors = OrderedDict()
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def __getitem__(self, portname):
+        if portname in self.errors:
+            raise self.errors[portname]
+        return self.results[portname]
+
+    def __repr__(self):
+        return 'FleetResult(results=%r, errors=%r)' % (dict(self.results), dict(self.errors))
+
+# Independent BosonControl per port, each driven by its own I/O worker.
+# Any BosonControl user method called on the fleet runs on every camera at
+# once: fleet.setColorLut('IRONBOW') returns a FleetResult.
+class BosonFleet():
+
+    def __init__(self, portnames, timeout=1):
+        self.portnames = list(portnames)
+        self.cameras = OrderedDict()
+        self._workers = OrderedDict()
+        for portname in self.portnames:
+            self._workers[portname] = ThreadPoolExecutor(max_workers=1, thread_name_prefix='boson-%s' % portname)
+        # open all ports concurrently, a missing camera must not block the others
+        opened = self._run(lambda portname: BosonControl(portname, timeout))
+        for portname in self.portnames:
+            if portname in opened.results:
+                self.cameras[portname] = opened.results[portname]
+        self.openerrors = opened.errors
+
+    def __getitem__(self, portname):
+        return self.cameras[portname]
+
+    def __iter__(self):
+        return iter(self.cameras.values())
+
+    def __len__(self):
+        return len(self.cameras)
+
+    def _run(self, call, portnames=None, timeout=None):
+        if portnames is None:
+            portnames = self.portnames
+        futures = OrderedDict((portname, self._workers[portname].submit(call, portname)) for portname in portnames)
+        wait(futures.values(), timeout)
+        fleetresult = FleetResult()
+        for portname, future in futures.items():
+            if not future.done():
+                future.cancel()
+                fleetresult.errors[portname] = TimeoutError('No reply from %s' % portname)
+            elif future.exception() is not None:
+                fleetresult.errors[portname] = future.exception()
+            else:
+                fleetresult.results[portname] = future.result()
+        return fleetresult
+
+    def broadcast(self, methodname, *args, **kwargs):
+        # timeout bounds the whole fan-out, not each camera
+        timeout = kwargs.pop('timeout', None)
+        return self._run(lambda portname: getattr(self.cameras[portname], methodname)(*args, **kwargs),
+                         list(self.cameras), timeout)
+
+    def __getattr__(self, name):
+        if name.startswith('_') or not callable(getattr(BosonControl, name, None)):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self.broadcast(name, *args, **kwargs)
+
+    # Closes every port from its own worker, after whatever call it runs
+    def close(self, timeout=None):
+        closed = self._run(lambda portname: self.cameras[portname].close(), list(self.cameras), timeout)
+        for worker in self._workers.values():
+            worker.shutdown(wait=False)
+        self.cameras.clear()
+        return closed
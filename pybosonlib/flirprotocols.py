@@ -1,5 +1,4 @@
-from collections import OrderedDict
-import crc16 # https://code.google.com/p/pycrc16/
+from collections import OrderedDict, deque
 
 BYTESTUFF = { 
     0x8E: [ 0x9E, 0x81],
@@ -13,6 +12,34 @@ BYTESDESTUFF = {
     b'\x9E\xA1' : 0xAE
     }
 
+START_FLAG = 0x8E
+END_FLAG   = 0xAE
+ESCAPE     = 0x9E
+
+# Longest valid FSLP on the wire: flags, escaped channel, 768 escaped payload
+# bytes and escaped CRC
+MAX_WIRE_FRAME = 1 + 1*2 + 768*2 + 2*2 + 1
+
+# Constant FBP header fields sent with every command
+FBP_SEQUENCENUMBER = bytes([0x42, 0xAE, 0x42, 0x9E])
+FBP_COMMANDSTATUS  = bytes([0xFF, 0xFF, 0xFF, 0xFF])
+FBP_SEQUENCE       = int.from_bytes(FBP_SEQUENCENUMBER, 'big')
+
+# CRC-16/XMODEM lookup table, polynomial 0x1021
+def _crcTable():
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = (crc << 1) ^ 0x1021
+            else:
+                crc = crc << 1
+        table.append(crc & 0xFFFF)
+    return tuple(table)
+
+CRC16_TABLE = _crcTable()
+
 #renders a dict into bytearray 
 def renderToByteArray(fields):
     return bytearray().join([ba for k, ba in fields.items() ])
@@ -47,8 +74,44 @@ def byteUnstuff(ba):
         unstuffed.append(ba[-1])
     
     return bytearray(unstuffed)
-        
+
+# CRC-16/XMODEM of data, table driven, seeded with the FSLP initial value
+def crc16xmodem(data, crc=0x1d0f):
+    table = CRC16_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFF00) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+# The CRC is linear, so the contribution of each sequence number byte to the
+# CRC of channel+FBP header is independent of the rest of the header and can
+# be tabled: crc(seq) = crc(seq 0) ^ T0[s0] ^ T1[s1] ^ T2[s2] ^ T3[s3]
+def _sequenceCrcTables():
+    tables = []
+    for pos in range(4):
+        trailing = bytes(3 - pos + 8)
+        tables.append(tuple(crc16xmodem(bytes([value]) + trailing, 0) for value in range(256)))
+    return tuple(tables)
+
+SEQUENCE_CRC_TABLES = _sequenceCrcTables()
+
+# Every byte value as it goes on the wire, for splicing sequence numbers and
+# CRCs in without a stuffing pass
+STUFFED_BYTES = tuple(bytes(BYTESTUFF.get(value, [value])) for value in range(256))
+
+# Same output as byteStuff, done with bytes.replace instead of a per-byte loop.
+# The escape byte must be replaced first since the other two introduce it.
+def fastByteStuff(ba):
+    return ba.replace(b'\x9e', b'\x9e\x91').replace(b'\x8e', b'\x9e\x81').replace(b'\xae', b'\x9e\xa1')
+
+# Inverse of fastByteStuff. Every 0x9E on the wire starts an escape pair, so
+# the pairs never overlap as long as the escaped escape is restored last.
+def fastByteUnstuff(ba):
+    ba = bytes(ba)
+    if b'\x9e' not in ba:
+        return ba
+    return ba.replace(b'\x9e\x81', b'\x8e').replace(b'\x9e\xa1', b'\xae').replace(b'\x9e\x91', b'\x9e')
     
+
  # Returns: two bytes hex encoded string tuple (MSB, LSB)
 def crc_to_hex(_crc):
     (_msb, _lsb) = crcformat(_crc)
@@ -88,7 +151,7 @@ class Frame():
     def raw(self):
         assert (len(self.fields['channel'])==1)
         #compute crc
-        _crc = crc16.crc16xmodem(bytes(self.fields['channel']+self.fields['payload']), 0x1d0f)
+        _crc = crc16xmodem(bytes(self.fields['channel']+self.fields['payload']))
         (_x, _y) = crc_to_hex(_crc) 
         self.fields['crc16'] = bytearray.fromhex(_x) + bytearray.fromhex(_y)
         assert (len(self.fields['crc16'])==2)
@@ -115,4 +178,119 @@ class Fbp():
         assert (len(self.fields['commandstatus'])==4)
         return renderToByteArray(self.fields)
 
+_END = bytes([END_FLAG])
+
+# Precompiled FSLP+FBP encoder for one command id. The stuffed channel and
+# command id/status and the CRC state of the header are computed once, so a
+# command only splices sequence number, data and CRC in.
+# Output is byte-identical to Frame(Fbp(commandid, data).raw()).raw()
+# When a sequence number is given it replaces the constant FBP one; its CRC
+# contribution comes from SEQUENCE_CRC_TABLES so the header is never rescanned,
+# and its bytes and the CRC are spliced in already stuffed from STUFFED_BYTES.
+class CommandEncoder():
+    __slots__ = ('commandid', '_crc0', '_start', '_tail')
+
+    def __init__(self, commandid, channel=0x00):
+        assert (len(commandid)==4)
+        self.commandid = bytes(commandid)
+        self._crc0 = crc16xmodem(bytes([channel]) + bytes(4) + self.commandid + FBP_COMMANDSTATUS)
+        self._start = bytes([START_FLAG]) + fastByteStuff(bytes([channel]))
+        self._tail = fastByteStuff(self.commandid + FBP_COMMANDSTATUS)
+
+    def encode(self, data=b'', sequence=None):
+        if sequence is None:
+            sequence = FBP_SEQUENCE
+        t0, t1, t2, t3 = SEQUENCE_CRC_TABLES
+        s0, s1, s2, s3 = sequence >> 24, (sequence >> 16) & 0xFF, (sequence >> 8) & 0xFF, sequence & 0xFF
+        crc = self._crc0 ^ t0[s0] ^ t1[s1] ^ t2[s2] ^ t3[s3]
+        if data:
+            crc = crc16xmodem(data, crc)
+            data = fastByteStuff(bytes(data))
+        stuffed = STUFFED_BYTES
+        return b''.join((self._start, stuffed[s0], stuffed[s1], stuffed[s2], stuffed[s3], self._tail, data,
+                         stuffed[crc >> 8], stuffed[crc & 0xFF], _END))
+
+# Complete wire frame for an arbitrary FSLP payload, e.g. a camera reply
+def encodeFrame(payload, channel=0x00):
+    body = bytes([channel]) + bytes(payload)
+    return bytes([START_FLAG]) + fastByteStuff(body + crc16xmodem(body).to_bytes(2, 'big')) + bytes([END_FLAG])
+
+# Sequence number of an unstuffed frame as queued by FrameDecoder
+def frameSequence(frame):
+    return int.from_bytes(frame[2:6], 'big')
+
+# Resumable FSLP decoder. Feed it whatever chunk the port returns: it finds the
+# 0x8E/0xAE boundaries, unstuffs and checks the CRC, and queues complete frames
+# in self.frames. Frames may span several chunks and a chunk may hold several
+# frames. Queued frames are unstuffed and keep their start and end flags, so
+# they can be sliced like byteUnstuff(Frame.raw()).
+class FrameDecoder():
+
+    def __init__(self):
+        self.frames = deque()
+        self._buf = bytearray()
+        self._inframe = False
+        self.crcerrors = 0
+        self.discarded = 0
+
+    # True while the bytes of a started frame are being collected
+    @property
+    def inframe(self):
+        return self._inframe
+
+    def reset(self):
+        self.frames.clear()
+        self._buf.clear()
+        self._inframe = False
+
+    # _buf holds the start flag and the stuffed bytes received so far, so a
+    # completed frame is unstuffed with flags in place in a single copy.
+    # Only the first size bytes of chunk are used, so a reusable read buffer
+    # can be fed without slicing it.
+    def feed(self, chunk, size=None):
+        pos = 0
+        if size is None:
+            size = len(chunk)
+        buf = self._buf
+        while pos < size:
+            if not self._inframe:
+                start = chunk.find(b'\x8e', pos, size)
+                if start < 0:
+                    self.discarded += size - pos
+                    break
+                self.discarded += start - pos
+                self._inframe = True
+                buf.append(START_FLAG)
+                pos = start + 1
+            end = chunk.find(b'\xae', pos, size)
+            # An unescaped start flag inside a frame restarts it
+            restart = chunk.find(b'\x8e', pos, end if end >= 0 else size)
+            if restart >= 0:
+                self.discarded += len(buf) + restart - pos
+                del buf[1:]
+                pos = restart + 1
+                continue
+            if end < 0:
+                buf += chunk[pos:size]
+                if len(buf) > MAX_WIRE_FRAME:
+                    self.discarded += len(buf)
+                    buf.clear()
+                    self._inframe = False
+                break
+            buf += chunk[pos:end]
+            buf.append(END_FLAG)
+            self._complete()
+            pos = end + 1
+        return len(self.frames)
+
+    def _complete(self):
+        frame = fastByteUnstuff(self._buf)
+        self._buf.clear()
+        self._inframe = False
+        view = memoryview(frame)
+        if len(frame) < 5 or crc16xmodem(view[1:-3]) != int.from_bytes(view[-3:-1], 'big'):
+            self.crcerrors += 1
+            return
+        self.frames.append(frame)
+
 # END 
@@ -0,0 +1,101 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyBoson3 decoding of the FPA temperature table
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyBoson-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+import sys
+from array import array
+from operator import mul
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# FPAGETTEMPTABLE returns 32 big endian INT_16 entries
+FPA_TABLE_ENTRIES = 32
+FPA_TABLE_BYTES = FPA_TABLE_ENTRIES * 2
+
+_SWAP = sys.byteorder == 'little'
+
+# Least squares slope of the table over its index is dot(_SLOPE_WEIGHTS, table)
+_MEAN_INDEX = (FPA_TABLE_ENTRIES - 1) / 2.0
+_SXX = sum((i - _MEAN_INDEX) ** 2 for i in range(FPA_TABLE_ENTRIES))
+_SLOPE_WEIGHTS = tuple((i - _MEAN_INDEX) / _SXX for i in range(FPA_TABLE_ENTRIES))
+
+# Decoded table with its derived statistics. gradient is the least squares
+# slope of the entries over the table index.
+class FpaTableStats():
+    __slots__ = ('table', 'min', 'max', 'mean', 'gradient')
+
+    def __init__(self, table, _min, _max, mean, gradient):
+        self.table = table
+        self.min = _min
+        self.max = _max
+        self.mean = mean
+        self.gradient = gradient
+
+    def __repr__(self):
+        return 'FpaTableStats(min=%s, max=%s, mean=%.2f, gradient=%.4f)' % \
+            (self.min, self.max, self.mean, self.gradient)
+
+# Decode the unstuffed table data in one call. Returns an array('h') unless out
+# is given: an array('h') or NumPy array of FPA_TABLE_ENTRIES entries to fill.
+def decodeFpaTable(data, out=None):
+    if len(data) != FPA_TABLE_BYTES:
+        raise ValueError('FPA table must be %d bytes, got %d' % (FPA_TABLE_BYTES, len(data)))
+    if out is None:
+        out = array('h')
+        out.frombytes(data)
+        if _SWAP:
+            out.byteswap()
+        return out
+    if numpy is not None and isinstance(out, numpy.ndarray):
+        out[...] = numpy.frombuffer(data, dtype='>i2')
+        return out
+    memoryview(out).cast('B')[:] = data
+    if _SWAP:
+        out.byteswap()
+    return out
+
+def fpaTableStats(data, out=None):
+    table = decodeFpaTable(data, out)
+    if numpy is not None and isinstance(table, numpy.ndarray):
+        return FpaTableStats(table, int(table.min()), int(table.max()), float(table.mean()),
+                             float(numpy.dot(_SLOPE_WEIGHTS, table)))
+    return FpaTableStats(table, min(table), max(table), sum(table) / float(FPA_TABLE_ENTRIES),
+                         sum(map(mul, _SLOPE_WEIGHTS, table)))
+
+# Decode many tables captured over time into an (n, 32) int16 NumPy array,
+# optionally filling out, and return it with per table min, max, mean and
+# gradient arrays
+def decodeFpaTables(datas, out=None):
+    if numpy is None:
+        raise ImportError('decodeFpaTables needs numpy')
+    if isinstance(datas, (bytes, bytearray, memoryview)):
+        raw = numpy.frombuffer(datas, dtype='>i2').reshape(-1, FPA_TABLE_ENTRIES)
+    else:
+        raw = numpy.frombuffer(b''.join(datas), dtype='>i2').reshape(-1, FPA_TABLE_ENTRIES)
+    if out is None:
+        out = raw.astype(numpy.int16)
+    else:
+        out[...] = raw
+    return out, out.min(axis=1), out.max(axis=1), out.mean(axis=1), out.dot(_SLOPE_WEIGHTS)
@@ -0,0 +1,163 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyBoson3 camera profiles: snapshot and apply sets of settings
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyBoson-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+import json
+from time import monotonic
+from collections import OrderedDict
+from .schema import COMMANDS, StructType
+
+# Format: field name -> (get command, set command). Fields are applied in this
+# order, so the colorize enable goes before the palette.
+PROFILE_FIELDS = OrderedDict([
+    ('gainmode'        ,    ('GETGAINMODE'         , 'SETGAINMODE')),
+    ('colorlutcontrol' ,    ('COLORLUTGETCONTROL'  , 'COLORLUTSETCONTROL')),
+    ('colorlut'        ,    ('GETCOLORLUT'         , 'SETCOLORLUT')),
+    ('linearpercent'   ,    ('ACGGETLINEARPERCENT' , 'ACGSETLINEARPERCENT')),
+    ('outliercut'      ,    ('ACGGETOUTLIERCUT'    , 'ACGSETOUTLIERCUT')),
+    ('maxgain'         ,    ('ACGGETMAXGAIN'       , 'ACGSETMAXGAIN')),
+    ('dumpingfactor'   ,    ('ACGGETDUMPINGFACTOR' , 'ACGSETDUMPINGFACTOR')),
+    ('gamma'           ,    ('ACGGETGAMMA'         , 'ACGSETGAMMA')),
+    ('dtbr'            ,    ('ACGGETDTBR'          , 'ACGSETDTBR')),
+    ('sigmar'          ,    ('ACGGETSIGMAR'        , 'ACGSETSIGMAR')),
+    ('entropy'         ,    ('ACGGETENTROPY'       , 'ACGSETENTROPY')),
+    ('zoom'            ,    ('SCALERGETZOOM'       , 'SCALERSETZOOM')),
+])
+
+# Data bytes of a decoded get reply, i.e. what the matching set command takes
+def encodeValue(field, value):
+    return COMMANDS[PROFILE_FIELDS[field][1]].encode(value)
+
+# Outcome of CameraProfile.apply: per written field its old and new value and
+# the seconds from submission to the camera's acknowledgement
+class ApplyReport():
+
+    def __init__(self):
+        self.changes = OrderedDict()
+        self.timings = OrderedDict()
+        self.errors = OrderedDict()
+        self.unchanged = []
+        self.elapsed = 0.0
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def __repr__(self):
+        return 'ApplyReport(changed=%s, unchanged=%d, errors=%s, elapsed=%.4fs)' % \
+            (list(self.changes), len(self.unchanged), dict(self.errors), self.elapsed)
+
+# Serializable set of camera settings. Values are the decoded get replies:
+# ints and floats for scalar settings, schema structs such as zoom.
+class CameraProfile():
+
+    def __init__(self, values=None, name=''):
+        self.name = name
+        self.values = OrderedDict()
+        for field, value in (values or {}).items():
+            if field not in PROFILE_FIELDS:
+                raise KeyError('Unknown profile field %s' % field)
+            self.values[field] = value
+
+    def __eq__(self, other):
+        return isinstance(other, CameraProfile) and self.values == other.values
+
+    def __repr__(self):
+        return 'CameraProfile(%r, %r)' % (self.name, dict(self.values))
+
+    # Read every profile field from the camera in one pipelined burst
+    @classmethod
+    def snapshot(cls, control, fields=None, name=''):
+        fields = list(fields or PROFILE_FIELDS)
+        replies = control.sendCmdsAndGetReplies([PROFILE_FIELDS[field][0] for field in fields])
+        return cls(OrderedDict(zip(fields, replies)), name)
+
+    # Fields of other that differ from this profile, compared on the wire bytes
+    def diff(self, other):
+        changed = OrderedDict()
+        for field in PROFILE_FIELDS:
+            if field not in other.values:
+                continue
+            new = encodeValue(field, other.values[field])
+            if field not in self.values or encodeValue(field, self.values[field]) != new:
+                changed[field] = new
+        return changed
+
+    # Make the camera match this profile, writing only the differing fields in
+    # a single pipelined burst. Writes are resent as their RetryPolicy says.
+    # current skips the snapshot if already known.
+    def apply(self, control, current=None):
+        report = ApplyReport()
+        start = monotonic()
+        if current is None:
+            current = CameraProfile.snapshot(control, [field for field in PROFILE_FIELDS if field in self.values])
+        changed = current.diff(self)
+        report.unchanged = [field for field in self.values if field not in changed]
+
+        submitted = monotonic()
+        futures = OrderedDict(zip(changed, control.sendCmds([(PROFILE_FIELDS[field][1], data)
+                                                             for field, data in changed.items()])))
+        for field, future in futures.items():
+            future.add_done_callback(lambda f, field=field:
+                                     report.timings.__setitem__(field, monotonic() - submitted))
+        for field, future in futures.items():
+            try:
+                control.getReply(future)
+            except Exception as e:
+                report.errors[field] = e
+                continue
+            report.changes[field] = (current.values.get(field), self.values[field])
+            if future.exception() is not None:
+                # acknowledged by a resend
+                report.timings[field] = monotonic() - submitted
+        report.elapsed = monotonic() - start
+        return report
+
+    def toDict(self):
+        values = OrderedDict()
+        for field, value in self.values.items():
+            if isinstance(value, StructType):
+                values[field] = {'struct': value._asdict()}
+            elif isinstance(value, (bytes, bytearray)):
+                values[field] = {'hex': bytes(value).hex()}
+            else:
+                values[field] = value
+        return OrderedDict([('name', self.name), ('values', values)])
+
+    @classmethod
+    def fromDict(cls, d):
+        values = OrderedDict()
+        for field, value in d['values'].items():
+            if isinstance(value, dict) and 'struct' in value:
+                values[field] = COMMANDS[PROFILE_FIELDS[field][0]].reply(**value['struct'])
+            elif isinstance(value, dict):
+                values[field] = bytes.fromhex(value['hex'])
+            else:
+                values[field] = value
+        return cls(values, d.get('name', ''))
+
+    def toJson(self, **kwargs):
+        return json.dumps(self.toDict(), **kwargs)
+
+    @classmethod
+    def fromJson(cls, s):
+        return cls.fromDict(json.loads(s, object_pairs_hook=OrderedDict))
@@ -0,0 +1,451 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyBoson3 serial traffic recorder, offline analysis and replay
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyBoson-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+import os, mmap, struct, threading, logging, argparse, json
+from time import time, monotonic, monotonic_ns, sleep
+from itertools import count
+from collections import OrderedDict
+from .flirprotocols import FrameDecoder
+from .reply import Reply, R_SUCCESS
+from .schema import BYID
+from .stats import Histogram
+
+log = logging.getLogger('pybosonlib.recorder')
+
+# Log file layout: MAGIC, then records of RECORD header + data. Every
+# BosonControl attaching to a recorder gets a session and appends a SESSION
+# record first (wall clock time and port name). Records carry the number of
+# their session within that recorder, so controls sharing one file stay
+# apart; record times are nanoseconds since their session began.
+MAGIC = b'BOSONREC\x00\x02'
+RECORD = struct.Struct('>BHQI')
+_SESSION = struct.Struct('>d')
+
+# Record kinds: bytes written, bytes read as they came off the port, and
+# link events (lost port, reopen, resync) as text
+SESSION = 0x53
+TX      = 0x54
+RX      = 0x52
+EVENT   = 0x45
+
+KINDS = OrderedDict([
+    (SESSION    , 'SESSION'),
+    (TX         , 'TX'),
+    (RX         , 'RX'),
+    (EVENT      , 'EVENT'),
+])
+
+#---------- Recording ---------------
+# Appends the traffic of the BosonControls given it as recorder to path. The
+# serial threads only copy bytes into a memory buffer; a writer thread
+# flushes it every interval seconds or once it holds flushsize bytes. If the
+# disk falls behind by more than maxbuffer bytes new records are dropped (and
+# counted) rather than stalling commands.
+class WireRecorder():
+
+    def __init__(self, path, interval=0.5, flushsize=1 << 20, maxbuffer=64 << 20):
+        self.path = path
+        self.interval = interval
+        self.flushsize = flushsize
+        self.maxbuffer = maxbuffer
+        self.records = 0
+        self.dropped = 0
+        self._file = open(path, 'a+b')
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        else:
+            self._file.seek(0)
+            magic = self._file.read(len(MAGIC))
+            self._file.seek(0, os.SEEK_END)
+            if magic != MAGIC:
+                self._file.close()
+                raise ValueError('%s is not a Boson recording of this version' % path)
+        self._buf = bytearray()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = True
+        self._sessions = count()
+        self._thread = threading.Thread(target=self._run, name='boson-recorder', daemon=True)
+        self._thread.start()
+
+    # Starts the session of one port; BosonControl calls it when given the
+    # recorder and then records through the returned RecorderSession
+    def attach(self, portname=''):
+        return RecorderSession(self, next(self._sessions) & 0xFFFF, portname)
+
+    def _append(self, kind, session, start, data):
+        header = RECORD.pack(kind, session, monotonic_ns() - start, len(data))
+        with self._lock:
+            if len(self._buf) > self.maxbuffer:
+                self.dropped += 1
+                return
+            self._buf += header
+            self._buf += data
+            self.records += 1
+            full = len(self._buf) >= self.flushsize
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            buf, self._buf = self._buf, bytearray()
+        if buf:
+            self._file.write(buf)
+            self._file.flush()
+
+    def _run(self):
+        while self._running:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except (IOError, OSError) as e:
+                log.error('Recording to %s stopped: %s', self.path, e)
+                self._running = False
+
+    def close(self):
+        if not self._running and self._file.closed:
+            return
+        self._running = False
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# One port's records in a WireRecorder
+class RecorderSession():
+
+    def __init__(self, recorder, session, portname):
+        self.recorder = recorder
+        self.session = session
+        self.portname = portname
+        self._start = monotonic_ns()
+        recorder._append(SESSION, session, self._start, _SESSION.pack(time()) + portname.encode())
+
+    def tx(self, data):
+        self.recorder._append(TX, self.session, self._start, data)
+
+    def rx(self, data):
+        self.recorder._append(RX, self.session, self._start, data)
+
+    def event(self, text):
+        self.recorder._append(EVENT, self.session, self._start, text.encode())
+
+#---------- Reading ---------------
+# Memory maps a recording. records() yields (session, kind, seconds, data)
+# for every record, sessions being numbered in the order they start in the
+# file; frames() decodes the TX and RX bytes of each session into unstuffed
+# frames. A record cut short by a crash ends the log.
+class WireLog():
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        if bytes(self._map[:len(MAGIC)]) != MAGIC:
+            self.close()
+            raise ValueError('%s is not a Boson recording' % path)
+        # (wall clock start, port name) per session and the link counters,
+        # as of the last pass over records() and frames()
+        self.sessions = []
+        self.crcerrors = 0
+        self.discarded = 0
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def records(self):
+        data = self._map
+        unpack = RECORD.unpack_from
+        header = RECORD.size
+        position = len(MAGIC)
+        end = len(data)
+        self.sessions = []
+        # a recorder's session numbers -> numbers in the file; later
+        # recorders appending to the file reuse theirs after a SESSION record
+        numbers = {}
+        while position + header <= end:
+            kind, local, nanoseconds, length = unpack(data, position)
+            position += header
+            if position + length > end:
+                break
+            record = data[position:position + length]
+            position += length
+            if kind == SESSION:
+                numbers[local] = len(self.sessions)
+                self.sessions.append((_SESSION.unpack_from(record)[0], record[_SESSION.size:].decode()))
+            yield numbers.get(local, -1), kind, nanoseconds / 1e9, record
+
+    # Yields (session, kind, seconds, frame) for TX and RX frames, the time
+    # being that of the chunk completing the frame, and (session, EVENT,
+    # seconds, text) for events
+    def frames(self):
+        # per (session, TX or RX)
+        decoders = {}
+        for session, kind, seconds, data in self.records():
+            if kind == SESSION:
+                yield session, kind, seconds, data
+            elif kind == EVENT:
+                yield session, kind, seconds, data.decode()
+            else:
+                decoder = decoders.get((session, kind))
+                if decoder is None:
+                    decoder = decoders[session, kind] = FrameDecoder()
+                decoder.feed(data)
+                while decoder.frames:
+                    yield session, kind, seconds, decoder.frames.popleft()
+        self._count(decoders)
+
+    def _count(self, decoders):
+        self.crcerrors = sum(decoder.crcerrors for decoder in decoders.values())
+        self.discarded = sum(decoder.discarded for decoder in decoders.values())
+
+def commandName(commandid):
+    command = BYID.get(commandid)
+    return command.name if command is not None else '0x%08X' % commandid
+
+#---------- Analysis ---------------
+# Per command reply latency histograms, failure statuses and unanswered
+# commands of a recording, plus link counters. Replies are matched to
+# commands by sequence number within a session; commands still unanswered
+# at a resync of their session or at the end of the log count as timeouts.
+def analyze(path):
+    commands = {}
+    counters = OrderedDict((counter, 0) for counter in
+                           ('sessions', 'txframes', 'rxframes', 'unmatched', 'timeouts', 'failures',
+                            'crcerrors', 'discarded', 'events'))
+    # event name -> (count, session and seconds of the first one)
+    events = OrderedDict()
+    # (session, sequence) -> (command name, seconds)
+    pending = {}
+
+    def entry(name):
+        stats = commands.get(name)
+        if stats is None:
+            stats = commands[name] = OrderedDict([('latency', Histogram()), ('timeouts', 0), ('status', OrderedDict())])
+        return stats
+
+    def timeout(session=None):
+        for key in [key for key in pending if session is None or key[0] == session]:
+            entry(pending.pop(key)[0])['timeouts'] += 1
+            counters['timeouts'] += 1
+
+    with WireLog(path) as wirelog:
+        for session, kind, seconds, frame in wirelog.frames():
+            if kind == TX:
+                reply = Reply(frame)
+                counters['txframes'] += 1
+                pending[session, reply.sequence] = (commandName(reply.commandid), seconds)
+            elif kind == RX:
+                reply = Reply(frame)
+                counters['rxframes'] += 1
+                sent = pending.pop((session, reply.sequence), None)
+                if sent is None:
+                    counters['unmatched'] += 1
+                    continue
+                stats = entry(sent[0])
+                stats['latency'].add(seconds - sent[1])
+                if reply.status != R_SUCCESS:
+                    counters['failures'] += 1
+                    status = reply.statusname
+                    stats['status'][status] = stats['status'].get(status, 0) + 1
+            elif kind == SESSION:
+                counters['sessions'] += 1
+            else:
+                counters['events'] += 1
+                event = frame.split(':')[0]
+                n, first = events.get(event, (0, (session, seconds)))
+                events[event] = (n + 1, first)
+                if event == 'resync':
+                    timeout(session)
+        timeout()
+        counters['crcerrors'] = wirelog.crcerrors
+        counters['discarded'] = wirelog.discarded
+        sessions = list(wirelog.sessions)
+
+    return OrderedDict([
+        ('counters', counters),
+        ('sessions', sessions),
+        ('events', events),
+        ('commands', OrderedDict((name, OrderedDict([('latency', stats['latency'].snapshot()),
+                                                     ('timeouts', stats['timeouts']),
+                                                     ('status', stats['status'])]))
+                                 for name, stats in sorted(commands.items()))),
+    ])
+
+def formatReport(report):
+    lines = ['%-12s %d' % (counter, value) for counter, value in report['counters'].items()]
+    for event, (n, (session, seconds)) in report['events'].items():
+        lines.append('%-12s %d, first in session %d at %.3fs' % (event, n, session, seconds))
+    lines.append('%-22s %8s %10s %10s %10s %10s %8s  %s' % ('command', 'n', 'mean', 'p50', 'p99', 'max',
+                                                            'timeouts', 'failures'))
+    for name, stats in report['commands'].items():
+        latency = stats['latency']
+        if latency['count']:
+            times = ['%10.6f' % latency[key] for key in ('mean', 'p50', 'p99', 'max')]
+        else:
+            times = ['%10s' % '-'] * 4
+        failures = ', '.join('%s x%d' % item for item in stats['status'].items())
+        lines.append('%-22s %8d %s %8d  %s' % (name, latency['count'], ' '.join(times), stats['timeouts'], failures))
+    return '\n'.join(lines)
+
+#---------- Replay ---------------
+# Sends the recorded commands again through control.submit, keeping their
+# original spacing within each session divided by speed (speed None sends
+# them back to back).
+# Returns per command name the replay latencies, errors and the replies
+# whose status differs from the recorded one.
+def replay(path, control, speed=1.0, session=None):
+    results = OrderedDict()
+    # (session, recorded sequence) -> [name, future, sent, recorded status]
+    inflight = {}
+    # session -> monotonic time its recording started at in the replay
+    origins = {}
+
+    def entry(name):
+        stats = results.get(name)
+        if stats is None:
+            stats = results[name] = OrderedDict([('latency', Histogram()), ('errors', OrderedDict()),
+                                                 ('mismatches', 0), ('skipped', 0)])
+        return stats
+
+    def settle(final=False):
+        for key, (name, future, sent, recorded) in list(inflight.items()):
+            if not final and (recorded is None or not future.done()):
+                continue
+            del inflight[key]
+            stats = entry(name)
+            exception = future.exception()
+            if exception is not None:
+                error = type(exception).__name__
+                status = getattr(exception, 'status', None)
+                stats['errors'][error] = stats['errors'].get(error, 0) + 1
+            else:
+                status = R_SUCCESS
+                stats['latency'].add(future.done_at - sent)
+            if recorded is not None and status is not None and status != recorded:
+                stats['mismatches'] += 1
+
+    with WireLog(path) as wirelog:
+        for number, kind, seconds, frame in wirelog.frames():
+            if session is not None and number != session:
+                continue
+            if kind == TX:
+                reply = Reply(frame)
+                name = commandName(reply.commandid)
+                if BYID.get(reply.commandid) is None:
+                    entry(name)['skipped'] += 1
+                    continue
+                if speed is not None:
+                    origin = origins.setdefault(number, monotonic() - seconds / speed)
+                    _wait(control, inflight, origin + seconds / speed)
+                sent = monotonic()
+                try:
+                    future = control.submit(name, bytes(reply.data))
+                except Exception as e:
+                    future = _Failed(e)
+                future.done_at = None
+                future.add_done_callback(_stamp)
+                inflight[number, reply.sequence] = [name, future, sent, None]
+            elif kind == RX:
+                reply = Reply(frame)
+                sent = inflight.get((number, reply.sequence))
+                if sent is not None:
+                    sent[3] = reply.status
+                if len(inflight) > 64:
+                    settle()
+        settle(True)
+
+    return OrderedDict((name, OrderedDict([('latency', stats['latency'].snapshot()), ('errors', stats['errors']),
+                                           ('mismatches', stats['mismatches']), ('skipped', stats['skipped'])]))
+                       for name, stats in results.items())
+
+# Sleeps until a monotonic time, reading replies meanwhile so their latency
+# is taken when they arrive
+def _wait(control, inflight, until):
+    while True:
+        remaining = until - monotonic()
+        if remaining <= 0:
+            return
+        waiting = [entry[1] for entry in inflight.values() if not entry[1].done()]
+        if waiting and hasattr(control, '_pump'):
+            control._pump(waiting[0], remaining)
+        else:
+            sleep(remaining)
+
+def _stamp(future):
+    future.done_at = monotonic()
+
+# Stands in for the future of a command that could not even be written
+class _Failed():
+
+    def __init__(self, exception):
+        self._exception = exception
+
+    def done(self):
+        return True
+
+    def exception(self, timeout=None):
+        return self._exception
+
+    def add_done_callback(self, callback):
+        callback(self)
+
+def main():
+    parser = argparse.ArgumentParser(description='Analyze or replay a Boson serial recording')
+    commands = parser.add_subparsers(dest='command', required=True)
+    analyzer = commands.add_parser('analyze', help='report latencies and errors of a recording')
+    analyzer.add_argument('log')
+    analyzer.add_argument('--json', action='store_true', help='print the report as JSON')
+    replayer = commands.add_parser('replay', help='send the recorded commands to a camera')
+    replayer.add_argument('log')
+    replayer.add_argument('port', help='serial port of the camera or emulator')
+    replayer.add_argument('--speed', type=float, default=1.0, help='time scale, 0 for back to back')
+    replayer.add_argument('--session', type=int, default=None, help='replay only this session')
+    args = parser.parse_args()
+
+    if args.command == 'analyze':
+        report = analyze(args.log)
+        print (json.dumps(report, indent=2) if args.json else formatReport(report))
+    else:
+        from .boson import BosonControl
+        results = replay(args.log, BosonControl(args.port), args.speed or None, args.session)
+        print (json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyBoson3 reply frames, FBP status codes and errors
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyBoson-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+from collections import OrderedDict
+from .flirprotocols import crc16xmodem
+
+# FBP commandstatus values (FLR_RESULT in the IDD)
+R_SUCCESS                          = 0x00000000
+R_SDK_API_UNSPECIFIED_FAILURE      = 0x00000300
+R_SDK_DSPCH_SEQUENCE_MISMATCH      = 0x00000302
+R_CAM_DSPCH_UNSPECIFIED_FAILURE    = 0x00000600
+R_CAM_DSPCH_BAD_CMD_ID             = 0x00000602
+R_CAM_DSPCH_BAD_PAYLOAD_STATUS     = 0x00000603
+R_CAM_PKG_UNSPECIFIED_FAILURE      = 0x00000700
+R_CAM_PKG_INSUFFICIENT_BYTES       = 0x00000702
+R_CAM_PKG_EXCESS_BYTES             = 0x00000703
+R_CAM_PKG_BUFFER_OVERFLOW          = 0x00000704
+R_CAM_API_INVALID_INPUT            = 0x00000901
+R_CAM_FEATURE_NOT_ENABLED          = 0x00000A01
+
+STATUS = OrderedDict([
+    (R_SUCCESS                         , 'R_SUCCESS'),
+    (R_SDK_API_UNSPECIFIED_FAILURE     , 'R_SDK_API_UNSPECIFIED_FAILURE'),
+    (R_SDK_DSPCH_SEQUENCE_MISMATCH     , 'R_SDK_DSPCH_SEQUENCE_MISMATCH'),
+    (R_CAM_DSPCH_UNSPECIFIED_FAILURE   , 'R_CAM_DSPCH_UNSPECIFIED_FAILURE'),
+    (R_CAM_DSPCH_BAD_CMD_ID            , 'R_CAM_DSPCH_BAD_CMD_ID'),
+    (R_CAM_DSPCH_BAD_PAYLOAD_STATUS    , 'R_CAM_DSPCH_BAD_PAYLOAD_STATUS'),
+    (R_CAM_PKG_UNSPECIFIED_FAILURE     , 'R_CAM_PKG_UNSPECIFIED_FAILURE'),
+    (R_CAM_PKG_INSUFFICIENT_BYTES      , 'R_CAM_PKG_INSUFFICIENT_BYTES'),
+    (R_CAM_PKG_EXCESS_BYTES            , 'R_CAM_PKG_EXCESS_BYTES'),
+    (R_CAM_PKG_BUFFER_OVERFLOW         , 'R_CAM_PKG_BUFFER_OVERFLOW'),
+    (R_CAM_API_INVALID_INPUT           , 'R_CAM_API_INVALID_INPUT'),
+    (R_CAM_FEATURE_NOT_ENABLED         , 'R_CAM_FEATURE_NOT_ENABLED'),
+])
+
+def statusName(status):
+    return STATUS.get(status, 'R_UNKNOWN_0x%08X' % status)
+
+class BosonError(IOError):
+    pass
+
+# The camera answered with a non zero commandstatus
+class CommandFailed(BosonError):
+
+    def __init__(self, commandname, status, sequence=None):
+        BosonError.__init__(self, '%s failed with %s (0x%08X)' % (commandname, statusName(status), status))
+        self.commandname = commandname
+        self.status = status
+        self.statusname = statusName(status)
+        self.sequence = sequence
+
+class CrcError(BosonError):
+    pass
+
+# No reply within the command deadline
+class CommandTimeout(BosonError):
+
+    def __init__(self, commandname, timeout):
+        BosonError.__init__(self, 'Timeout waiting for %s reply after %.3fs' % (commandname, timeout))
+        self.commandname = commandname
+        self.timeout = timeout
+
+# The serial port is closed, unplugged or could not be reopened
+class PortError(BosonError):
+    pass
+
+# Unstuffed reply frame as queued by FrameDecoder:
+#   start flag, channel, sequence(4), command id(4), status(4), data, crc(2), end flag
+# Fields are decoded on access from a memoryview of the frame; data is a
+# memoryview too, so nothing is copied until the reply is decoded.
+class Reply():
+    __slots__ = ('frame', '_view')
+
+    def __init__(self, frame, validate=False):
+        self.frame = frame
+        self._view = memoryview(frame)
+        if validate and not self.crcok:
+            raise CrcError('Bad reply CRC')
+
+    @property
+    def crcok(self):
+        view = self._view
+        return len(view) >= 17 and crc16xmodem(view[1:-3]) == int.from_bytes(view[-3:-1], 'big')
+
+    @property
+    def channel(self):
+        return self._view[1]
+
+    @property
+    def sequence(self):
+        return int.from_bytes(self._view[2:6], 'big')
+
+    @property
+    def commandid(self):
+        return int.from_bytes(self._view[6:10], 'big')
+
+    @property
+    def status(self):
+        return int.from_bytes(self._view[10:14], 'big')
+
+    @property
+    def statusname(self):
+        return statusName(self.status)
+
+    @property
+    def ok(self):
+        return self._view[10:14] == b'\x00\x00\x00\x00'
+
+    @property
+    def data(self):
+        return self._view[14:-3]
+
+    # Raise CommandFailed unless the status is R_SUCCESS
+    def check(self, commandname=None):
+        if not self.ok:
+            raise CommandFailed(commandname or '0x%08X' % self.commandid, self.status, self.sequence)
+        return self
+
+    def __len__(self):
+        return len(self._view) - 17
+
+    def __repr__(self):
+        return 'Reply(seq=%d, id=0x%08X, %s, %d bytes)' % (self.sequence, self.commandid, self.statusname, len(self))
@@ -0,0 +1,65 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyBoson3 command deadlines and retry policies
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyBoson-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+from .reply import CommandTimeout, PortError
+
+# Serial read timeout. Command deadlines are checked between reads, so this
+# is also their resolution.
+POLL_INTERVAL = 0.01
+
+# How one command is sent: timeout is the deadline of each attempt in seconds
+# (None meaning the controller's timeout), retries the number of extra
+# attempts after an error in retryon, each preceded by a pause starting at
+# backoff seconds and multiplied by factor up to maxbackoff.
+class RetryPolicy():
+    __slots__ = ('timeout', 'retries', 'backoff', 'factor', 'maxbackoff', 'retryon')
+
+    def __init__(self, timeout=None, retries=2, backoff=0.01, factor=2.0, maxbackoff=0.5,
+                 retryon=(CommandTimeout, PortError)):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.factor = factor
+        self.maxbackoff = maxbackoff
+        self.retryon = retryon
+
+    # Pauses before each retry
+    def pauses(self):
+        pause = self.backoff
+        for _ in range(self.retries):
+            yield min(pause, self.maxbackoff)
+            pause *= self.factor
+
+    # Upper bound in seconds of a command's latency under this policy, given
+    # the controller's default timeout. A deadline is only noticed at the end
+    # of the read it expires in, so each attempt may overrun it by one
+    # POLL_INTERVAL.
+    def bound(self, timeout):
+        if self.timeout is not None:
+            timeout = self.timeout
+        return (timeout + POLL_INTERVAL) * (self.retries + 1) + sum(self.pauses())
+
+    def __repr__(self):
+        return 'RetryPolicy(timeout=%s, retries=%d, backoff=%s)' % (self.timeout, self.retries, self.backoff)
+
+NORETRY = RetryPolicy(retries=0)
@@ -0,0 +1,271 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyBoson3 priority scheduler for the Boson commands
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyBoson-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+import heapq, threading
+from time import monotonic
+from itertools import count
+from collections import OrderedDict
+from concurrent.futures import Future
+from .stats import Histogram
+from .reply import BosonError
+
+# Priority classes, most urgent first
+PRIORITIES = OrderedDict([
+    ('interactive' ,    0),
+    ('control'     ,    1),
+    ('telemetry'   ,    2),
+    ('bulk'        ,    3),
+])
+
+# Seconds a queued command of each class may wait before it is dropped,
+# None meaning it is always sent
+DEADLINES = {
+    'interactive' :    None,
+    'control'     :    None,
+    'telemetry'   :    0.5,
+    'bulk'        :    None,
+}
+
+# A queued command waited longer than its class deadline and was not sent
+class DeadlineExpired(BosonError):
+    pass
+
+# The scheduler was stopped before the command could be sent
+class SchedulerStopped(BosonError):
+    pass
+
+# Future of a queued command. Once dispatched, waiting on it waits on the
+# BosonFuture, so the caller still reads the port itself when nobody else does.
+# It can be cancelled until the dispatcher takes it.
+class ScheduledFuture(Future):
+
+    def __init__(self, commandname, data, priority, deadline):
+        Future.__init__(self)
+        self.commandname = commandname
+        self.data = data
+        self.priority = priority
+        self.deadline = deadline
+        self.queued = monotonic()
+        self.dispatched = threading.Event()
+        self.inner = None
+
+    # undecoded reply data bytes once done, as on BosonFuture
+    @property
+    def replydata(self):
+        return None if self.inner is None else self.inner.replydata
+
+    def cancel(self):
+        if not Future.cancel(self):
+            return False
+        self.dispatched.set()
+        return True
+
+    def result(self, timeout=None):
+        self._wait(timeout)
+        return Future.result(self, 0)
+
+    def exception(self, timeout=None):
+        self._wait(timeout)
+        return Future.exception(self, 0)
+
+    def _wait(self, timeout):
+        start = monotonic()
+        if not self.dispatched.wait(timeout):
+            return
+        if self.inner is not None and not self.done():
+            remaining = None if timeout is None else max(0.0, timeout - (monotonic() - start))
+            self.inner.exception(remaining)
+
+# Owns the command stream of one BosonControl: commands are queued by priority
+# class and handed to BosonControl.submit by a dispatcher thread, most urgent
+# first. Background classes (everything but interactive) may only fill the
+# pipeline window up to pipelinedepth - reserve, so an interactive command
+# never queues behind more than the replies already in flight. Queued
+# commands past their class deadline are failed with DeadlineExpired instead
+# of being sent.
+#
+# While started, the scheduler is attached as control.scheduler and the user
+# methods of the control go through it in the interactive class.
+class CommandScheduler():
+
+    def __init__(self, control, deadlines=None, reserve=1):
+        self.control = control
+        self.deadlines = dict(DEADLINES)
+        self.deadlines.update(deadlines or {})
+        self.reserve = min(reserve, control.pipelinedepth - 1)
+        self.waits = OrderedDict((priority, Histogram()) for priority in PRIORITIES)
+        self.counters = OrderedDict((priority, OrderedDict([('queued', 0), ('dispatched', 0), ('expired', 0),
+                                                             ('cancelled', 0)]))
+                                    for priority in PRIORITIES)
+        self._queue = []
+        self._tiebreak = count()
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='boson-scheduler', daemon=True)
+        self._thread.start()
+        self.control.scheduler = self
+        return self
+
+    # Stops dispatching; whatever is still queued fails
+    def stop(self):
+        if self._thread is None:
+            return
+        if self.control.scheduler is self:
+            self.control.scheduler = None
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+        self._thread = None
+        with self._condition:
+            queue, self._queue = self._queue, []
+        for _, _, future in queue:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(SchedulerStopped('Scheduler stopped'))
+            future.dispatched.set()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def submit(self, commandname, data=b'', priority='control', deadline=None):
+        if deadline is None:
+            deadline = self.deadlines[priority]
+        future = ScheduledFuture(commandname, data, priority, deadline)
+        with self._condition:
+            if not self._running:
+                raise SchedulerStopped('Scheduler is not running')
+            heapq.heappush(self._queue, (PRIORITIES[priority], next(self._tiebreak), future))
+            self.counters[priority]['queued'] += 1
+            self._condition.notify()
+        return future
+
+    def sendCmdAndGetReply(self, commandname, data=b'', priority='control', deadline=None):
+        return self.submit(commandname, data, priority, deadline).result()
+
+    def depth(self):
+        depth = OrderedDict((priority, 0) for priority in PRIORITIES)
+        with self._condition:
+            for _, _, future in self._queue:
+                depth[future.priority] += 1
+        return depth
+
+    def snapshot(self):
+        return OrderedDict([
+            ('depth', self.depth()),
+            ('counters', OrderedDict((p, OrderedDict(c)) for p, c in self.counters.items())),
+            ('waits', OrderedDict((p, h.snapshot()) for p, h in self.waits.items())),
+        ])
+
+    def _wake(self, _future=None):
+        with self._condition:
+            self._condition.notify()
+
+    def _expire(self, now):
+        keep = []
+        for entry in self._queue:
+            future = entry[2]
+            if future.cancelled():
+                self.counters[future.priority]['cancelled'] += 1
+            elif future.deadline is not None and now - future.queued > future.deadline:
+                # claimed first, a cancel may come in meanwhile
+                if future.set_running_or_notify_cancel():
+                    self.counters[future.priority]['expired'] += 1
+                    future.set_exception(DeadlineExpired('%s waited longer than %.3fs' %
+                                                         (future.commandname, future.deadline)))
+                else:
+                    self.counters[future.priority]['cancelled'] += 1
+                future.dispatched.set()
+            else:
+                keep.append(entry)
+        if len(keep) != len(self._queue):
+            heapq.heapify(keep)
+            self._queue = keep
+
+    # Next future allowed into the pipeline window, or None
+    def _next(self):
+        if not self._queue:
+            return None
+        inflight = len(self.control._pending)
+        if inflight >= self.control.pipelinedepth:
+            return None
+        future = self._queue[0][2]
+        if future.priority != 'interactive' and inflight >= self.control.pipelinedepth - self.reserve:
+            return None
+        heapq.heappop(self._queue)
+        return future
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._running:
+                    return
+                self._expire(monotonic())
+                future = self._next()
+                if future is None and not self._queue:
+                    self._condition.wait()
+                    continue
+            if future is not None:
+                self._dispatch(future)
+                continue
+            # the window is full: read replies ourselves, nobody may be waiting
+            # on the commands in flight
+            pending = list(self.control._pending.values())
+            if pending:
+                self.control._pump(pending[0], 0.002)
+            else:
+                with self._condition:
+                    self._condition.wait(0.002)
+
+    def _dispatch(self, future):
+        # from here on it can no longer be cancelled
+        if not future.set_running_or_notify_cancel():
+            self.counters[future.priority]['cancelled'] += 1
+            return
+        self.waits[future.priority].add(monotonic() - future.queued)
+        self.counters[future.priority]['dispatched'] += 1
+        try:
+            inner = self.control.submit(future.commandname, future.data)
+        except Exception as e:
+            future.set_exception(e)
+            future.dispatched.set()
+            return
+        future.inner = inner
+        inner.add_done_callback(lambda f: self._chain(f, future))
+        future.dispatched.set()
+
+    def _chain(self, inner, future):
+        exception = inner.exception(0)
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(inner.result(0))
+        self._wake()
@@ -0,0 +1,309 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyBoson3 declarative schema of the Boson commands
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyBoson-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+import struct
+from collections import OrderedDict
+from .flirprotocols import CommandEncoder
+
+#---------- Multi-field IDD structs ---------------
+# Subclasses list their fields in __slots__ and the matching big endian
+# struct.Struct in STRUCT
+class StructType():
+    __slots__ = ()
+    STRUCT = struct.Struct('>')
+
+    def __init__(self, *values, **kwargs):
+        if not values and not kwargs:
+            values = (0,) * len(self.__slots__)
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+    @classmethod
+    def unpack(cls, data):
+        obj = cls.__new__(cls)
+        for name, value in zip(cls.__slots__, cls.STRUCT.unpack(data)):
+            setattr(obj, name, value)
+        return obj
+
+    def pack(self):
+        return self.STRUCT.pack(*[getattr(self, name) for name in self.__slots__])
+
+    def _asdict(self):
+        return OrderedDict((name, getattr(self, name)) for name in self.__slots__)
+
+    # Older spellings of pack/unpack
+    def toByteArray(self):
+        return bytearray(self.pack())
+
+    def fromByteArray(self, ba):
+        for name, value in zip(self.__slots__, self.STRUCT.unpack(bytes(ba))):
+            setattr(self, name, value)
+
+    def __eq__(self, other):
+        return type(other) is type(self) and self.pack() == other.pack()
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__,
+                           ', '.join('%s=%r' % (name, getattr(self, name)) for name in self.__slots__))
+
+class ScalerZoomParams(StructType):
+    __slots__ = ('zoom', 'xCenter', 'yCenter')
+    STRUCT = struct.Struct('>iii')
+
+class SwVersion(StructType):
+    __slots__ = ('major', 'minor', 'patch')
+    STRUCT = struct.Struct('>iii')
+
+class BufferSize(StructType):
+    __slots__ = ('bytes', 'rows', 'columns')
+    STRUCT = struct.Struct('>IHH')
+
+class CaptureRange(StructType):
+    __slots__ = ('bufferNum', 'offset', 'sizeInBytes')
+    STRUCT = struct.Struct('>BIH')
+
+class GainRange(StructType):
+    __slots__ = ('offset', 'sizeInBytes')
+    STRUCT = struct.Struct('>IH')
+
+class FlashRange(StructType):
+    __slots__ = ('location', 'index', 'offset', 'sizeInBytes')
+    STRUCT = struct.Struct('>iBIH')
+
+class FlashErase(StructType):
+    __slots__ = ('location', 'index', 'offset', 'length')
+    STRUCT = struct.Struct('>iBII')
+
+class FileRead(StructType):
+    __slots__ = ('buf', 'ret')
+    STRUCT = struct.Struct('>128sI')
+
+#---------- Command table ---------------
+# Format: name, FBP function id, request data, reply data. Data is None, a
+# struct format ('i', 'f', 'h', '4s', '128s128s', ...), a StructType or '*'
+# for variable length raw bytes
+SCHEMA = (
+    ('GETSERIAL'           , 0x00050002, None            , '4s'),
+    ('GETCOLORLUT'         , 0x000B0004, None            , 'i'),
+    ('SETCOLORLUT'         , 0x000B0003, 'i'             , None),
+    ('COLORLUTSETCONTROL'  , 0x000B0001, 'i'             , None),
+    ('COLORLUTGETCONTROL'  , 0x000B0002, None            , 'i'),
+    ('GETPARTNUMBER'       , 0x00050004, None            , '20s'),
+    ('GETGAINMODE'         , 0x00050015, None            , 'i'),
+    ('SETGAINMODE'         , 0x00050014, 'i'             , None),
+    ('ACGSETLINEARPERCENT' , 0x00090003, 'f'             , None),
+    ('ACGGETLINEARPERCENT' , 0x00090004, None            , 'f'),
+    ('ACGGETOUTLIERCUT'    , 0x00090006, None            , 'f'),
+    ('ACGSETOUTLIERCUT'    , 0x00090005, 'f'             , None),
+    ('ACGGETMAXGAIN'       , 0x0009000A, None            , 'f'),
+    ('ACGSETMAXGAIN'       , 0x00090009, 'f'             , None),
+    ('ACGGETDUMPINGFACTOR' , 0x0009000C, None            , 'f'),
+    ('ACGSETDUMPINGFACTOR' , 0x0009000B, 'f'             , None),
+    ('ACGGETGAMMA'         , 0x0009000E, None            , 'f'),
+    ('ACGSETGAMMA'         , 0x0009000D, 'f'             , None),
+    ('ACGGETDTBR'          , 0x00090016, None            , 'f'),
+    ('ACGSETDTBR'          , 0x00090015, 'f'             , None),
+    ('ACGGETSIGMAR'        , 0x00090018, None            , 'f'),
+    ('ACGSETSIGMAR'        , 0x00090017, 'f'             , None),
+    ('ACGGETENTROPY'       , 0x0009001F, None            , 'i'),
+    ('ACGSETENTROPY'       , 0x0009001E, 'i'             , None),
+    ('ACGRESTOREDEFAULT'   , 0x0005001B, None            , None),
+    ('FPATEMPDEDCx10'      , 0x00050030, None            , 'h'),
+    ('FPAGETTEMPTABLE'     , 0x00020020, None            , '64s'),
+    ('SCALERGETZOOM'       , 0x000D0003, None            , ScalerZoomParams),
+    ('SCALERGETMAXZOOM'    , 0x000D0001, None            , 'i'),
+    ('GETSWVERSION'        , 0x00050056, None            , SwVersion),
+    ('SCALERSETZOOM'       , 0x000D0002, ScalerZoomParams, None),
+    ('MEMREADCAPTURE'      , 0xFFFF0003, CaptureRange    , '*'),
+    ('MEMGETCAPTURESIZE'   , 0xFFFF0004, None            , BufferSize),
+    ('MEMWRITEFLASH'       , 0xFFFF0005, '*'             , None),
+    ('MEMREADFLASH'        , 0xFFFF0006, FlashRange      , '*'),
+    ('MEMGETFLASHSIZE'     , 0xFFFF0007, 'i'             , 'I'),
+    ('MEMERASEFLASH'       , 0xFFFF0008, 'iB'            , None),
+    ('MEMERASEFLASHPARTIAL', 0xFFFF0009, FlashErase      , None),
+    ('MEMREADCURRENTGAIN'  , 0xFFFF000A, GainRange       , '*'),
+    ('MEMGETGAINSIZE'      , 0xFFFF000B, None            , BufferSize),
+    ('FILEOPSFOPEN'        , 0x00160003, '128s128s'      , 'I'),
+    ('FILEOPSFCLOSE'       , 0x00160004, 'I'             , None),
+    ('FILEOPSFREAD'        , 0x00160005, 'II'            , FileRead),
+    ('FILEOPSFWRITE'       , 0x00160006, 'II128s'        , 'I'),
+    ('FILEOPSFTELL'        , 0x00160007, 'I'             , 'I'),
+    ('FILEOPSFSEEK'        , 0x00160008, 'III'           , None),
+    ('FILEOPSGETFILESIZE'  , 0x0016000D, '128s'          , 'I'),
+)
+
+# Format: user method, command. Getters take no argument, setters take the
+# request value(s); anything needing enums or several commands is hand written
+METHODS = (
+    ('getSerial'           , 'GETSERIAL'),
+    ('getPartNumber'       , 'GETPARTNUMBER'),
+    ('getAgcLinearPercent' , 'ACGGETLINEARPERCENT'),
+    ('getAgcOutlierCut'    , 'ACGGETOUTLIERCUT'),
+    ('getAgcMaxGain'       , 'ACGGETMAXGAIN'),
+    ('setAgcMaxGain'       , 'ACGSETMAXGAIN'),
+    ('setLinearPercent'    , 'ACGSETLINEARPERCENT'),
+    ('setOutlierCut'       , 'ACGSETOUTLIERCUT'),
+    ('restoreDefaults'     , 'ACGRESTOREDEFAULT'),
+    ('setAgcDumpingFactor' , 'ACGSETDUMPINGFACTOR'),
+    ('getAgcDumpingFactor' , 'ACGGETDUMPINGFACTOR'),
+    ('setAgcGamma'         , 'ACGSETGAMMA'),
+    ('getAgcGamma'         , 'ACGGETGAMMA'),
+    ('setAgcDtbr'          , 'ACGSETDTBR'),
+    ('getAgcDtbr'          , 'ACGGETDTBR'),
+    ('setAgcSigmar'        , 'ACGSETSIGMAR'),
+    ('getAgcSigmar'        , 'ACGGETSIGMAR'),
+    ('getFpaTempDedCx10'   , 'FPATEMPDEDCx10'),
+    ('getCaptureSize'      , 'MEMGETCAPTURESIZE'),
+    ('getGainSize'         , 'MEMGETGAINSIZE'),
+    ('getFlashSize'        , 'MEMGETFLASHSIZE'),
+    ('getFileSize'         , 'FILEOPSGETFILESIZE'),
+)
+
+_TYPENAMES = { 'i': 'int', 'f': 'float', 'h': 'short' }
+
+# One compiled schema line: precomputed Struct, codec callables and encoder
+class Command():
+    __slots__ = ('name', 'id', 'commandid', 'request', 'reply', 'retbytes', 'argbytes',
+                 'typename', 'encode', 'decode', 'decoderequest', 'encoder')
+
+    def __init__(self, name, functionid, request, reply):
+        self.name = name
+        self.id = functionid
+        self.commandid = functionid.to_bytes(4, 'big')
+        self.request = request
+        self.reply = reply
+        self.encoder = CommandEncoder(self.commandid)
+        self.typename = _TYPENAMES.get(reply) if isinstance(reply, str) else None
+        self.argbytes, self.encode = _compileEncode(name, request)
+        self.retbytes, self.decode = _compileDecode(reply)
+        _, self.decoderequest = _compileDecode(request)
+
+    def __repr__(self):
+        return 'Command(%s, 0x%08X)' % (self.name, self.id)
+
+# Raw '*' data is returned as is, i.e. as a memoryview of the reply frame
+def _compileDecode(spec):
+    if spec is None:
+        return 0, bytes
+    if spec == '*':
+        return 0, lambda data: data
+    if isinstance(spec, type) and issubclass(spec, StructType):
+        return spec.STRUCT.size, spec.unpack
+    s = struct.Struct('>' + spec)
+    if spec.endswith('s'):
+        return s.size, bytes
+    unpack = s.unpack
+    return s.size, lambda data: unpack(data)[0]
+
+def _compileEncode(name, spec):
+    if spec is None:
+        def encode(*args):
+            if args and args != (b'',):
+                raise TypeError('%s takes no data' % name)
+            return b''
+        return 0, encode
+    if spec == '*':
+        return 0, bytes
+    if isinstance(spec, type) and issubclass(spec, StructType):
+        s = spec.STRUCT
+    else:
+        s = struct.Struct('>' + spec)
+    pack = s.pack
+    size = s.size
+    single = isinstance(spec, str) and spec.rstrip('s').isdigit()
+
+    def encode(*args):
+        if len(args) == 1:
+            value = args[0]
+            # already encoded data, e.g. from ToByteArray or a StructType
+            if isinstance(value, (bytes, bytearray)):
+                if len(value) == size:
+                    return bytes(value)
+                if not single:
+                    raise ValueError('%s takes %d data bytes, got %d' % (name, size, len(value)))
+                # a lone string field, e.g. a path: pack pads it
+            if isinstance(value, StructType):
+                return value.pack()
+        return pack(*args)
+    return size, encode
+
+# Compiled once at import: name -> Command, and FBP function id -> Command
+COMMANDS = OrderedDict((line[0], Command(*line)) for line in SCHEMA)
+BYID = dict((command.id, command) for command in COMMANDS.values())
+
+# The older table format: id, reply size and scalar type name
+def legacyCommands():
+    legacy = {}
+    for name, command in COMMANDS.items():
+        legacy[name] = { 'id': bytearray(command.commandid), 'retbytes': command.retbytes }
+        if command.typename:
+            legacy[name]['type'] = command.typename
+    return legacy
+
+#---------- Generated user methods ---------------
+def _getter(methodname, command):
+    commandname = command.name
+    def method(self):
+        return self.sendCmdAndGetReply(commandname)
+    return method
+
+def _setter(methodname, command):
+    commandname = command.name
+    encode = command.encode
+    def method(self, *args):
+        return self.sendCmdAndGetReply(commandname, encode(*args))
+    return method
+
+# The coroutines take the reply timeout of sendCmdAndGetReply as keyword
+def _asyncGetter(methodname, command):
+    commandname = command.name
+    async def method(self, timeout=None):
+        return await self.sendCmdAndGetReply(commandname, timeout=timeout)
+    return method
+
+def _asyncSetter(methodname, command):
+    commandname = command.name
+    encode = command.encode
+    async def method(self, *args, timeout=None):
+        return await self.sendCmdAndGetReply(commandname, encode(*args), timeout=timeout)
+    return method
+
+def _generate(classname, getter, setter):
+    namespace = {}
+    for methodname, commandname in METHODS:
+        command = COMMANDS[commandname]
+        if command.request is None:
+            method = getter(methodname, command)
+        else:
+            method = setter(methodname, command)
+        method.__name__ = methodname
+        method.__qualname__ = '%s.%s' % (classname, methodname)
+        method.__doc__ = 'Sends %s (0x%08X)' % (command.name, command.id)
+        namespace[methodname] = method
+    return type(classname, (), namespace)
+
+# Mixins with one method per METHODS line, calling self.sendCmdAndGetReply
+BosonCommands = _generate('BosonCommands', _getter, _setter)
+AsyncBosonCommands = _generate('AsyncBosonCommands', _asyncGetter, _asyncSetter)
@@ -0,0 +1,141 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyBoson3 shadow copy of the camera registers
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyBoson-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+from time import monotonic
+
+# Format: command name -> (family, 'get' or 'set'). A get and a set of the same
+# family exchange the same data bytes, so either one fills the cache.
+FAMILIES = {
+    'GETSERIAL'           :    ('SERIAL'         , 'get'),
+    'GETPARTNUMBER'       :    ('PARTNUMBER'     , 'get'),
+    'GETSWVERSION'        :    ('SWVERSION'      , 'get'),
+    'GETCOLORLUT'         :    ('COLORLUT'       , 'get'),
+    'SETCOLORLUT'         :    ('COLORLUT'       , 'set'),
+    'COLORLUTGETCONTROL'  :    ('COLORLUTCONTROL', 'get'),
+    'COLORLUTSETCONTROL'  :    ('COLORLUTCONTROL', 'set'),
+    'GETGAINMODE'         :    ('GAINMODE'       , 'get'),
+    'SETGAINMODE'         :    ('GAINMODE'       , 'set'),
+    'ACGGETLINEARPERCENT' :    ('LINEARPERCENT'  , 'get'),
+    'ACGSETLINEARPERCENT' :    ('LINEARPERCENT'  , 'set'),
+    'ACGGETOUTLIERCUT'    :    ('OUTLIERCUT'     , 'get'),
+    'ACGSETOUTLIERCUT'    :    ('OUTLIERCUT'     , 'set'),
+    'ACGGETMAXGAIN'       :    ('MAXGAIN'        , 'get'),
+    'ACGSETMAXGAIN'       :    ('MAXGAIN'        , 'set'),
+    'ACGGETDUMPINGFACTOR' :    ('DUMPINGFACTOR'  , 'get'),
+    'ACGSETDUMPINGFACTOR' :    ('DUMPINGFACTOR'  , 'set'),
+    'ACGGETGAMMA'         :    ('GAMMA'          , 'get'),
+    'ACGSETGAMMA'         :    ('GAMMA'          , 'set'),
+    'ACGGETDTBR'          :    ('DTBR'           , 'get'),
+    'ACGSETDTBR'          :    ('DTBR'           , 'set'),
+    'ACGGETSIGMAR'        :    ('SIGMAR'         , 'get'),
+    'ACGSETSIGMAR'        :    ('SIGMAR'         , 'set'),
+    'ACGGETENTROPY'       :    ('ENTROPY'        , 'get'),
+    'ACGSETENTROPY'       :    ('ENTROPY'        , 'set'),
+    'SCALERGETZOOM'       :    ('ZOOM'           , 'get'),
+    'SCALERSETZOOM'       :    ('ZOOM'           , 'set'),
+    'SCALERGETMAXZOOM'    :    ('MAXZOOM'        , 'get'),
+}
+
+# Families that never change for a given camera
+IDENTITY = ('SERIAL', 'PARTNUMBER', 'SWVERSION')
+
+# Commands after which every mutable family is unknown
+RESTORES = ('ACGRESTOREDEFAULT',)
+
+# Write-through cache of the camera state, keyed by command family and holding
+# the raw data bytes. Identity data is kept forever, everything else for ttl
+# seconds (per family overrides in ttls, None meaning forever). With
+# skipredundant a set whose data matches the cache is not sent at all.
+class ShadowCache():
+
+    def __init__(self, ttl=1.0, ttls=None, skipredundant=True):
+        self.ttl = ttl
+        self.ttls = dict(ttls or {})
+        self.skipredundant = skipredundant
+        self._values = {}
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    def _expiry(self, family):
+        if family in IDENTITY:
+            return None
+        ttl = self.ttls.get(family, self.ttl)
+        if ttl is None:
+            return None
+        return monotonic() + ttl
+
+    def _get(self, family):
+        entry = self._values.get(family)
+        if entry is None:
+            return None
+        data, expiry = entry
+        if expiry is not None and monotonic() >= expiry:
+            # another thread may have dropped it already
+            self._values.pop(family, None)
+            return None
+        return data
+
+    # Returns the cached data bytes for a get command or None
+    def lookup(self, commandname):
+        family = FAMILIES.get(commandname)
+        if family is None or family[1] != 'get':
+            return None
+        data = self._get(family[0])
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    # True if a set command would write what the camera already holds
+    def isRedundant(self, commandname, data):
+        if not self.skipredundant:
+            return False
+        family = FAMILIES.get(commandname)
+        if family is None or family[1] != 'set':
+            return False
+        redundant = self._get(family[0]) == bytes(data)
+        if redundant:
+            self.skipped += 1
+        return redundant
+
+    # Called with the data bytes of every successful get reply or set command
+    def update(self, commandname, data):
+        if commandname in RESTORES:
+            self.invalidate()
+            return
+        family = FAMILIES.get(commandname)
+        if family is not None:
+            self._values[family[0]] = (bytes(data), self._expiry(family[0]))
+
+    def invalidate(self, commandname=None):
+        if commandname is None:
+            for family in list(self._values):
+                if family not in IDENTITY:
+                    self._values.pop(family, None)
+        elif commandname in FAMILIES:
+            self._values.pop(FAMILIES[commandname][0], None)
+
+    def clear(self):
+        self._values.clear()
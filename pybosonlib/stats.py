@@ -0,0 +1,153 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyBoson3 latency histograms and wire counters
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyBoson-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+import logging, threading
+from collections import OrderedDict
+
+# Timed phases of a command, in the order they happen
+PHASES = ('encode', 'mutexwait', 'write', 'firstbyte', 'roundtrip')
+
+COUNTERS = ('commands', 'bytessent', 'bytesreceived', 'stuffingoverhead',
+            'timeouts', 'ignored', 'crcerrors')
+
+# Bucket i holds samples below 2**i microseconds, the last one everything above
+BUCKETS = 24
+
+# Fixed size log2 histogram of durations in seconds
+class Histogram():
+    __slots__ = ('counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, seconds):
+        bucket = int(seconds * 1e6).bit_length()
+        if bucket >= BUCKETS:
+            bucket = BUCKETS - 1
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    # Upper bound in seconds of the bucket holding the p-th percentile
+    def percentile(self, p):
+        if not self.count:
+            return None
+        rank = p / 100.0 * self.count
+        seen = 0
+        for bucket, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min((1 << bucket) / 1e6, self.max)
+        return self.max
+
+    def snapshot(self):
+        return OrderedDict([
+            ('count', self.count),
+            ('mean', self.total / self.count if self.count else None),
+            ('min', self.min),
+            ('p50', self.percentile(50)),
+            ('p90', self.percentile(90)),
+            ('p99', self.percentile(99)),
+            ('max', self.max),
+        ])
+
+# Per command name histograms of every phase plus wire counters. Attach one
+# to BosonControl.stats; when stats is None nothing is measured at all.
+class Instrumentation():
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = OrderedDict((counter, 0) for counter in COUNTERS)
+        self._lock = threading.Lock()
+        self._logger = None
+
+    # Updated from the pipeline reader and the calling threads alike, so
+    # every update holds the lock
+    def record(self, commandname, phase, seconds):
+        with self._lock:
+            phases = self.histograms.get(commandname)
+            if phases is None:
+                phases = self.histograms[commandname] = OrderedDict((p, Histogram()) for p in PHASES)
+            phases[phase].add(seconds)
+
+    def count(self, counter, n=1):
+        with self._lock:
+            self.counters[counter] += n
+
+    def reset(self):
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        self.histograms = {}
+        for counter in self.counters:
+            self.counters[counter] = 0
+
+    # With reset the copy and the reset are one step, so nothing counted in
+    # between is lost
+    def snapshot(self, reset=False):
+        with self._lock:
+            snapshot = OrderedDict([
+                ('counters', OrderedDict(self.counters)),
+                ('commands', OrderedDict(
+                    (name, OrderedDict((phase, h.snapshot()) for phase, h in phases.items()))
+                    for name, phases in sorted(self.histograms.items()))),
+            ])
+            if reset:
+                self._reset()
+        return snapshot
+
+    # Log one line per command and one with the counters every interval seconds
+    def startLogger(self, interval=60.0, logger=None, reset=True):
+        self.stopLogger()
+        logger = logger or logging.getLogger('pybosonlib.stats')
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                snapshot = self.snapshot(reset)
+                logger.info('boson counters %s', dict(snapshot['counters']))
+                for name, phases in snapshot['commands'].items():
+                    roundtrip = phases['roundtrip']
+                    if roundtrip['count']:
+                        logger.info('boson %s n=%d mean=%.6fs p99=%.6fs max=%.6fs', name, roundtrip['count'],
+                                    roundtrip['mean'], roundtrip['p99'], roundtrip['max'])
+
+        thread = threading.Thread(target=run, name='boson-stats', daemon=True)
+        self._logger = (stop, thread)
+        thread.start()
+
+    def stopLogger(self):
+        if self._logger is not None:
+            stop, thread = self._logger
+            stop.set()
+            thread.join()
+            self._logger = None
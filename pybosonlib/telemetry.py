@@ -0,0 +1,281 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyBoson3 background telemetry sampler
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyBoson-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+import heapq, logging, threading
+from array import array
+from bisect import bisect_left
+from time import monotonic
+from collections import OrderedDict
+from .fpa import decodeFpaTable, FPA_TABLE_ENTRIES
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+log = logging.getLogger('pybosonlib.telemetry')
+
+# Fixed size buffer of timestamped rows of width doubles. Every row is written
+# twice, at i and i + capacity, so the last n rows are always contiguous and
+# can be handed out as views without copying. Views alias the buffer: copy
+# them if they must outlive the next capacity - n samples.
+class RingBuffer():
+
+    def __init__(self, capacity, width=1, usenumpy=None):
+        if usenumpy is None:
+            usenumpy = numpy is not None
+        if usenumpy and numpy is None:
+            raise ImportError('RingBuffer(usenumpy=True) needs numpy')
+        self.capacity = capacity
+        self.width = width
+        self.usenumpy = usenumpy
+        if usenumpy:
+            self._times = numpy.zeros(2 * capacity)
+            self._values = numpy.zeros((2 * capacity, width))
+        else:
+            self._times = array('d', bytes(16 * capacity))
+            self._values = array('d', bytes(16 * capacity * width))
+        self._head = 0
+        self.count = 0
+        self.total = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, t, value):
+        head = self._head
+        mirror = head + self.capacity
+        self._times[head] = self._times[mirror] = t
+        if self.width == 1:
+            if self.usenumpy:
+                self._values[head, 0] = self._values[mirror, 0] = value
+            else:
+                self._values[head] = self._values[mirror] = value
+        elif self.usenumpy:
+            self._values[head] = self._values[mirror] = value
+        else:
+            values = self._values
+            width = self.width
+            head *= width
+            mirror *= width
+            for j, v in enumerate(value):
+                values[head + j] = values[mirror + j] = v
+        self._head = (self._head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+        self.total += 1
+
+    # Oldest to newest: start is the buffer row of the oldest of the last n
+    def _span(self, n):
+        n = min(n, self.count)
+        end = self._head + self.capacity
+        return end - n, end
+
+    def _view(self, start, end):
+        if self.usenumpy:
+            values = self._values[start:end]
+            return self._times[start:end], values[:, 0] if self.width == 1 else values
+        times = memoryview(self._times)[start:end]
+        values = memoryview(self._values)[start * self.width:end * self.width]
+        if self.width > 1:
+            values = values.cast('B').cast('d', [end - start, self.width])
+        return times, values
+
+    # (times, values) views of the most recent n samples, oldest first
+    def latest(self, n=None):
+        return self._view(*self._span(self.count if n is None else n))
+
+    # (times, values) views of the samples taken in the last seconds
+    def window(self, seconds, now=None):
+        start, end = self._span(self.count)
+        if now is None:
+            now = monotonic()
+        start = bisect_left(memoryview(self._times)[:end] if not self.usenumpy else self._times[:end],
+                            now - seconds, start, end)
+        return self._view(start, end)
+
+    def last(self):
+        if not self.count:
+            return None, None
+        times, values = self.latest(1)
+        return times[0], values[0]
+
+    def clear(self):
+        self._head = 0
+        self.count = 0
+
+# One sampled quantity: the command to send, its base rate in Hz and how to
+# turn the decoded reply into width doubles
+class Metric():
+    __slots__ = ('name', 'commandname', 'rate', 'width', 'convert')
+
+    def __init__(self, name, commandname, rate=1.0, width=1, convert=None):
+        self.name = name
+        self.commandname = commandname
+        self.rate = rate
+        self.width = width
+        self.convert = convert
+
+    def __repr__(self):
+        return 'Metric(%s, %s, %.3gHz)' % (self.name, self.commandname, self.rate)
+
+# Format: name, command, default rate in Hz, width, conversion of the reply
+METRICS = OrderedDict((m.name, m) for m in (
+    Metric('fpatemp'       , 'FPATEMPDEDCx10'      , 1.0 , 1                 , lambda v: v / 10.0),
+    Metric('fpatable'      , 'FPAGETTEMPTABLE'     , 0.2 , FPA_TABLE_ENTRIES , decodeFpaTable),
+    Metric('linearpercent' , 'ACGGETLINEARPERCENT' , 0.2),
+    Metric('outliercut'    , 'ACGGETOUTLIERCUT'    , 0.2),
+    Metric('maxgain'       , 'ACGGETMAXGAIN'       , 0.2),
+    Metric('dumpingfactor' , 'ACGGETDUMPINGFACTOR' , 0.2),
+    Metric('gamma'         , 'ACGGETGAMMA'         , 0.2),
+    Metric('dtbr'          , 'ACGGETDTBR'          , 0.2),
+    Metric('sigmar'        , 'ACGGETSIGMAR'        , 0.2),
+))
+
+# Polls metrics from a BosonControl on one background thread through the
+# pipelined submit path, so control commands never wait behind a sample for
+# longer than one write. With a CommandScheduler samples are queued in its
+# telemetry class instead. rates maps metric name -> Hz (only those are sampled,
+# default every METRICS entry at its default rate); extra Metric objects can
+# be passed in metrics. Each metric gets a RingBuffer of capacity samples.
+#
+# Backoff: when the link is saturated, i.e. the pipeline window is full or a
+# sample took longer than latencybudget seconds, every interval is multiplied
+# by 2 up to maxbackoff; it halves again once samples come back in budget.
+class TelemetrySampler():
+
+    def __init__(self, control, rates=None, metrics=None, capacity=1024, usenumpy=None,
+                 latencybudget=0.05, maxbackoff=16, scheduler=None):
+        self.control = control
+        self.scheduler = scheduler
+        self.metrics = OrderedDict()
+        for metric in (metrics or ()):
+            self.metrics[metric.name] = metric
+        if rates is None and not self.metrics:
+            rates = dict((name, metric.rate) for name, metric in METRICS.items())
+        for name, rate in (rates or {}).items():
+            metric = self.metrics.get(name) or METRICS[name]
+            self.metrics[name] = Metric(name, metric.commandname, rate, metric.width, metric.convert)
+        self.buffers = OrderedDict((name, RingBuffer(capacity, metric.width, usenumpy))
+                                   for name, metric in self.metrics.items())
+        self.latencybudget = latencybudget
+        self.maxbackoff = maxbackoff
+        self.backoff = 1
+        self.samples = 0
+        self.errors = 0
+        self.skipped = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __getitem__(self, name):
+        return self.buffers[name]
+
+    def latest(self, name, n=None):
+        return self.buffers[name].latest(n)
+
+    def window(self, name, seconds, now=None):
+        return self.buffers[name].window(seconds, now)
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='boson-telemetry', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _saturated(self):
+        control = self.control
+        if self.scheduler is not None and self.scheduler.depth()['telemetry']:
+            return True
+        return len(control._pending) >= control.pipelinedepth
+
+    def _run(self):
+        now = monotonic()
+        # (due time, tie breaker, metric)
+        due = [(now, i, metric) for i, metric in enumerate(self.metrics.values()) if metric.rate > 0]
+        heapq.heapify(due)
+        while due and not self._stop.wait(max(0.0, due[0][0] - monotonic())):
+            now = monotonic()
+            batch = []
+            while due and due[0][0] <= now:
+                batch.append(heapq.heappop(due))
+
+            if self._saturated():
+                self.skipped += len(batch)
+                self._slower()
+            else:
+                self._sample([metric for _, _, metric in batch])
+
+            now = monotonic()
+            for _, i, metric in batch:
+                heapq.heappush(due, (now + self.backoff / metric.rate, i, metric))
+
+    # Submit the whole batch at once, then collect the replies
+    def _sample(self, metrics):
+        futures = []
+        for metric in metrics:
+            try:
+                if self.scheduler is not None:
+                    future = self.scheduler.submit(metric.commandname, priority='telemetry')
+                else:
+                    future = self.control.submit(metric.commandname)
+                futures.append((metric, monotonic(), future))
+            except Exception as e:
+                self.errors += 1
+                log.debug('telemetry %s failed: %s', metric.name, e)
+        late = False
+        for metric, submitted, future in futures:
+            try:
+                value = future.result()
+            except Exception as e:
+                self.errors += 1
+                late = True
+                log.debug('telemetry %s failed: %s', metric.name, e)
+                continue
+            now = monotonic()
+            if now - submitted > self.latencybudget:
+                late = True
+            if metric.convert is not None:
+                value = metric.convert(value)
+            self.buffers[metric.name].append(now, value)
+            self.samples += 1
+        if late:
+            self._slower()
+        elif self.backoff > 1:
+            self.backoff //= 2
+
+    def _slower(self):
+        self.backoff = min(self.backoff * 2, self.maxbackoff)
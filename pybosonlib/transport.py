@@ -0,0 +1,480 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+#
+#    PyBoson3 byte transports: pyserial, raw tty, TCP and in memory loopback
+#
+#    Author: Giacomo Benelli benelli.giacomo@aerialtronics.com
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 2 only.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+#    USA
+
+"""PyBoson-3 by Giacomo Benelli <benelli.giacomo@gmail.com>"""
+
+import os, array, select, socket, threading, logging
+from time import monotonic
+from collections import OrderedDict
+
+try:
+    import fcntl, termios, tty
+except ImportError:
+    fcntl = termios = tty = None
+
+try:
+    import serial
+except ImportError:
+    serial = None
+
+log = logging.getLogger('pybosonlib.transport')
+
+BAUDRATE = 921600
+
+# linux/serial.h
+TIOCGSERIAL = 0x541E
+TIOCSSERIAL = 0x541F
+ASYNC_LOW_LATENCY = 0x2000
+
+COUNTERS = ('reads', 'emptyreads', 'bytesread', 'writes', 'packets', 'byteswritten', 'opens')
+
+# What BosonControl needs from a link to the camera. timeout is the longest
+# a read waits for the first byte. All errors are OSError (pyserial's
+# SerialException is one), so callers treat every backend alike.
+#
+#   readinto(buf)      fills buf with what is available, 0 after timeout
+#   write(data)        one packet
+#   writelines(datas)  a batch of packets, in a single system call if possible
+#   inWaiting()        bytes readable without blocking
+#   flushInput()       drop unread bytes
+class Transport():
+    name = 'transport'
+
+    def __init__(self, portname, timeout=0.01):
+        self.portname = portname
+        self.timeout = timeout
+        self.counters = OrderedDict((counter, 0) for counter in COUNTERS)
+
+    def isOpen(self):
+        raise NotImplementedError
+
+    def open(self):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+    def readinto(self, buf):
+        raise NotImplementedError
+
+    def write(self, data):
+        self.writelines((data,))
+
+    def writelines(self, datas):
+        raise NotImplementedError
+
+    def inWaiting(self):
+        raise NotImplementedError
+
+    def flushInput(self):
+        raise NotImplementedError
+
+    def flushOutput(self):
+        pass
+
+    def _counted(self, n):
+        counters = self.counters
+        counters['reads'] += 1
+        if n:
+            counters['bytesread'] += n
+        else:
+            counters['emptyreads'] += 1
+        return n
+
+    def snapshot(self):
+        return OrderedDict([
+            ('transport', self.name),
+            ('port', self.portname),
+            ('open', self.isOpen()),
+            ('counters', OrderedDict(self.counters)),
+        ])
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, self.portname)
+
+#---------- pyserial ---------------
+class SerialTransport(Transport):
+    name = 'serial'
+
+    def __init__(self, portname, timeout=0.01, baudrate=BAUDRATE):
+        Transport.__init__(self, portname, timeout)
+        if serial is None:
+            raise ImportError('SerialTransport needs pyserial')
+        self.baudrate = baudrate
+        self.port = None
+
+    def isOpen(self):
+        return self.port is not None and self.port.isOpen()
+
+    def open(self):
+        self.port = serial.Serial(self.portname, self.baudrate, timeout=self.timeout, stopbits=1, bytesize=8,
+                                  rtscts=False, dsrdtr=False)
+        self.counters['opens'] += 1
+
+    def close(self):
+        port, self.port = self.port, None
+        if port is not None:
+            port.close()
+
+    # pyserial's own readinto waits for the whole buffer, so read what is there
+    def readinto(self, buf):
+        port = self.port
+        data = port.read(min(port.in_waiting or 1, len(buf)))
+        n = len(data)
+        buf[:n] = data
+        return self._counted(n)
+
+    def writelines(self, datas):
+        data = b''.join(datas)
+        self.port.write(data)
+        self.counters['writes'] += 1
+        self.counters['packets'] += len(datas)
+        self.counters['byteswritten'] += len(data)
+
+    def inWaiting(self):
+        return self.port.in_waiting
+
+    def flushInput(self):
+        self.port.reset_input_buffer()
+
+    def flushOutput(self):
+        self.port.reset_output_buffer()
+
+#---------- Raw file descriptor ---------------
+# Opens the tty with os.open and reads straight into the caller's buffer.
+# On USB serial adapters the driver's ASYNC_LOW_LATENCY flag is set, which
+# stops them from holding received bytes back for up to 16 ms; lowlatency
+# tells whether that worked (pseudo terminals and CDC ACM ports refuse it).
+class FdTransport(Transport):
+    name = 'fd'
+
+    def __init__(self, portname, timeout=0.01, baudrate=BAUDRATE, lowlatency=True):
+        Transport.__init__(self, portname, timeout)
+        if termios is None:
+            raise ImportError('FdTransport needs a POSIX system')
+        self.baudrate = baudrate
+        self.wantlowlatency = lowlatency
+        self.lowlatency = False
+        self.fd = None
+        self._available = array.array('i', [0])
+
+    def isOpen(self):
+        return self.fd is not None
+
+    def open(self):
+        fd = os.open(self.portname, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            # raw 8N1, no flow control
+            tty.setraw(fd)
+            attrs = termios.tcgetattr(fd)
+            attrs[2] = (attrs[2] | termios.CLOCAL | termios.CREAD) & ~(termios.CSTOPB | termios.CRTSCTS)
+            speed = getattr(termios, 'B%d' % self.baudrate)
+            attrs[4] = attrs[5] = speed
+            termios.tcsetattr(fd, termios.TCSANOW, attrs)
+        except termios.error:
+            # e.g. a pseudo terminal without speed settings
+            pass
+        self.fd = fd
+        self.lowlatency = self.wantlowlatency and self._setLowLatency()
+        self.counters['opens'] += 1
+
+    def _setLowLatency(self):
+        info = array.array('i', [0] * 32)
+        try:
+            fcntl.ioctl(self.fd, TIOCGSERIAL, info)
+            # flags is the fifth int of struct serial_struct
+            info[4] |= ASYNC_LOW_LATENCY
+            fcntl.ioctl(self.fd, TIOCSSERIAL, info)
+        except OSError as e:
+            log.debug('No low latency mode on %s: %s', self.portname, e)
+            return False
+        return True
+
+    def close(self):
+        fd, self.fd = self.fd, None
+        if fd is not None:
+            os.close(fd)
+
+    def readinto(self, buf):
+        fd = self.fd
+        try:
+            n = os.readv(fd, (buf,))
+        except BlockingIOError:
+            ready, _, _ = select.select((fd,), (), (), self.timeout)
+            if not ready:
+                return self._counted(0)
+            n = os.readv(fd, (buf,))
+        if not n:
+            raise OSError('%s closed' % self.portname)
+        return self._counted(n)
+
+    def writelines(self, datas):
+        datas = [memoryview(data) for data in datas]
+        total = sum(len(data) for data in datas)
+        self.counters['packets'] += len(datas)
+        self.counters['byteswritten'] += total
+        while datas:
+            try:
+                written = os.writev(self.fd, datas)
+            except BlockingIOError:
+                written = 0
+            self.counters['writes'] += 1
+            while datas and written >= len(datas[0]):
+                written -= len(datas[0])
+                datas.pop(0)
+            if datas:
+                datas[0] = datas[0][written:]
+                select.select((), (self.fd,), (), 1.0)
+
+    def inWaiting(self):
+        fcntl.ioctl(self.fd, termios.FIONREAD, self._available)
+        return self._available[0]
+
+    def flushInput(self):
+        try:
+            termios.tcflush(self.fd, termios.TCIFLUSH)
+        except termios.error:
+            pass
+        # a pty may keep bytes tcflush does not see
+        while self.inWaiting():
+            os.read(self.fd, 4096)
+
+    def flushOutput(self):
+        try:
+            termios.tcflush(self.fd, termios.TCOFLUSH)
+        except termios.error:
+            pass
+
+    def snapshot(self):
+        snapshot = Transport.snapshot(self)
+        snapshot['lowlatency'] = self.lowlatency
+        return snapshot
+
+#---------- TCP ---------------
+# A serial to network gateway on a companion computer, e.g. ser2net in raw
+# mode or python -m pybosonlib.transport. portname is tcp://host:port.
+class TcpTransport(Transport):
+    name = 'tcp'
+
+    def __init__(self, portname, timeout=0.01, connecttimeout=5.0):
+        Transport.__init__(self, portname, timeout)
+        address = portname[len('tcp://'):] if portname.startswith('tcp://') else portname
+        host, _, port = address.rpartition(':')
+        self.address = (host, int(port))
+        self.connecttimeout = connecttimeout
+        self.sock = None
+        self._available = array.array('i', [0])
+
+    def isOpen(self):
+        return self.sock is not None
+
+    def open(self):
+        sock = socket.create_connection(self.address, self.connecttimeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(self.timeout)
+        self.sock = sock
+        self.counters['opens'] += 1
+
+    def close(self):
+        sock, self.sock = self.sock, None
+        if sock is not None:
+            sock.close()
+
+    def readinto(self, buf):
+        try:
+            n = self.sock.recv_into(buf)
+        except socket.timeout:
+            return self._counted(0)
+        if not n:
+            raise OSError('Connection to %s:%d closed' % self.address)
+        return self._counted(n)
+
+    # The socket timeout is the read timeout, too short for a whole batch to
+    # a slow gateway, so partial sends are resumed like FdTransport does
+    def writelines(self, datas):
+        datas = [memoryview(data) for data in datas]
+        total = sum(len(data) for data in datas)
+        self.counters['packets'] += len(datas)
+        self.counters['byteswritten'] += total
+        while datas:
+            try:
+                sent = self.sock.sendmsg(datas)
+            except socket.timeout:
+                sent = 0
+            self.counters['writes'] += 1
+            while datas and sent >= len(datas[0]):
+                sent -= len(datas[0])
+                datas.pop(0)
+            if datas:
+                datas[0] = datas[0][sent:]
+                select.select((), (self.sock,), (), 1.0)
+
+    def inWaiting(self):
+        fcntl.ioctl(self.sock.fileno(), termios.FIONREAD, self._available)
+        return self._available[0]
+
+    def flushInput(self):
+        while self.inWaiting():
+            self.sock.recv(4096)
+
+#---------- In memory ---------------
+# Two connected ends: what one writes the other reads. pair() makes both,
+# e.g. to run BosonControl against BosonEmulator.loopback() without a tty.
+class LoopbackTransport(Transport):
+    name = 'loopback'
+
+    def __init__(self, portname='loop://', timeout=0.01):
+        Transport.__init__(self, portname, timeout)
+        self.peer = None
+        self._buf = bytearray()
+        self._condition = threading.Condition()
+        self._open = False
+
+    @classmethod
+    def pair(cls, portname='loop://', timeout=0.01):
+        a, b = cls(portname, timeout), cls(portname, timeout)
+        a.peer, b.peer = b, a
+        return a, b
+
+    def isOpen(self):
+        return self._open
+
+    def open(self):
+        self._open = True
+        self.counters['opens'] += 1
+
+    def close(self):
+        self._open = False
+        with self._condition:
+            self._condition.notify_all()
+
+    def readinto(self, buf):
+        with self._condition:
+            if not self._buf:
+                deadline = monotonic() + self.timeout
+                while not self._buf and self._open:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+            if not self._open:
+                raise OSError('%s closed' % self.portname)
+            n = min(len(buf), len(self._buf))
+            buf[:n] = self._buf[:n]
+            del self._buf[:n]
+        return self._counted(n)
+
+    def writelines(self, datas):
+        peer = self.peer
+        if not self._open or peer is None:
+            raise OSError('%s closed' % self.portname)
+        total = 0
+        with peer._condition:
+            for data in datas:
+                peer._buf += data
+                total += len(data)
+            peer._condition.notify_all()
+        self.counters['writes'] += 1
+        self.counters['packets'] += len(datas)
+        self.counters['byteswritten'] += total
+
+    def inWaiting(self):
+        return len(self._buf)
+
+    def flushInput(self):
+        with self._condition:
+            self._buf.clear()
+
+# Format: name, class. makeTransport picks one by name or by the port:
+# tcp://host:port, loop:// and everything else through pyserial, which also
+# understands its own URLs (rfc2217://, socket://, ...)
+TRANSPORTS = OrderedDict([
+    ('serial'   ,    SerialTransport),
+    ('fd'       ,    FdTransport),
+    ('tcp'      ,    TcpTransport),
+    ('loopback' ,    LoopbackTransport),
+])
+
+def makeTransport(portname, transport=None, timeout=0.01):
+    if isinstance(transport, Transport):
+        return transport
+    if transport is None:
+        if portname.startswith('tcp://'):
+            transport = 'tcp'
+        elif portname.startswith('loop://'):
+            transport = 'loopback'
+        else:
+            transport = 'serial' if serial is not None else 'fd'
+    return TRANSPORTS[transport](portname, timeout)
+
+#---------- Gateway ---------------
+# Serves a local serial port to one TcpTransport client at a time, for a
+# camera on a companion computer
+def _pipe(source, sink, stop):
+    buf = bytearray(4096)
+    try:
+        while not stop.is_set():
+            n = source.readinto(buf)
+            if n:
+                sink.write(memoryview(buf)[:n])
+    except OSError:
+        pass
+    stop.set()
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Share a Boson serial port over TCP')
+    parser.add_argument('--port', default='/dev/ttyACM0', help='camera serial port')
+    parser.add_argument('--listen', default='0.0.0.0:5555', help='address to listen on')
+    parser.add_argument('--transport', default=None, choices=list(TRANSPORTS), help='serial port backend')
+    args = parser.parse_args()
+
+    host, _, port = args.listen.rpartition(':')
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host, int(port)))
+    server.listen(1)
+    camera = makeTransport(args.port, args.transport, 0.05)
+    camera.open()
+    print ('Serving %s (%s) on %s' % (args.port, camera.name, args.listen), flush=True)
+    try:
+        while True:
+            sock, peer = server.accept()
+            log.info('Client %s:%d connected', *peer[:2])
+            client = TcpTransport('%s:%d' % peer[:2], 0.05)
+            client.sock = sock
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.settimeout(0.05)
+            camera.flushInput()
+            stop = threading.Event()
+            thread = threading.Thread(target=_pipe, args=(client, camera, stop), daemon=True)
+            thread.start()
+            _pipe(camera, client, stop)
+            thread.join()
+            client.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        camera.close()
+        server.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+import itertools
+import pytest
+from pybosonlib.boson import BosonControl
+from pybosonlib.emulator import BosonEmulator
+
+_ports = itertools.count(1)
+
+# Emulator on an in memory link and a controller driving it. Each call gets
+# its own port name, so the per port controller instances never collide.
+@pytest.fixture
+def loopback():
+    started = []
+
+    def make(timeout=0.5, controlargs=None, **emulatorargs):
+        emulator = BosonEmulator(seed=1, **emulatorargs)
+        link = emulator.loopback('loop://test-%d' % next(_ports))
+        control = BosonControl(emulator.portname, timeout=timeout, transport=link, **(controlargs or {}))
+        started.append((emulator, control))
+        return emulator, control
+
+    yield make
+    for emulator, control in started:
+        control.close()
+        emulator.stop()
+
+# Emulator on a pseudo terminal, driven through the real serial transport
+@pytest.fixture
+def ptyemulator():
+    emulators = []
+
+    def make(**emulatorargs):
+        emulator = BosonEmulator(seed=1, **emulatorargs).start()
+        emulators.append(emulator)
+        return emulator
+
+    yield make
+    for emulator in emulators:
+        emulator.stop()
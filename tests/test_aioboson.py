@@ -0,0 +1,60 @@
+import asyncio
+import pytest
+from time import monotonic
+from pybosonlib.aioboson import AsyncBosonControl
+from pybosonlib.reply import CommandTimeout
+from pybosonlib.retry import NORETRY
+
+# AsyncBosonControl drives a file descriptor from the event loop, so these
+# run against the emulator on a pseudo terminal
+
+def test_concurrent_gathers(ptyemulator):
+    emulator = ptyemulator(latency=0.02)
+
+    async def run():
+        async with AsyncBosonControl(emulator.portname, pipelinedepth=8) as camera:
+            results = await asyncio.gather(*[camera.getAgcGamma() for _ in range(8)],
+                                           camera.getAgcMaxGain(), camera.getGainState())
+            await camera.setAgcGamma(0.75)
+            batch = await camera.sendCmdsAndGetReplies(['ACGGETGAMMA', 'GETGAINMODE'])
+            return results, batch, dict(camera._pending)
+
+    results, batch, pending = asyncio.run(run())
+    assert results == [0.5] * 8 + [1.25, 'HIGH GAIN']
+    assert emulator.received == emulator.replied == 13
+    assert batch == [0.75, 0]
+    assert pending == {}
+
+def test_generated_methods_take_a_timeout(ptyemulator):
+    emulator = ptyemulator(latency=0.3)
+
+    async def run():
+        async with AsyncBosonControl(emulator.portname, timeout=5, policy=NORETRY) as camera:
+            start = monotonic()
+            with pytest.raises(CommandTimeout):
+                await camera.getAgcGamma(timeout=0.05)
+            with pytest.raises(CommandTimeout):
+                await camera.setAgcGamma(0.75, timeout=0.05)
+            return monotonic() - start, dict(camera._pending)
+
+    elapsed, pending = asyncio.run(run())
+    assert elapsed < 0.5
+    assert pending == {}
+
+def test_cancelled_command_leaves_no_pending_entry(ptyemulator):
+    emulator = ptyemulator(latency=0.2)
+
+    async def run():
+        async with AsyncBosonControl(emulator.portname, timeout=5, pipelinedepth=4) as camera:
+            tasks = [asyncio.ensure_future(camera.getAgcGamma()) for _ in range(3)]
+            await asyncio.sleep(0.05)
+            assert len(camera._pending) == 3
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            assert all(task.cancelled() for task in tasks)
+            assert camera._pending == {}
+            # the pipeline window was released too; late replies are ignored
+            return await camera.getAgcMaxGain()
+
+    assert asyncio.run(run()) == 1.25
@@ -0,0 +1,21 @@
+from pybosonlib import bench
+
+def test_every_case_runs_or_is_skipped():
+    results = bench.run(mintime=0.001, repeat=1)
+    assert 'crc16xmodem/fpatable' in results
+    assert 'Frame.raw/worstcase' in results
+    for result in results.values():
+        assert result['ops'] > 0
+        assert result['score'] > 0
+
+def test_committed_baseline_covers_the_runnable_cases():
+    baseline = bench.loadBaseline(bench.DEFAULT_BASELINE)
+    assert baseline is not None
+    results = bench.run(mintime=0.001, repeat=1)
+    assert set(results) <= set(baseline)
+
+def test_regressions_against_baseline():
+    baseline = {'a': {'score': 1.0, 'allocbytes': 100}}
+    assert bench.regressions({'a': {'score': 0.9, 'allocbytes': 100}}, baseline) == []
+    assert bench.regressions({'a': {'score': 0.7, 'allocbytes': 100}}, baseline) == [('a', 'score', 1.0, 0.7)]
+    assert bench.regressions({'a': {'score': 1.0, 'allocbytes': 400}}, baseline) == [('a', 'allocbytes', 100, 400)]
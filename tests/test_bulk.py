@@ -0,0 +1,62 @@
+import os, threading
+import pytest
+from time import monotonic
+from pybosonlib.bulk import BulkTransfer, BulkError, MEM_READ_CHUNK
+from pybosonlib.reply import CommandFailed, R_CAM_API_INVALID_INPUT
+from pybosonlib.retry import RetryPolicy
+from pybosonlib.scheduler import CommandScheduler
+
+def test_flash_roundtrip_in_chunks(loopback):
+    emulator, control = loopback()
+    bulk = BulkTransfer(control)
+    data = os.urandom(3 * 256 + 17)
+    assert bulk.writeFlash('USER_SPACE', data, offset=0x100) == len(data)
+    assert bytes(bulk.readFlash('USER_SPACE', offset=0x100, size=len(data))) == data
+    # 4 writes of 256 bytes and 2 reads of 512
+    assert bulk.chunks == 6
+
+def test_capture_read_survives_faults(loopback):
+    emulator, control = loopback(corruptrate=0.05, droprate=0.05,
+                                 controlargs={'policy': RetryPolicy(timeout=0.1)})
+    bulk = BulkTransfer(control, retries=10, backoff=0.001)
+    size = 64 * MEM_READ_CHUNK
+    assert bytes(bulk.readCapture(size=size)) == bytes(emulator.capture[:size])
+    assert bulk.resent > 0
+
+def test_camera_errors_are_not_retried(loopback):
+    emulator, control = loopback()
+    bulk = BulkTransfer(control)
+    size = 8 * MEM_READ_CHUNK
+    # the last chunk runs past the end of the capture buffer
+    with pytest.raises(BulkError) as raised:
+        bulk.readCapture(offset=len(emulator.capture) - size + 1, size=size)
+    assert isinstance(raised.value.cause, CommandFailed)
+    assert raised.value.cause.status == R_CAM_API_INVALID_INPUT
+    assert raised.value.done == 7 * MEM_READ_CHUNK
+    assert bulk.resent == 0
+    assert emulator.received == 8
+
+def test_file_roundtrip(loopback):
+    emulator, control = loopback()
+    bulk = BulkTransfer(control)
+    data = os.urandom(1000)
+    bulk.writeFile('cal.bin', data)
+    assert bytes(bulk.readFile('cal.bin')) == data
+    with pytest.raises(CommandFailed):
+        bulk.readFile('missing.bin')
+
+def test_transfer_keeps_the_interactive_reserve(loopback):
+    emulator, control = loopback(latency=0.002, controlargs={'pipelinedepth': 4})
+    with CommandScheduler(control, reserve=1) as scheduler:
+        bulk = BulkTransfer(control)
+        transfer = threading.Thread(target=bulk.readCapture, kwargs={'size': 200 * MEM_READ_CHUNK})
+        transfer.start()
+        latencies = []
+        while transfer.is_alive():
+            start = monotonic()
+            assert control.getAgcGamma() == 0.5
+            latencies.append(monotonic() - start)
+        transfer.join()
+    assert scheduler.counters['bulk']['dispatched'] == 200
+    # without the reserve the first get waits for the whole transfer
+    assert len(latencies) > 10
@@ -0,0 +1,62 @@
+import struct
+import pytest
+from time import monotonic
+from pybosonlib.coalesce import Coalescer, CoalescerStopped
+from pybosonlib.reply import BosonError, CommandTimeout
+from pybosonlib.retry import RetryPolicy
+
+def test_latest_value_wins(loopback):
+    emulator, control = loopback(latency=0.02)
+    with Coalescer(control) as coalescer:
+        values = [i / 10.0 for i in range(1, 10)]
+        for value in values:
+            channel = coalescer.gamma(value)
+        assert channel.wait(2.0) == values[-1]
+    assert channel.writes < len(values)
+    assert channel.superseded > 0
+    assert channel.failures == 0
+    assert struct.unpack('>f', emulator.state['GAMMA'])[0] == pytest.approx(values[-1])
+    assert control.sendCmdAndGetReply('ACGGETGAMMA') == pytest.approx(values[-1])
+
+def test_zoom_is_clamped_to_the_camera_limit(loopback):
+    emulator, control = loopback()
+    applied = []
+    with Coalescer(control, onapplied=lambda channel, value: applied.append(value)) as coalescer:
+        channel = coalescer.zoom(4)
+        assert channel.wait(2.0) == 4
+        assert control.getScalerZoom() == 4
+        coalescer.zoom(50)
+        # reports what went on the wire, the camera's limit
+        assert channel.wait(2.0) == 10
+        assert channel.value == 50
+    assert control.getScalerZoom() == 10
+    assert applied == [4, 10]
+
+def test_failed_writes_are_resent(loopback):
+    policy = RetryPolicy(retries=10, backoff=0.001)
+    emulator, control = loopback(timeout=0.05, controlargs={'policy': policy}, noreplyrate=0.5)
+    with Coalescer(control) as coalescer:
+        channel = coalescer.maxGain(2.0)
+        assert channel.wait(5.0) == 2.0
+    assert channel.failures > 0
+    assert channel.error is None
+    assert struct.unpack('>f', emulator.state['MAXGAIN'])[0] == pytest.approx(2.0)
+
+def test_resends_follow_the_policy_pauses(loopback):
+    policy = RetryPolicy(retries=3, backoff=0.05)
+    emulator, control = loopback(timeout=0.02, controlargs={'policy': policy}, noreplyrate=1.0)
+    with Coalescer(control) as coalescer:
+        start = monotonic()
+        channel = coalescer.gamma(0.75)
+        assert channel.wait(5.0) is None
+        elapsed = monotonic() - start
+    assert channel.writes == channel.failures == policy.retries + 1
+    assert isinstance(channel.error, CommandTimeout)
+    assert elapsed >= sum(policy.pauses()) + 0.02 * (policy.retries + 1)
+
+def test_set_on_a_stopped_coalescer(loopback):
+    emulator, control = loopback()
+    coalescer = Coalescer(control)
+    with pytest.raises(CoalescerStopped):
+        coalescer.gamma(0.75)
+    assert issubclass(CoalescerStopped, BosonError)
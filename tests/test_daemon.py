@@ -0,0 +1,129 @@
+import os, stat, socket, struct, threading
+import pytest
+from pybosonlib import daemon as daemonmodule
+from pybosonlib.daemon import BosonDaemon, BosonClient
+from pybosonlib.profiles import CameraProfile
+from pybosonlib.reply import BosonError, CommandFailed
+from pybosonlib.retry import RetryPolicy
+
+@pytest.fixture
+def served(loopback, tmp_path):
+    daemons = []
+
+    def make(controlargs=None, **emulatorargs):
+        emulator, control = loopback(controlargs=controlargs, **emulatorargs)
+        daemon = BosonDaemon(control, str(tmp_path / ('boson%d.sock' % len(daemons)))).start()
+        daemons.append(daemon)
+        return emulator, control, daemon
+
+    yield make
+    for daemon in daemons:
+        daemon.stop()
+
+def test_socket_is_private_and_not_stolen(served):
+    emulator, control, daemon = served()
+    assert stat.S_IMODE(os.stat(daemon.path).st_mode) == 0o600
+    with pytest.raises(BosonError):
+        BosonDaemon(control, daemon.path).start()
+    with BosonClient(daemon.path) as client:
+        assert client.getAgcGamma() == 0.5
+
+def test_stale_socket_is_replaced(served, tmp_path):
+    path = str(tmp_path / 'stale.sock')
+    dead = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    dead.bind(path)
+    dead.close()
+    emulator, control = served()[:2]
+    with BosonDaemon(control, path):
+        with BosonClient(path) as client:
+            assert client.getGainState() == 'HIGH GAIN'
+
+def test_default_socket_in_runtime_dir(monkeypatch, tmp_path):
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path))
+    assert daemonmodule.defaultSocket() == str(tmp_path / 'boson.sock')
+    monkeypatch.delenv('XDG_RUNTIME_DIR')
+    assert daemonmodule.defaultSocket().endswith('boson-%d.sock' % os.getuid())
+
+def test_client_and_daemon_meet_on_the_default_socket(loopback, monkeypatch, tmp_path):
+    monkeypatch.setattr(daemonmodule, 'DEFAULT_SOCKET', str(tmp_path / 'boson.sock'))
+    emulator, control = loopback()
+    daemon = BosonDaemon(control).start()
+    try:
+        with BosonClient() as client:
+            assert client.sendCmdAndGetReply('ACGGETGAMMA') == pytest.approx(0.5)
+    finally:
+        daemon.stop()
+
+def test_identical_gets_share_a_round_trip(served):
+    emulator, control, daemon = served(latency=0.05)
+    clients = [BosonClient(daemon.path) for _ in range(6)]
+    results = []
+    threads = [threading.Thread(target=lambda c=c: results.append(c.getAgcMaxGain())) for c in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for client in clients:
+        client.close()
+    assert results == [1.25] * 6
+    assert daemon.coalesced > 0
+    assert emulator.received < 6
+
+def test_requests_use_the_retry_policy(served):
+    policy = RetryPolicy(timeout=0.1, retries=10, backoff=0.001)
+    emulator, control, daemon = served(controlargs={'policy': policy}, noreplyrate=0.4)
+    with BosonClient(daemon.path) as client:
+        assert [client.getAgcGamma() for _ in range(10)] == [0.5] * 10
+    assert emulator.unanswered > 0
+
+def test_errors_and_notifications(served):
+    emulator, control, daemon = served()
+    with BosonClient(daemon.path) as writer, BosonClient(daemon.path) as listener:
+        seen = []
+        done = threading.Event()
+        listener.subscribe(lambda name, value: (seen.append((name, value)), done.set()))
+        writer.setAgcGamma(0.8)
+        assert done.wait(2)
+        assert seen[0][0] == 'ACGSETGAMMA' and abs(seen[0][1] - 0.8) < 1e-6
+        with pytest.raises(CommandFailed):
+            writer.sendCmdAndGetReply('ACGSETGAMMA', b'\x00')
+
+def test_client_sets_the_scaler_zoom(served):
+    emulator, control, daemon = served()
+    with BosonClient(daemon.path) as client:
+        client.setScalerZoom(6)
+        assert client.getScalerZoom() == 6
+        # above the camera's limit is ignored
+        assert client.setScalerZoom(50) is None
+        assert client.getScalerZoom() == 6
+    assert control.getScalerZoom() == 6
+
+# Everything BosonClient borrows from BosonControl, in one go
+def _exercise(camera):
+    results = [camera.getSwVersion(), camera.getColorLut(), camera.getGainState(),
+               camera.getEntropy(), camera.getScalerZoom(), camera.getFpaTempTable()]
+    camera.setColorLut('IRONBOW')
+    camera.setGainState('LOW GAIN')
+    camera.setEntropy(True)
+    camera.setScalerZoom(3)
+    results += [camera.getColorLut(), camera.getGainState(), camera.getEntropy(), camera.getScalerZoom()]
+    stats = camera.getFpaTempStats()
+    results.append((stats.min, stats.max, stats.mean, stats.gradient))
+    results.append(camera.sendCmdsAndGetReplies(['ACGGETGAMMA', ('ACGSETGAMMA', struct.pack('>f', 0.75)),
+                                                 'ACGGETGAMMA']))
+    profile = camera.getProfile('before')
+    changed = CameraProfile(dict(profile.values, maxgain=2.0, gamma=0.25))
+    report = camera.setProfile(changed)
+    results += [report.ok, list(report.changes), list(report.unchanged)]
+    return profile, camera.getProfile('after'), results
+
+def test_client_matches_the_controller(served):
+    _, control, _ = served()
+    _, _, daemon = served()
+    with BosonClient(daemon.path) as client:
+        direct = _exercise(control)
+        remote = _exercise(client)
+    assert remote[2] == direct[2]
+    assert not direct[0].diff(remote[0])
+    assert not direct[1].diff(remote[1])
+    assert direct[1].values['maxgain'] == pytest.approx(2.0)
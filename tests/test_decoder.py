@@ -0,0 +1,78 @@
+import random
+from pybosonlib.flirprotocols import FrameDecoder, encodeFrame, fastByteUnstuff, MAX_WIRE_FRAME
+
+def _frames(rng, n):
+    # payloads full of bytes that need escaping
+    return [encodeFrame(rng.randint(0, 2**32 - 1).to_bytes(4, 'big') + bytes(8) +
+                        bytes(rng.choice((0x8E, 0x9E, 0xAE, 0x00, 0x41)) for _ in range(rng.randrange(0, 80))))
+            for _ in range(n)]
+
+def _split(rng, stream):
+    chunks = []
+    pos = 0
+    while pos < len(stream):
+        size = rng.randrange(1, 40)
+        chunks.append(stream[pos:pos + size])
+        pos += size
+    return chunks
+
+def test_randomly_split_stream():
+    rng = random.Random(3)
+    for _ in range(50):
+        wires = _frames(rng, 20)
+        decoder = FrameDecoder()
+        for chunk in _split(rng, b''.join(wires)):
+            decoder.feed(chunk)
+        assert list(decoder.frames) == [fastByteUnstuff(wire) for wire in wires]
+        assert decoder.crcerrors == 0
+        assert decoder.discarded == 0
+        assert not decoder.inframe
+
+def test_reused_buffer_with_size():
+    rng = random.Random(4)
+    wires = _frames(rng, 10)
+    decoder = FrameDecoder()
+    buf = bytearray(64)
+    for chunk in _split(rng, b''.join(wires)):
+        # stale bytes past size must be ignored
+        buf[:] = b'\x8e' * len(buf)
+        buf[:len(chunk)] = chunk
+        decoder.feed(buf, len(chunk))
+    assert list(decoder.frames) == [fastByteUnstuff(wire) for wire in wires]
+
+def test_resync_after_garbage_and_truncated_frames():
+    rng = random.Random(5)
+    wires = _frames(rng, 30)
+    stream = bytearray()
+    for wire in wires:
+        kind = rng.randrange(3)
+        if kind == 0:
+            # line noise without flags
+            stream += bytes(rng.choice((0x00, 0x41, 0xFF)) for _ in range(rng.randrange(1, 10)))
+        elif kind == 1:
+            # a frame cut short, the next start flag restarts
+            stream += wire[:rng.randrange(1, len(wire) - 1)]
+        stream += wire
+    decoder = FrameDecoder()
+    for chunk in _split(rng, bytes(stream)):
+        decoder.feed(chunk)
+    assert list(decoder.frames) == [fastByteUnstuff(wire) for wire in wires]
+
+def test_bad_crc_is_dropped():
+    rng = random.Random(6)
+    good, bad = _frames(rng, 2)
+    bad = bytearray(bad)
+    bad[2] ^= 0x01 if bad[2] not in (0x8F, 0x9F, 0xAF) else 0x02
+    decoder = FrameDecoder()
+    decoder.feed(bytes(bad) + good)
+    assert list(decoder.frames) == [fastByteUnstuff(good)]
+    assert decoder.crcerrors == 1
+
+def test_oversized_frame_is_discarded():
+    rng = random.Random(7)
+    good = _frames(rng, 1)[0]
+    decoder = FrameDecoder()
+    decoder.feed(b'\x8e' + b'\x00' * (MAX_WIRE_FRAME + 10))
+    assert not decoder.inframe
+    decoder.feed(good)
+    assert list(decoder.frames) == [fastByteUnstuff(good)]
@@ -0,0 +1,32 @@
+import struct
+import pytest
+from pybosonlib.reply import CommandFailed, R_CAM_PKG_INSUFFICIENT_BYTES, R_CAM_PKG_EXCESS_BYTES
+
+@pytest.mark.parametrize('name, data, status', [
+    ('MEMREADCAPTURE', b'\x00\x00\x01', R_CAM_PKG_INSUFFICIENT_BYTES),
+    ('MEMREADCAPTURE', bytes(9), R_CAM_PKG_EXCESS_BYTES),
+    ('MEMREADFLASH', b'\x00\x00\x00\x07', R_CAM_PKG_INSUFFICIENT_BYTES),
+    ('MEMWRITEFLASH', b'\x00\x00\x00\x07\x00', R_CAM_PKG_INSUFFICIENT_BYTES),
+    ('FILEOPSFSEEK', struct.pack('>I', 1), R_CAM_PKG_INSUFFICIENT_BYTES),
+])
+def test_malformed_requests_are_refused(loopback, name, data, status):
+    emulator, control = loopback()
+    with pytest.raises(CommandFailed) as failed:
+        control.sendCmdAndGetReply(name, data)
+    assert failed.value.status == status
+    # the emulator still answers
+    assert control.sendCmdAndGetReply('ACGGETGAMMA') == 0.5
+    assert emulator.received == emulator.replied == 2
+
+def test_wellformed_capture_read(loopback):
+    emulator, control = loopback()
+    data = control.sendCmdAndGetReply('MEMREADCAPTURE', struct.pack('>BIH', 0, 16, 32))
+    assert bytes(data) == bytes(emulator.capture[16:48])
+
+def test_setters_check_lengths(loopback):
+    emulator, control = loopback()
+    with pytest.raises(CommandFailed) as failed:
+        control.sendCmdAndGetReply('ACGSETGAMMA', b'\x3f')
+    assert failed.value.status == R_CAM_PKG_INSUFFICIENT_BYTES
+    control.sendCmdAndGetReply('ACGSETGAMMA', struct.pack('>f', 0.75))
+    assert control.sendCmdAndGetReply('ACGGETGAMMA') == 0.75
@@ -0,0 +1,60 @@
+import random
+import pytest
+from pybosonlib import flirprotocols
+from pybosonlib.flirprotocols import Frame, Fbp, CommandEncoder, byteStuff, crc16xmodem, START_FLAG, END_FLAG
+from pybosonlib.boson import BosonControl
+
+# Commands whose data bytes need escaping as well as plain ones
+DATAS = [b'', b'\x00\x00\x00\x01', b'\x3f\x00\x00\x00', bytes([0x8E, 0x9E, 0xAE]) * 4, bytes(range(256))]
+
+def _reference(commandid, data):
+    return bytes(Frame(Fbp(bytearray(commandid), bytearray(data)).raw()).raw())
+
+# Frame.raw() assembled by hand, so it can take a sequence number too
+def _slowReference(commandid, data, sequence=None):
+    fseq = bytes([0x42, 0xAE, 0x42, 0x9E]) if sequence is None else sequence.to_bytes(4, 'big')
+    body = b'\x00' + fseq + bytes(commandid) + b'\xff\xff\xff\xff' + bytes(data)
+    return bytes([START_FLAG]) + bytes(byteStuff(body + crc16xmodem(body).to_bytes(2, 'big'))) + bytes([END_FLAG])
+
+@pytest.mark.parametrize('name', sorted(BosonControl.COMMANDS))
+@pytest.mark.parametrize('data', DATAS, ids=lambda data: '%dbytes' % len(data))
+def test_encoder_matches_slow_path(name, data):
+    commandid = BosonControl.SCHEMA[name].commandid
+    encoder = CommandEncoder(commandid)
+    assert encoder.encode(data) == _slowReference(commandid, data)
+
+@pytest.mark.parametrize('data', DATAS, ids=lambda data: '%dbytes' % len(data))
+def test_encoder_matches_frame_raw(data):
+    for name in ('GETSERIAL', 'ACGSETGAMMA', 'SCALERSETZOOM', 'FPAGETTEMPTABLE'):
+        commandid = BosonControl.SCHEMA[name].commandid
+        assert CommandEncoder(commandid).encode(data) == _reference(commandid, data)
+
+def test_crc16xmodem_matches_bitwise_crc():
+    rng = random.Random(1)
+    for _ in range(200):
+        data = rng.randbytes(rng.randrange(0, 64))
+        crc = 0x1d0f
+        for byte in data:
+            crc ^= byte << 8
+            for _ in range(8):
+                crc = ((crc << 1) ^ 0x1021) & 0xFFFF if crc & 0x8000 else (crc << 1) & 0xFFFF
+        assert crc16xmodem(data) == crc
+
+def test_fast_stuffing_roundtrip():
+    rng = random.Random(2)
+    for _ in range(500):
+        data = bytes(rng.choice((0x8E, 0x9E, 0xAE, 0x91, 0x81, 0xA1, 0x00)) for _ in range(rng.randrange(0, 40)))
+        stuffed = flirprotocols.fastByteStuff(data)
+        assert stuffed == bytes(byteStuff(data))
+        assert flirprotocols.fastByteUnstuff(stuffed) == data
+
+# Sequence numbers and data whose bytes and CRCs hit every escape
+@pytest.mark.parametrize('data', DATAS, ids=lambda data: '%dbytes' % len(data))
+def test_encoder_with_sequence(data):
+    rng = random.Random(8)
+    sequences = [0, 1, 0xFFFFFFFF, 0x8E9EAE8E] + [rng.randrange(2**32) for _ in range(300)]
+    for name in ('GETSERIAL', 'ACGSETGAMMA', 'SCALERSETZOOM'):
+        commandid = BosonControl.SCHEMA[name].commandid
+        encoder = CommandEncoder(commandid)
+        for sequence in sequences:
+            assert encoder.encode(data, sequence) == _slowReference(commandid, data, sequence)
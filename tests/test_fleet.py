@@ -0,0 +1,34 @@
+from pybosonlib.boson import BosonControl
+from pybosonlib.fleet import BosonFleet
+from pybosonlib.reply import PortError
+import pytest
+
+def test_broadcast_and_close(ptyemulator):
+    emulators = [ptyemulator(), ptyemulator()]
+    fleet = BosonFleet([emulator.portname for emulator in emulators], timeout=0.5)
+    assert fleet.openerrors == {}
+    cameras = list(fleet)
+
+    assert fleet.setColorLut('IRONBOW').ok
+    result = fleet.getColorLut()
+    assert [result[emulator.portname] for emulator in emulators] == ['IRONBOW', 'IRONBOW']
+
+    assert fleet.close().ok
+    instances = BosonControl._BosonControl__instances
+    for emulator, camera in zip(emulators, cameras):
+        assert emulator.portname not in instances
+        assert not camera.transport.isOpen()
+        with pytest.raises(PortError):
+            camera.getSerial()
+    # a new controller for the same port opens it again
+    control = BosonControl(emulators[0].portname, timeout=0.5)
+    assert control is not cameras[0]
+    assert control.getColorLut() == 'IRONBOW'
+    control.close()
+
+def test_close_fails_commands_in_flight(loopback):
+    emulator, control = loopback(latency=0.2)
+    future = control.submit('GETSERIAL')
+    control.close()
+    with pytest.raises(PortError):
+        future.result()
@@ -0,0 +1,68 @@
+import struct
+from array import array
+import pytest
+from pybosonlib.fpa import decodeFpaTable, decodeFpaTables, fpaTableStats, FPA_TABLE_BYTES
+
+# signed entries, covering both bytes of each and the int16 limits
+TABLE = [-32768, -1, 0, 1, 255, 256, -256, 32767] + [315 + i for i in range(24)]
+DATA = struct.pack('>32h', *TABLE)
+
+def test_decode_to_array():
+    table = decodeFpaTable(DATA)
+    assert isinstance(table, array) and table.typecode == 'h'
+    assert list(table) == TABLE
+
+def test_decode_into_array():
+    out = array('h', bytes(FPA_TABLE_BYTES))
+    assert decodeFpaTable(DATA, out) is out
+    assert list(out) == TABLE
+
+def test_byte_order_is_big_endian():
+    assert list(decodeFpaTable(b'\x01\x02' + bytes(62)))[:2] == [0x0102, 0]
+    assert list(decodeFpaTable(b'\xff\xfe' + bytes(62)))[0] == -2
+
+def test_wrong_length_is_refused():
+    with pytest.raises(ValueError):
+        decodeFpaTable(DATA[:-2])
+
+def test_decode_into_numpy():
+    numpy = pytest.importorskip('numpy')
+    out = numpy.zeros(32, dtype=numpy.int16)
+    assert decodeFpaTable(DATA, out) is out
+    assert out.tolist() == TABLE
+    # a native int32 buffer is filled with the values, not the raw bytes
+    wide = numpy.zeros(32, dtype=numpy.int32)
+    assert decodeFpaTable(DATA, wide).tolist() == TABLE
+
+def test_stats():
+    ramp = struct.pack('>32h', *[300 + 2 * i for i in range(32)])
+    stats = fpaTableStats(ramp)
+    assert (stats.min, stats.max) == (300, 362)
+    assert stats.mean == pytest.approx(331.0)
+    assert stats.gradient == pytest.approx(2.0)
+    stats = fpaTableStats(DATA)
+    assert (stats.min, stats.max) == (-32768, 32767)
+    assert stats.mean == pytest.approx(sum(TABLE) / 32.0)
+
+def test_stats_with_numpy_out():
+    numpy = pytest.importorskip('numpy')
+    ramp = struct.pack('>32h', *[300 - i for i in range(32)])
+    stats = fpaTableStats(ramp, numpy.zeros(32, dtype=numpy.int16))
+    assert (stats.min, stats.max) == (269, 300)
+    assert isinstance(stats.min, int)
+    assert stats.gradient == pytest.approx(-1.0)
+
+def test_decode_many():
+    numpy = pytest.importorskip('numpy')
+    ramp = struct.pack('>32h', *[300 + i for i in range(32)])
+    tables, mins, maxs, means, gradients = decodeFpaTables([DATA, ramp])
+    assert tables.shape == (2, 32) and tables.dtype == numpy.int16
+    assert tables[0].tolist() == TABLE
+    assert mins.tolist() == [-32768, 300]
+    assert maxs.tolist() == [32767, 331]
+    assert means[1] == pytest.approx(315.5)
+    assert gradients[1] == pytest.approx(1.0)
+    # one joined buffer and a preallocated out give the same
+    out = numpy.empty((2, 32), dtype=numpy.int16)
+    assert decodeFpaTables(DATA + ramp, out)[0] is out
+    assert numpy.array_equal(out, tables)
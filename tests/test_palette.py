@@ -0,0 +1,88 @@
+import pytest
+from pybosonlib.palette import PALETTES, Agc, Colorizer, colorize, paletteArray
+
+numpy = pytest.importorskip('numpy')
+
+def _rgb(name, index):
+    return tuple(PALETTES[name][3 * index:3 * index + 3])
+
+@pytest.mark.parametrize('name', list(PALETTES))
+def test_every_palette_has_256_colors(name):
+    assert len(PALETTES[name]) == 768
+    assert paletteArray(name).shape == (256, 3)
+
+def test_sdk_tables():
+    assert _rgb('RAINBOW', 0) == (1, 3, 74)
+    assert _rgb('RAINBOW', 255) == (255, 233, 208)
+    assert [_rgb('GREYSCALE', i) for i in (0, 128, 255)] == \
+        [(0, 0, 0), (128, 128, 128), (255, 255, 255)]
+    assert _rgb('IRONBLACK', 0) == (255, 255, 255)
+    assert _rgb('IRONBLACK', 127) == (0, 0, 0)
+    assert _rgb('IRONBLACK', 255) == (255, 255, 24)
+    assert _rgb('BLACKHOT', 0) == (255, 255, 255)
+    assert _rgb('BLACKHOT', 255) == (0, 0, 0)
+
+def _histogram(counts):
+    histogram = numpy.zeros(65536, dtype=numpy.int64)
+    for value, count in counts.items():
+        histogram[value] = count
+    return histogram
+
+def test_linear_agc_on_a_known_histogram():
+    agc = Agc(linearpercent=100, outliercut=0, quantum=1)
+    histogram = _histogram(dict((value, 10) for value in range(1000, 2001)))
+    lut = agc.lut(histogram=histogram)
+    assert lut.dtype == numpy.uint8
+    assert (lut[1000], lut[1500], lut[2000]) == (0, 127, 255)
+    assert lut[0] == 0 and lut[65535] == 255
+    assert numpy.all(numpy.diff(lut.astype(int)) >= 0)
+
+def test_outliers_are_clipped():
+    agc = Agc(linearpercent=100, outliercut=0.05, quantum=1)
+    counts = dict((value, 10) for value in range(1000, 2001))
+    counts[10] = counts[60000] = 5
+    assert agc.range(_histogram(counts)) == (1000, 2000)
+
+def test_equalization_on_a_known_histogram():
+    agc = Agc(linearpercent=0, outliercut=0, quantum=1)
+    lut = agc.lut(histogram=_histogram({1000: 50, 3000: 50}))
+    assert (lut[1000], lut[2000], lut[3000]) == (127, 127, 255)
+
+def test_maxgain_keeps_narrow_scenes_centred():
+    agc = Agc(linearpercent=100, outliercut=0, maxgain=1.25, quantum=1)
+    lut = agc.lut(histogram=_histogram({1000: 50, 1010: 50}))
+    assert 100 < lut[1005] < 155
+    assert lut[1010] - lut[1000] <= 10 * 1.25 + 1
+
+def test_colorizer_output():
+    frame = numpy.arange(0, 120 * 160, dtype=numpy.uint16).reshape(120, 160) + 1000
+    rgb = Colorizer('IRONBOW').apply(frame)
+    assert rgb.shape == (120, 160, 3)
+    assert rgb.dtype == numpy.uint8
+    out = numpy.empty((120, 160, 3), dtype=numpy.uint8)
+    assert colorize(frame, 'IRONBOW', out=out) is out
+    assert numpy.array_equal(out, rgb)
+    gray = Agc().apply(frame)
+    assert gray.shape == (120, 160) and gray.dtype == numpy.uint8
+
+def test_steady_scene_hits_the_caches():
+    random = numpy.random.default_rng(1)
+    colorizer = Colorizer('RAINBOW')
+    scene = random.normal(8000, 300, (512, 640))
+    for _ in range(30):
+        # the same scene with a little sensor noise per frame
+        colorizer.apply((scene + random.normal(0, 5, scene.shape)).astype(numpy.uint16))
+    agc = colorizer.agc
+    assert agc.misses == 1
+    assert agc.hits == 29
+    assert (colorizer.hits, colorizer.misses) == (agc.hits, agc.misses)
+    # a different scene gets its own table
+    colorizer.apply((scene + 2000).astype(numpy.uint16))
+    assert agc.misses == 2
+
+def test_fixed_range_is_cached():
+    agc = Agc(linearpercent=100)
+    frame = numpy.full((4, 4), 1500, dtype=numpy.uint16)
+    first = agc.lut(frame, 1000, 2000)
+    assert agc.lut(frame, 1000, 2000) is first
+    assert (agc.hits, agc.misses) == (1, 1)
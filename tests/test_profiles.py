@@ -0,0 +1,38 @@
+import struct
+from pybosonlib.profiles import CameraProfile
+from pybosonlib.retry import RetryPolicy
+
+def _target(control):
+    profile = control.getProfile('night')
+    profile.values['gamma'] = 0.75
+    profile.values['maxgain'] = 2.0
+    profile.values['colorlut'] = 4
+    return profile
+
+def test_apply_writes_only_changes_in_one_burst(loopback):
+    emulator, control = loopback(controlargs={'pipelinedepth': 16})
+    target = _target(control)
+    writes = control.transport.counters['writes']
+    report = control.setProfile(target)
+    assert report.ok
+    assert list(report.changes) == ['colorlut', 'maxgain', 'gamma']
+    assert set(report.timings) == {'colorlut', 'maxgain', 'gamma'}
+    # snapshot of the 12 fields and the 3 sets
+    assert control.transport.counters['writes'] - writes == 2
+    assert emulator.state['GAMMA'] == struct.pack('>f', 0.75)
+    assert emulator.state['COLORLUT'] == struct.pack('>i', 4)
+    assert control.getProfile() == target
+
+def test_apply_resends_lost_writes(loopback):
+    policy = RetryPolicy(timeout=0.1, retries=10, backoff=0.001)
+    emulator, control = loopback(controlargs={'policy': policy}, noreplyrate=0.3)
+    target = _target(control)
+    report = control.setProfile(target)
+    assert report.ok, report.errors
+    assert emulator.state['MAXGAIN'] == struct.pack('>f', 2.0)
+    assert emulator.unanswered > 0
+
+def test_json_roundtrip(loopback):
+    emulator, control = loopback()
+    profile = control.getProfile('day')
+    assert CameraProfile.fromJson(profile.toJson()) == profile
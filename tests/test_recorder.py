@@ -0,0 +1,93 @@
+import threading
+import pytest
+from pybosonlib.recorder import WireRecorder, WireLog, analyze, replay, SESSION, TX, RX
+
+def _drive(control, n):
+    for _ in range(n):
+        assert control.sendCmdAndGetReply('ACGGETGAMMA') == pytest.approx(0.5)
+
+def test_controls_sharing_a_recorder_get_their_own_sessions(loopback, tmp_path):
+    path = str(tmp_path / 'wire.rec')
+    with WireRecorder(path) as recorder:
+        _, first = loopback(controlargs={'recorder': recorder})
+        _, second = loopback(controlargs={'recorder': recorder})
+        threads = [threading.Thread(target=_drive, args=(control, 50)) for control in (first, second)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    report = analyze(path)
+    counters = report['counters']
+    assert counters['sessions'] == 2
+    assert counters['txframes'] == counters['rxframes'] >= 100
+    assert counters['unmatched'] == 0
+    assert counters['timeouts'] == 0
+    assert [port for _, port in report['sessions']] == [first.portname, second.portname]
+
+    with WireLog(path) as wirelog:
+        sent = {}
+        for session, kind, _, _ in wirelog.frames():
+            if kind == TX:
+                sent[session] = sent.get(session, 0) + 1
+        assert sorted(sent) == [0, 1]
+        assert all(n >= 50 for n in sent.values())
+
+def test_sessions_are_listed_once_per_pass(loopback, tmp_path):
+    path = str(tmp_path / 'wire.rec')
+    with WireRecorder(path) as recorder:
+        _, control = loopback(controlargs={'recorder': recorder})
+        _drive(control, 3)
+
+    with WireLog(path) as wirelog:
+        for _ in range(3):
+            kinds = [kind for _, kind, _, _ in wirelog.frames()]
+            assert kinds.count(SESSION) == 1
+            assert kinds.count(RX) == 3
+            assert len(wirelog.sessions) == 1
+            assert wirelog.sessions[0][1] == control.portname
+
+def test_session_starts_when_a_control_attaches(tmp_path):
+    path = str(tmp_path / 'wire.rec')
+    with WireRecorder(path):
+        pass
+    with WireLog(path) as wirelog:
+        assert list(wirelog.records()) == []
+        assert wirelog.sessions == []
+
+def test_appended_recordings_keep_sessions_apart(loopback, tmp_path):
+    path = str(tmp_path / 'wire.rec')
+    ports = []
+    for _ in range(2):
+        with WireRecorder(path) as recorder:
+            _, control = loopback(controlargs={'recorder': recorder})
+            _drive(control, 5)
+            ports.append(control.portname)
+
+    report = analyze(path)
+    assert [port for _, port in report['sessions']] == ports
+    assert report['counters']['txframes'] == report['counters']['rxframes'] == 10
+    assert report['counters']['unmatched'] == 0
+
+def test_other_recording_versions_are_refused(tmp_path):
+    path = tmp_path / 'wire.rec'
+    path.write_bytes(b'BOSONREC\x00\x01')
+    with pytest.raises(ValueError):
+        WireRecorder(str(path))
+    with pytest.raises(ValueError):
+        WireLog(str(path))
+
+def test_replay_sends_every_session_again(loopback, tmp_path):
+    path = str(tmp_path / 'wire.rec')
+    with WireRecorder(path) as recorder:
+        _, first = loopback(controlargs={'recorder': recorder})
+        _, second = loopback(controlargs={'recorder': recorder})
+        _drive(first, 4)
+        _drive(second, 6)
+
+    _, control = loopback()
+    results = replay(path, control, speed=None)
+    stats = results['ACGGETGAMMA']
+    assert stats['latency']['count'] == 10
+    assert stats['mismatches'] == 0
+    assert not stats['errors']
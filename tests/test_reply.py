@@ -0,0 +1,87 @@
+import struct
+import pytest
+from pybosonlib.flirprotocols import crc16xmodem
+from pybosonlib.reply import (Reply, BosonError, CommandFailed, CrcError, CommandTimeout, statusName,
+                              R_SUCCESS, R_CAM_DSPCH_BAD_CMD_ID, R_CAM_PKG_INSUFFICIENT_BYTES)
+from pybosonlib.retry import NORETRY
+
+# Unstuffed reply frame as FrameDecoder queues it
+def _frame(sequence, commandid, status=R_SUCCESS, data=b'', channel=0x00):
+    body = bytes([channel]) + struct.pack('>III', sequence, commandid, status) + data
+    return bytearray(b'\x8e' + body + crc16xmodem(body).to_bytes(2, 'big') + b'\xae')
+
+def test_fields_are_decoded_from_the_frame():
+    frame = _frame(0x01020304, 0x00040008, data=b'\x3f\x00\x00\x00')
+    reply = Reply(frame, validate=True)
+    assert reply.frame is frame
+    assert reply.channel == 0
+    assert reply.sequence == 0x01020304
+    assert reply.commandid == 0x00040008
+    assert reply.status == R_SUCCESS and reply.statusname == 'R_SUCCESS'
+    assert reply.ok and reply.crcok
+    assert len(reply) == 4
+    assert repr(reply) == 'Reply(seq=16909060, id=0x00040008, R_SUCCESS, 4 bytes)'
+
+def test_fields_are_lazy_views():
+    frame = _frame(7, 0x00040008, data=b'\x00\x01')
+    reply = Reply(frame)
+    data = reply.data
+    assert isinstance(data, memoryview) and data.obj is frame
+    # nothing is decoded up front: fields follow the frame
+    frame[5] = 8
+    frame[15] = 2
+    assert reply.sequence == 8
+    assert bytes(data) == b'\x00\x02'
+    assert not reply.crcok
+
+def test_check():
+    reply = Reply(_frame(5, 0x00040008))
+    assert reply.check('ACGGETGAMMA') is reply
+    failed = Reply(_frame(5, 0x00040008, R_CAM_DSPCH_BAD_CMD_ID))
+    assert not failed.ok
+    with pytest.raises(CommandFailed) as error:
+        failed.check('ACGGETGAMMA')
+    assert error.value.commandname == 'ACGGETGAMMA'
+    assert (error.value.status, error.value.sequence) == (R_CAM_DSPCH_BAD_CMD_ID, 5)
+    assert error.value.statusname == 'R_CAM_DSPCH_BAD_CMD_ID'
+    with pytest.raises(CommandFailed, match='0x00040008 failed with R_CAM_DSPCH_BAD_CMD_ID'):
+        failed.check()
+
+def test_validate_checks_the_crc():
+    frame = _frame(5, 0x00040008, data=b'\x01')
+    frame[-2] ^= 0xFF
+    reply = Reply(frame)
+    assert not reply.crcok
+    with pytest.raises(CrcError):
+        Reply(frame, validate=True)
+    # too short to hold a header and a CRC
+    assert not Reply(bytearray(b'\x8e\x00\xae')).crcok
+
+def test_status_names():
+    assert statusName(R_CAM_PKG_INSUFFICIENT_BYTES) == 'R_CAM_PKG_INSUFFICIENT_BYTES'
+    assert statusName(0x1234) == 'R_UNKNOWN_0x00001234'
+
+def test_errors_are_boson_errors():
+    for error in (CommandFailed, CrcError, CommandTimeout):
+        assert issubclass(error, BosonError) and issubclass(error, IOError)
+
+def test_status_maps_to_command_failed(loopback):
+    emulator, control = loopback()
+    with pytest.raises(CommandFailed) as error:
+        control.sendCmdAndGetReply('ACGSETGAMMA', b'\x3f')
+    assert error.value.status == R_CAM_PKG_INSUFFICIENT_BYTES
+
+def test_corrupt_reply_maps_to_timeout(loopback):
+    # the decoder drops frames with a bad CRC, so the command times out
+    emulator, control = loopback(timeout=0.1, corruptrate=1.0, controlargs={'policy': NORETRY})
+    with pytest.raises(CommandTimeout) as error:
+        control.sendCmdAndGetReply('ACGGETGAMMA')
+    assert error.value.commandname == 'ACGGETGAMMA'
+    assert emulator.corrupted == 1
+    assert control.decoder.crcerrors == 1
+
+def test_missing_reply_maps_to_timeout(loopback):
+    emulator, control = loopback(timeout=0.1, noreplyrate=1.0, controlargs={'policy': NORETRY})
+    with pytest.raises(CommandTimeout) as error:
+        control.sendCmdAndGetReply('ACGGETGAMMA')
+    assert error.value.timeout == pytest.approx(0.1)
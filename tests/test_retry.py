@@ -0,0 +1,43 @@
+import pytest
+from time import monotonic
+from pybosonlib.reply import CommandTimeout
+from pybosonlib.retry import RetryPolicy
+
+# Host scheduling noise on top of RetryPolicy.bound, which assumes reads
+# return within their timeout
+SLACK = 0.1
+
+def _timed(call, *args):
+    start = monotonic()
+    try:
+        return call(*args), monotonic() - start
+    except CommandTimeout as e:
+        return e, monotonic() - start
+
+def test_bound_holds_when_nothing_answers(loopback):
+    policy = RetryPolicy(timeout=0.1, retries=2)
+    emulator, control = loopback(timeout=1, controlargs={'policy': policy}, noreplyrate=1.0)
+    for _ in range(3):
+        result, elapsed = _timed(control.sendCmdAndGetReply, 'GETSERIAL')
+        assert isinstance(result, CommandTimeout)
+        # three attempts of at least their timeout each
+        assert 0.3 <= elapsed <= policy.bound(control.timeout) + SLACK
+    assert emulator.received == 9
+
+@pytest.mark.parametrize('fault', ['droprate', 'corruptrate', 'noreplyrate'])
+def test_bound_holds_under_faults(loopback, fault):
+    policy = RetryPolicy(timeout=0.1, retries=2)
+    emulator, control = loopback(timeout=1, controlargs={'policy': policy}, **{fault: 0.5})
+    worst = 0.0
+    for _ in range(20):
+        result, elapsed = _timed(control.sendCmdAndGetReply, 'ACGGETGAMMA')
+        assert result == 0.5 or isinstance(result, CommandTimeout)
+        worst = max(worst, elapsed)
+    assert worst <= policy.bound(control.timeout) + SLACK
+
+def test_batches_are_retried(loopback):
+    policy = RetryPolicy(timeout=0.1, retries=8, backoff=0.001)
+    emulator, control = loopback(timeout=1, controlargs={'policy': policy}, noreplyrate=0.3)
+    commands = ['GETGAINMODE', 'ACGGETGAMMA', 'ACGGETMAXGAIN'] * 5
+    assert control.sendCmdsAndGetReplies(commands) == [0, 0.5, 1.25] * 5
+    assert emulator.unanswered > 0
@@ -0,0 +1,60 @@
+import pytest
+from concurrent.futures import CancelledError
+from pybosonlib.reply import BosonError
+from pybosonlib.scheduler import CommandScheduler, DeadlineExpired, SchedulerStopped
+
+def test_expired_background_commands_are_boson_errors(loopback):
+    emulator, control = loopback(latency=0.05, controlargs={'pipelinedepth': 2})
+    with CommandScheduler(control, deadlines={'telemetry': 0.01}) as scheduler:
+        futures = [scheduler.submit('GETGAINMODE', priority='telemetry') for _ in range(5)]
+        errors = [future.exception() for future in futures]
+    assert errors[0] is None
+    assert all(isinstance(error, DeadlineExpired) for error in errors[1:])
+    assert all(isinstance(error, BosonError) for error in errors[1:])
+    assert scheduler.counters['telemetry']['expired'] == 4
+
+def test_stop_fails_queued_commands(loopback):
+    emulator, control = loopback(latency=0.05, controlargs={'pipelinedepth': 2})
+    scheduler = CommandScheduler(control).start()
+    futures = [scheduler.submit('GETGAINMODE', priority='bulk') for _ in range(10)]
+    scheduler.stop()
+    errors = [future.exception() for future in futures]
+    assert any(isinstance(error, SchedulerStopped) for error in errors)
+    with pytest.raises(BosonError):
+        scheduler.submit('GETGAINMODE')
+
+def test_interactive_commands_go_first(loopback):
+    emulator, control = loopback(latency=0.01, controlargs={'pipelinedepth': 4})
+    with CommandScheduler(control, reserve=1) as scheduler:
+        background = [scheduler.submit('GETGAINMODE', priority='bulk') for _ in range(30)]
+        # user methods go through the scheduler in the interactive class
+        assert control.getAgcGamma() == 0.5
+        queued = scheduler.depth()['bulk']
+        for future in background:
+            future.result()
+    assert queued > 0
+    assert scheduler.counters['interactive']['dispatched'] == 1
+
+def test_cancelled_commands_do_not_stop_the_dispatcher(loopback):
+    emulator, control = loopback(latency=0.05, controlargs={'pipelinedepth': 2})
+    with CommandScheduler(control, deadlines={'telemetry': 0.01}) as scheduler:
+        futures = [scheduler.submit('GETGAINMODE', priority='bulk') for _ in range(6)]
+        expiring = [scheduler.submit('GETGAINMODE', priority='telemetry') for _ in range(3)]
+        cancelled = [future for future in futures[2:] + expiring if future.cancel()]
+        assert len(cancelled) >= 4
+        assert scheduler.submit('ACGGETGAMMA', priority='control').result(2.0) == 0.5
+        for future in cancelled:
+            assert future.cancelled()
+            with pytest.raises(CancelledError):
+                future.result(1.0)
+    counters = scheduler.counters
+    assert sum(c['cancelled'] for c in counters.values()) == len(cancelled)
+
+def test_stop_skips_cancelled_commands(loopback):
+    emulator, control = loopback(latency=0.05, controlargs={'pipelinedepth': 1})
+    scheduler = CommandScheduler(control).start()
+    futures = [scheduler.submit('GETGAINMODE', priority='bulk') for _ in range(5)]
+    assert futures[-1].cancel()
+    scheduler.stop()
+    assert futures[-1].cancelled()
+    assert isinstance(futures[-2].exception(), SchedulerStopped)
@@ -0,0 +1,151 @@
+import asyncio, struct
+import pytest
+from pybosonlib.emulator import CAPTURE_SHAPE
+from pybosonlib.schema import (SCHEMA, METHODS, COMMANDS, BYID, BosonCommands, AsyncBosonCommands, StructType,
+                               ScalerZoomParams, SwVersion, BufferSize, CaptureRange, FlashRange, FileRead)
+
+# Function ids from the IDD; the MEM and FILEOPS ones are easy to get wrong
+IDS = [
+    ('SCALERGETZOOM'       , 0x000D0003),
+    ('SCALERGETMAXZOOM'    , 0x000D0001),
+    ('SCALERSETZOOM'       , 0x000D0002),
+    ('MEMREADCAPTURE'      , 0xFFFF0003),
+    ('MEMGETCAPTURESIZE'   , 0xFFFF0004),
+    ('MEMWRITEFLASH'       , 0xFFFF0005),
+    ('MEMREADFLASH'        , 0xFFFF0006),
+    ('MEMGETFLASHSIZE'     , 0xFFFF0007),
+    ('MEMERASEFLASH'       , 0xFFFF0008),
+    ('MEMERASEFLASHPARTIAL', 0xFFFF0009),
+    ('MEMREADCURRENTGAIN'  , 0xFFFF000A),
+    ('MEMGETGAINSIZE'      , 0xFFFF000B),
+    ('FILEOPSFOPEN'        , 0x00160003),
+    ('FILEOPSFCLOSE'       , 0x00160004),
+    ('FILEOPSFREAD'        , 0x00160005),
+    ('FILEOPSFWRITE'       , 0x00160006),
+    ('FILEOPSFTELL'        , 0x00160007),
+    ('FILEOPSFSEEK'        , 0x00160008),
+    ('FILEOPSGETFILESIZE'  , 0x0016000D),
+]
+
+@pytest.mark.parametrize('name, functionid', IDS)
+def test_function_ids(name, functionid):
+    command = COMMANDS[name]
+    assert command.id == functionid
+    assert command.commandid == struct.pack('>I', functionid)
+    assert BYID[functionid] is command
+
+def test_ids_and_names_are_unique():
+    assert len(COMMANDS) == len(BYID) == len(SCHEMA)
+    for methodname, commandname in METHODS:
+        assert commandname in COMMANDS
+
+# One request per shape in the schema: the encoded bytes and their size
+REQUESTS = [
+    ('ACGSETGAMMA'         , (0.75,)                       , struct.pack('>f', 0.75)),
+    ('SETGAINMODE'         , (1,)                          , struct.pack('>i', 1)),
+    ('MEMERASEFLASH'       , (3, 2)                        , struct.pack('>iB', 3, 2)),
+    ('FILEOPSFSEEK'        , (1, 2, 0)                     , struct.pack('>III', 1, 2, 0)),
+    ('FILEOPSFWRITE'       , (1, 4, b'data')               , struct.pack('>II128s', 1, 4, b'data')),
+    ('FILEOPSFOPEN'        , (b'a.txt', b'rb')             , struct.pack('>128s128s', b'a.txt', b'rb')),
+    ('FILEOPSGETFILESIZE'  , (b'a.txt',)                   , struct.pack('>128s', b'a.txt')),
+    ('SCALERSETZOOM'       , (ScalerZoomParams(4, 320, 256),), struct.pack('>iii', 4, 320, 256)),
+    ('MEMREADCAPTURE'      , (CaptureRange(0, 16, 32),)    , struct.pack('>BIH', 0, 16, 32)),
+    ('MEMREADFLASH'        , (FlashRange(1, 2, 3, 4),)     , struct.pack('>iBIH', 1, 2, 3, 4)),
+    ('MEMWRITEFLASH'       , (b'\x00\x01\x02',)            , b'\x00\x01\x02'),
+    ('ACGRESTOREDEFAULT'   , ()                            , b''),
+]
+
+@pytest.mark.parametrize('name, args, encoded', REQUESTS)
+def test_request_codecs(name, args, encoded):
+    command = COMMANDS[name]
+    assert command.encode(*args) == encoded
+    if command.argbytes:
+        assert command.argbytes == len(encoded)
+        # already encoded data passes through
+        assert command.encode(encoded) == encoded
+    # single values and structs decode back, as the daemon does for sets
+    if isinstance(command.request, type) or command.request in ('i', 'f'):
+        assert command.decoderequest(encoded) == args[0]
+
+def test_request_codec_errors():
+    with pytest.raises(TypeError):
+        COMMANDS['ACGRESTOREDEFAULT'].encode(1)
+    with pytest.raises(ValueError):
+        COMMANDS['SCALERSETZOOM'].encode(b'\x00' * 11)
+    with pytest.raises(struct.error):
+        COMMANDS['ACGSETGAMMA'].encode('high')
+
+# One reply per shape: the reply data and what it decodes to
+REPLIES = [
+    ('ACGGETGAMMA'         , struct.pack('>f', 0.5)                , 0.5),
+    ('GETGAINMODE'         , struct.pack('>i', -1)                 , -1),
+    ('FPATEMPDEDCx10'      , struct.pack('>h', -25)                , -25),
+    ('MEMGETFLASHSIZE'     , struct.pack('>I', 0xFFFFFFFF)         , 0xFFFFFFFF),
+    ('GETSERIAL'           , b'\x00\x01\x02\x03'                   , b'\x00\x01\x02\x03'),
+    ('GETPARTNUMBER'       , b'20640A012+Q'.ljust(20, b'\x00')     , b'20640A012+Q'.ljust(20, b'\x00')),
+    ('SCALERGETZOOM'       , struct.pack('>iii', 2, 320, 256)      , ScalerZoomParams(2, 320, 256)),
+    ('GETSWVERSION'        , struct.pack('>iii', 3, 1, 0)          , SwVersion(3, 1, 0)),
+    ('MEMGETCAPTURESIZE'   , struct.pack('>IHH', 655360, 512, 640) , BufferSize(655360, 512, 640)),
+    ('FILEOPSFREAD'        , struct.pack('>128sI', b'x', 1)        , FileRead(b'x'.ljust(128, b'\x00'), 1)),
+    ('MEMREADCAPTURE'      , b'\x01\x02\x03'                       , b'\x01\x02\x03'),
+    ('SETGAINMODE'         , b''                                   , b''),
+]
+
+@pytest.mark.parametrize('name, data, value', REPLIES)
+def test_reply_codecs(name, data, value):
+    command = COMMANDS[name]
+    assert command.retbytes == (0 if command.reply in (None, '*') else len(data))
+    decoded = command.decode(memoryview(data))
+    assert decoded == value
+    if isinstance(decoded, StructType):
+        assert decoded.pack() == data
+        assert command.decode(decoded.toByteArray()) == decoded
+
+class _Recorder():
+
+    def __init__(self):
+        self.calls = []
+
+    def sendCmdAndGetReply(self, commandname, data=bytearray(), timeout=None):
+        self.calls.append((commandname, bytes(data), timeout))
+        return commandname
+
+class _AsyncRecorder(_Recorder):
+
+    async def sendCmdAndGetReply(self, commandname, data=bytearray(), timeout=None):
+        return _Recorder.sendCmdAndGetReply(self, commandname, data, timeout)
+
+class _Commands(_Recorder, BosonCommands):
+    pass
+
+class _AsyncCommands(_AsyncRecorder, AsyncBosonCommands):
+    pass
+
+ARGUMENTS = { None: (), 'f': (1.5,), 'i': (2,), '128s': (b'a.txt',) }
+
+@pytest.mark.parametrize('methodname, commandname', METHODS)
+def test_generated_methods(methodname, commandname):
+    command = COMMANDS[commandname]
+    args = ARGUMENTS[command.request]
+    method = getattr(BosonCommands, methodname)
+    assert method.__name__ == methodname
+    assert method.__qualname__ == 'BosonCommands.' + methodname
+    assert '0x%08X' % command.id in method.__doc__
+
+    commands = _Commands()
+    assert getattr(commands, methodname)(*args) == commandname
+    assert commands.calls == [(commandname, command.encode(*args), None)]
+
+    commands = _AsyncCommands()
+    assert asyncio.run(getattr(commands, methodname)(*args)) == commandname
+    assert asyncio.run(getattr(commands, methodname)(*args, timeout=0.25)) == commandname
+    assert commands.calls == [(commandname, command.encode(*args), None),
+                              (commandname, command.encode(*args), 0.25)]
+
+def test_generated_methods_against_the_emulator(loopback):
+    emulator, control = loopback()
+    control.setAgcGamma(0.75)
+    assert control.getAgcGamma() == 0.75
+    assert control.getAgcMaxGain() == 1.25
+    size = control.getCaptureSize()
+    assert size == BufferSize(len(emulator.capture), *CAPTURE_SHAPE)
@@ -0,0 +1,40 @@
+import sys, threading
+from pybosonlib.shadow import ShadowCache
+
+def test_expired_entry_read_from_many_threads():
+    cache = ShadowCache(ttl=0.0)
+    errors = []
+
+    def run():
+        try:
+            for _ in range(2000):
+                cache.update('ACGGETGAMMA', b'\x3f\x00\x00\x00')
+                cache.lookup('ACGGETGAMMA')
+                cache.invalidate()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    # switch threads as often as possible to hit the window between the
+    # expiry check and the removal
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert errors == []
+
+def test_ttl_identity_and_redundant_sets():
+    cache = ShadowCache(ttl=None)
+    cache.update('GETSERIAL', b'\x00\x01\xe2\x40')
+    cache.update('ACGSETGAMMA', b'\x3f\x00\x00\x00')
+    assert cache.lookup('ACGGETGAMMA') == b'\x3f\x00\x00\x00'
+    assert cache.isRedundant('ACGSETGAMMA', b'\x3f\x00\x00\x00')
+    assert not cache.isRedundant('ACGSETGAMMA', b'\x3e\x00\x00\x00')
+    cache.invalidate()
+    assert cache.lookup('ACGGETGAMMA') is None
+    assert cache.lookup('GETSERIAL') == b'\x00\x01\xe2\x40'
@@ -0,0 +1,50 @@
+import sys, threading
+from pybosonlib.stats import Instrumentation, Histogram
+
+def test_no_counts_lost_across_snapshots():
+    stats = Instrumentation()
+    counted = []
+    stop = threading.Event()
+
+    def run():
+        n = 0
+        while not stop.is_set() or n < 1000:
+            stats.count('commands')
+            stats.record('GETSERIAL', 'roundtrip', 0.001)
+            n += 1
+        counted.append(n)
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        snapshots = [stats.snapshot(reset=True) for _ in range(200)]
+        stop.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    snapshots.append(stats.snapshot(reset=True))
+    assert sum(s['counters']['commands'] for s in snapshots) == sum(counted)
+    assert sum(s['commands']['GETSERIAL']['roundtrip']['count'] for s in snapshots
+               if 'GETSERIAL' in s['commands']) == sum(counted)
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for us in range(1, 1001):
+        histogram.add(us / 1e6)
+    snapshot = histogram.snapshot()
+    assert snapshot['count'] == 1000
+    assert snapshot['min'] == 1e-6 and snapshot['max'] == 1e-3
+    assert 0.0005 <= snapshot['p50'] <= 0.001
+    assert snapshot['p99'] == 0.001
+
+def test_control_counts_commands(loopback):
+    stats = Instrumentation()
+    emulator, control = loopback(controlargs={'stats': stats})
+    control.sendCmdsAndGetReplies(['GETGAINMODE'] * 10)
+    snapshot = stats.snapshot()
+    assert snapshot['counters']['commands'] == 10
+    assert snapshot['commands']['GETGAINMODE']['roundtrip']['count'] == 10
@@ -0,0 +1,90 @@
+from time import sleep, monotonic
+import pytest
+from pybosonlib.telemetry import RingBuffer, TelemetrySampler
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+USENUMPY = [False, pytest.param(True, marks=pytest.mark.skipif(numpy is None, reason='needs numpy'))]
+
+def _fill(buffer, n, start=0):
+    for i in range(start, start + n):
+        buffer.append(float(i), float(10 * i) if buffer.width == 1 else [10.0 * i + j for j in range(buffer.width)])
+
+@pytest.mark.parametrize('usenumpy', USENUMPY)
+def test_ring_buffer_wraparound(usenumpy):
+    buffer = RingBuffer(4, usenumpy=usenumpy)
+    assert buffer.last() == (None, None)
+    _fill(buffer, 3)
+    assert len(buffer) == 3
+    times, values = buffer.latest()
+    assert list(times) == [0.0, 1.0, 2.0] and list(values) == [0.0, 10.0, 20.0]
+    _fill(buffer, 7, 3)
+    assert (len(buffer), buffer.total) == (4, 10)
+    times, values = buffer.latest()
+    assert list(times) == [6.0, 7.0, 8.0, 9.0]
+    assert list(values) == [60.0, 70.0, 80.0, 90.0]
+    assert list(buffer.latest(2)[0]) == [8.0, 9.0]
+    assert list(buffer.latest(100)[0]) == [6.0, 7.0, 8.0, 9.0]
+    assert buffer.last() == (9.0, 90.0)
+    times, values = buffer.window(2.5, now=9.0)
+    assert list(times) == [7.0, 8.0, 9.0]
+
+@pytest.mark.parametrize('usenumpy', USENUMPY)
+def test_ring_buffer_rows(usenumpy):
+    buffer = RingBuffer(3, width=2, usenumpy=usenumpy)
+    _fill(buffer, 5)
+    times, values = buffer.latest()
+    assert list(times) == [2.0, 3.0, 4.0]
+    assert [list(row) for row in values.tolist()] == [[20.0, 21.0], [30.0, 31.0], [40.0, 41.0]]
+
+@pytest.mark.parametrize('usenumpy', USENUMPY)
+def test_ring_buffer_views_alias_the_mirror(usenumpy):
+    buffer = RingBuffer(4, usenumpy=usenumpy)
+    # every head position, so the last rows come from both halves
+    for start in range(0, 8):
+        _fill(buffer, 1, start)
+        times, values = buffer.latest()
+        if usenumpy:
+            assert numpy.shares_memory(times, buffer._times)
+            assert numpy.shares_memory(values, buffer._values)
+        else:
+            assert times.obj is buffer._times and values.obj is buffer._values
+        assert list(times) == [float(i) for i in range(max(0, start - 3), start + 1)]
+    # a view sees samples written after it was taken
+    times, values = buffer.latest(1)
+    _fill(buffer, 4, 8)
+    assert times[0] == 11.0 and values[0] == 110.0
+
+def test_ring_buffer_clear():
+    buffer = RingBuffer(4, usenumpy=False)
+    _fill(buffer, 6)
+    buffer.clear()
+    assert len(buffer) == 0 and list(buffer.latest()[0]) == []
+    _fill(buffer, 1, 20)
+    assert buffer.last() == (20.0, 200.0)
+
+def _waitfor(condition, timeout=5):
+    deadline = monotonic() + timeout
+    while not condition() and monotonic() < deadline:
+        sleep(0.01)
+    return condition()
+
+def test_sampler_backs_off_while_the_pipeline_is_full(loopback):
+    emulator, control = loopback(timeout=5, latency=0.1, controlargs={'pipelinedepth': 2})
+    sampler = TelemetrySampler(control, rates={'gamma': 50}, latencybudget=5, maxbackoff=8)
+    # hold the whole window with slow commands
+    futures = [control.submit('ACGGETMAXGAIN') for _ in range(8)]
+    assert len(control._pending) == control.pipelinedepth
+    with sampler:
+        assert _waitfor(lambda: sampler.skipped >= 3)
+        assert sampler.samples == 0
+        assert sampler.backoff > 1
+        assert [future.result() for future in futures] == [1.25] * 8
+        # once the window drains samples flow and the interval halves back
+        assert _waitfor(lambda: sampler.backoff == 1 and sampler.samples >= 2)
+    assert sampler.errors == 0
+    times, values = sampler.latest('gamma')
+    assert list(values) == [0.5] * len(times)
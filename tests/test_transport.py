@@ -0,0 +1,119 @@
+import os, pty, tty, socket, threading
+from time import sleep
+import pytest
+from pybosonlib import transport as transportmodule
+from pybosonlib.transport import makeTransport, SerialTransport, FdTransport, TcpTransport, LoopbackTransport
+
+# Packets large enough that a pty or socket buffer takes them in several goes
+BATCH = [bytes([i]) * 65536 for i in range(1, 9)]
+
+def test_make_transport_dispatch():
+    tcp = makeTransport('tcp://camera.local:4000')
+    assert isinstance(tcp, TcpTransport) and tcp.address == ('camera.local', 4000)
+    assert isinstance(makeTransport('loop://test'), LoopbackTransport)
+    assert isinstance(makeTransport('/dev/ttyACM0', 'fd'), FdTransport)
+    link = LoopbackTransport()
+    assert makeTransport('/dev/ttyACM0', link) is link
+    default = makeTransport('/dev/ttyACM0', timeout=0.2)
+    assert isinstance(default, SerialTransport if transportmodule.serial is not None else FdTransport)
+    assert default.timeout == 0.2
+
+def _drain(read, total, received, delay=0.1):
+    # start late so the writer fills the buffer first
+    sleep(delay)
+    while len(received) < total:
+        chunk = read()
+        if not chunk:
+            break
+        received += chunk
+
+@pytest.fixture
+def ptypair():
+    master, slave = pty.openpty()
+    tty.setraw(master)
+    transport = FdTransport(os.ttyname(slave), timeout=0.05)
+    transport.open()
+    yield master, transport
+    transport.close()
+    os.close(slave)
+    try:
+        os.close(master)
+    except OSError:
+        pass
+
+def test_fd_writelines_finishes_partial_writes(ptypair):
+    master, transport = ptypair
+    total = sum(len(data) for data in BATCH)
+    received = bytearray()
+    reader = threading.Thread(target=_drain, args=(lambda: os.read(master, 65536), total, received))
+    reader.start()
+    transport.writelines(BATCH)
+    reader.join(10)
+    assert bytes(received) == b''.join(BATCH)
+    assert transport.counters['writes'] > 1
+    assert transport.counters['packets'] == len(BATCH)
+    assert transport.counters['byteswritten'] == total
+
+def test_fd_reads_and_times_out(ptypair):
+    master, transport = ptypair
+    buf = bytearray(16)
+    assert transport.readinto(buf) == 0
+    os.write(master, b'\x8e\x00\xae')
+    assert transport.readinto(buf) == 3 and buf[:3] == b'\x8e\x00\xae'
+    assert transport.counters['emptyreads'] == 1
+
+def test_fd_read_after_the_other_end_closes(ptypair):
+    master, transport = ptypair
+    os.close(master)
+    with pytest.raises(OSError):
+        transport.readinto(bytearray(16))
+
+@pytest.fixture
+def tcppair():
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    transport = TcpTransport('tcp://127.0.0.1:%d' % listener.getsockname()[1], timeout=0.05)
+    transport.open()
+    server, _ = listener.accept()
+    listener.close()
+    yield server, transport
+    transport.close()
+    server.close()
+
+def test_tcp_writelines_finishes_partial_sends(tcppair):
+    server, transport = tcppair
+    batch = BATCH * 8
+    total = sum(len(data) for data in batch)
+    received = bytearray()
+    reader = threading.Thread(target=_drain, args=(lambda: server.recv(1 << 20), total, received, 0.3))
+    reader.start()
+    transport.writelines(batch)
+    reader.join(10)
+    assert bytes(received) == b''.join(batch)
+    assert transport.counters['writes'] > 1
+    assert transport.counters['byteswritten'] == total
+
+def test_tcp_read_after_the_other_end_closes(tcppair):
+    server, transport = tcppair
+    buf = bytearray(16)
+    assert transport.readinto(buf) == 0
+    server.sendall(b'\x8e\xae')
+    assert transport.readinto(buf) == 2
+    server.close()
+    with pytest.raises(OSError, match='closed'):
+        transport.readinto(buf)
+
+def test_loopback_read_after_close():
+    a, b = LoopbackTransport.pair('loop://closed')
+    a.open()
+    b.open()
+    a.writelines([b'\x8e', b'\xae'])
+    buf = bytearray(4)
+    assert b.readinto(buf) == 2
+    b.close()
+    with pytest.raises(OSError, match='closed'):
+        b.readinto(buf)
+    a.close()
+    with pytest.raises(OSError, match='closed'):
+        a.write(b'\x8e')